@@ -34,6 +34,25 @@ exports.handler = async (event, context) => {
     }
 
     const resultsDir = path.join('/tmp', 'results', sessionId);
+
+    // Functions that write their results as one archive leave it next to the
+    // result folders; it is served as it is, without archiving anything again
+    const resultsArchive = path.join('/tmp', 'results', `${sessionId}.zip`);
+    try {
+      const zipBuffer = await fs.readFile(resultsArchive);
+      return {
+        statusCode: 200,
+        headers: {
+          ...headers,
+          'Content-Type': 'application/zip',
+          'Content-Disposition': `attachment; filename="${sessionId}_results.zip"`
+        },
+        body: zipBuffer.toString('base64'),
+        isBase64Encoded: true
+      };
+    } catch (error) {
+      if (error.code !== 'ENOENT') throw error;
+    }
     
     // Check if results directory exists
     try {
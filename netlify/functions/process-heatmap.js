@@ -1,6 +1,7 @@
 const { spawn } = require('child_process');
 const { promises: fs } = require('fs');
 const path = require('path');
+const { copyPythonHelpers } = require('./utils/python-helpers');
 const { v4: uuidv4 } = require('uuid');
 const { BlobServiceClient, StorageSharedKeyCredential, BlobSASPermissions, generateBlobSASQueryParameters } = require('@azure/storage-blob');
 
@@ -171,7 +172,38 @@ print('Plot_subscript.py completed')
     const wrapperPath = path.join(tempDir, 'run_plots.py');
     await fs.writeFile(wrapperPath, wrapperScript);
 
-    await executeScript('python3', [wrapperPath], tempDir);
+    // Reuse cached plots if the same files were already processed with the same options
+    const plotsDir = path.join(tempDir, 'Output_Plots');
+    // The inline plot script imports no helper modules: only the cache
+    // tool is copied, and the key hashes exactly the code that runs
+    await copyPythonHelpers(tempDir, ['result_cache.py']);
+    let cacheKey = null;
+    let cacheHit = false;
+    try {
+      const keyResult = await executeScript('python3', [
+        'result_cache.py', 'key',
+        '--inputs', harmPath, lociPath,
+        '--options', JSON.stringify({ outputFormat, resolution }),
+        '--scripts', 'result_cache.py', plotScriptPath, wrapperPath
+      ], tempDir);
+      cacheKey = keyResult.stdout.trim();
+      const getResult = await executeScript('python3', ['result_cache.py', 'get', cacheKey, plotsDir], tempDir);
+      cacheHit = JSON.parse(getResult.stdout).hit;
+    } catch (cacheError) {
+      console.error('Result cache lookup failed:', cacheError);
+      cacheKey = null;
+    }
+
+    if (!cacheHit) {
+      await executeScript('python3', [wrapperPath], tempDir);
+      if (cacheKey) {
+        try {
+          await executeScript('python3', ['result_cache.py', 'put', cacheKey, plotsDir], tempDir);
+        } catch (cacheError) {
+          console.error('Result cache store failed:', cacheError);
+        }
+      }
+    }
 
     // Upload results to Azure under results/sessionId/
     const files = await fs.readdir(path.join(tempDir, 'Output_Plots')).catch(() => []);
@@ -197,7 +229,8 @@ print('Plot_subscript.py completed')
       body: JSON.stringify({
         message: 'Heatmap processing completed',
         sessionId,
-        resultUrls
+        resultUrls,
+        cached: cacheHit
       })
     };
   } catch (error) {
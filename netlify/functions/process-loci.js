@@ -1,6 +1,7 @@
 const { spawn } = require('child_process');
 const { promises: fs } = require('fs');
 const path = require('path');
+const { copyPythonHelpers } = require('./utils/python-helpers');
 const { v4: uuidv4 } = require('uuid');
 const { BlobServiceClient, StorageSharedKeyCredential } = require('@azure/storage-blob');
 
@@ -135,20 +136,14 @@ if __name__ == '__main__':
 
     const scriptPath = path.join(tempDir, 'Make Loci_Inputs_Clockwise.py');
     await fs.writeFile(scriptPath, scriptContent);
+    await copyPythonHelpers(tempDir, ['loci_io.py', 'output_sink.py']);
     await executeScript('python3', [scriptPath], tempDir);
 
-    const finalResultsDir = path.join(resultsDir, sessionId);
-    await fs.mkdir(finalResultsDir, { recursive: true });
-    const files = await fs.readdir(tempDir);
-    const resultFiles = [];
-    for (const file of files) {
-      if (file.endsWith('.xlsx') || file.endsWith('.txt')) {
-        const sourcePath = path.join(tempDir, file);
-        const destPath = path.join(finalResultsDir, file);
-        await fs.copyFile(sourcePath, destPath);
-        resultFiles.push(file);
-      }
-    }
+    // Pack the results straight into the download archive (no copied folder)
+    const files = (await fs.readdir(tempDir)).filter((file) => file.endsWith('.xlsx') || file.endsWith('.txt'));
+    const resultsArchive = path.join(resultsDir, `${sessionId}.zip`);
+    const archived = await executeScript('python3', ['output_sink.py', 'archive', resultsArchive, ...files, '--root', tempDir], tempDir);
+    const resultFiles = JSON.parse(archived.stdout).files;
 
     await fs.rm(tempDir, { recursive: true, force: true });
 
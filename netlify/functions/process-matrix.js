@@ -1,6 +1,7 @@
 const { spawn } = require('child_process');
 const { promises: fs } = require('fs');
 const path = require('path');
+const { copyPythonHelpers } = require('./utils/python-helpers');
 const { v4: uuidv4 } = require('uuid');
 const { BlobServiceClient, StorageSharedKeyCredential } = require('@azure/storage-blob');
 
@@ -81,35 +82,20 @@ exports.handler = async (event, context) => {
       .replace("loci_file = 'Loci_Script_Inputs.xlsm'", "loci_file = 'Loci_Script_Inputs.xlsm'")
       .replace("sheet_name = 'Impedance Loci Vertices'", `sheet_name = '${sheetName}'`)
       .replace("output_folder = 'Mins & Maxes (w Vertices) (ohms)'", "output_folder = 'Mins & Maxes (w Vertices) (ohms)'")
-      .replace("Loci_unit = 'ohm'", "Loci_unit = 'ohm'");
+      .replace("Loci_unit = 'ohm'", "Loci_unit = 'ohm'")
+      .replace("output_archive = False", "output_archive = True");
 
     const pfScriptPath = path.join(tempDir, 'PF_format_w_vertices.py');
     await fs.writeFile(pfScriptPath, pfScriptContent);
+    await copyPythonHelpers(tempDir, ['loci_core.py', 'loci_io.py', 'output_sink.py']);
     await executeScript('python3', [pfScriptPath], tempDir);
 
-    const finalResultsDir = path.join(resultsDir, sessionId);
-    await fs.mkdir(finalResultsDir, { recursive: true });
-    const files = await fs.readdir(tempDir);
-    const resultFiles = [];
-    for (const file of files) {
-      const sourcePath = path.join(tempDir, file);
-      const stats = await fs.stat(sourcePath);
-      if (stats.isDirectory() && file.includes('Mins & Maxes')) {
-        const dirFiles = await fs.readdir(sourcePath);
-        const destDir = path.join(finalResultsDir, file);
-        await fs.mkdir(destDir, { recursive: true });
-        for (const dirFile of dirFiles) {
-          const srcFile = path.join(sourcePath, dirFile);
-          const destFile = path.join(destDir, dirFile);
-          await fs.copyFile(srcFile, destFile);
-          resultFiles.push(`${file}/${dirFile}`);
-        }
-      } else if (file.endsWith('.xlsx')) {
-        const destPath = path.join(finalResultsDir, file);
-        await fs.copyFile(sourcePath, destPath);
-        resultFiles.push(file);
-      }
-    }
+    // The script compressed each DS format and plot into its archive as it was
+    // written (output_archive); that archive is the download, moved not copied
+    const resultsArchive = path.join(resultsDir, `${sessionId}.zip`);
+    await fs.rename(path.join(tempDir, 'Mins & Maxes (w Vertices) (ohms).zip'), resultsArchive);
+    const listing = await executeScript('python3', ['output_sink.py', 'list', resultsArchive], tempDir);
+    const resultFiles = JSON.parse(listing.stdout).files;
 
     await fs.rm(tempDir, { recursive: true, force: true });
 
@@ -1,8 +1,18 @@
 const { spawn } = require('child_process');
 const { promises: fs } = require('fs');
 const path = require('path');
+const { copyPythonHelpers } = require('./utils/python-helpers');
 const { v4: uuidv4 } = require('uuid');
 
+// Identifies this process in job folder locks (see claimJobDir)
+const PROCESS_TOKEN = uuidv4();
+
+// A job lock older than this belongs to an invocation that never finished
+const JOB_LOCK_STALE_MS = 15 * 60 * 1000;
+
+// File name of the result archive inside a result cache entry
+const CACHED_ARCHIVE = 'results.zip';
+
 exports.handler = async (event, context) => {
   // Enable CORS
   const headers = {
@@ -23,6 +33,7 @@ exports.handler = async (event, context) => {
     };
   }
 
+  let jobLock = null;
   try {
     const body = JSON.parse(event.body);
     const { 
@@ -32,7 +43,11 @@ exports.handler = async (event, context) => {
       limitsSheetName = 'Harmonic Limits',
       lociUnit = 'Ω',
       reorderVertices = true,
-      generatePlots = true
+      generatePlots = true,
+      simplifyTolerance = 0,
+      optimizePng = false,
+      pointIndex = false,
+      renderPlots = false
     } = body;
 
     if (!lociBlob || !harmonicsBlob) {
@@ -72,71 +87,131 @@ exports.handler = async (event, context) => {
     const harmDownload = await harmClient.download();
     await new Promise((resolve, reject) => { const ws = require('fs').createWriteStream(workingHarmonicsFile); harmDownload.readableStreamBody.pipe(ws); ws.on('finish', resolve); ws.on('error', reject); });
 
-    // Step 2: Process loci clockwise (if enabled) using original script
-    if (reorderVertices) {
-      steps.push('Processing loci clockwise ordering...');
-
-      async function getOriginalClockwiseScript() {
-        const candidates = [
-          path.join(__dirname, '..', '..', 'python scripts', 'Make Loci_Inputs_Clockwise.py'),
-          path.join(process.cwd(), 'python scripts', 'Make Loci_Inputs_Clockwise.py'),
-          path.join(__dirname, 'python scripts', 'Make Loci_Inputs_Clockwise.py'),
-        ];
-        for (const p of candidates) {
-          try {
-            const content = await fs.readFile(p, 'utf-8');
-            return content;
-          } catch (_) {}
-        }
-        return null;
-      }
-
-      let scriptContent = await getOriginalClockwiseScript();
-      if (!scriptContent) {
-        throw new Error('Original Make Loci_Inputs_Clockwise.py not found');
-      }
-      scriptContent = scriptContent.replace("sheet_name = 'Impedance Loci Vertices'", `sheet_name = '${sheetName}'`);
-
-      const scriptPath = path.join(tempDir, 'Make Loci_Inputs_Clockwise.py');
-      await fs.writeFile(scriptPath, scriptContent);
+    // Python modules used by the workflow
+    const pythonModules = ['workflow_runner.py', 'preflight.py', 'loci_core.py', 'loci_io.py', 'output_sink.py', 'result_cache.py', 'point_index.py', 'Make Loci_Inputs_Clockwise.py', 'PF_format_w_vertices.py', 'Plot_subscript.py'];
+    await copyPythonHelpers(tempDir, pythonModules);
 
-      await executeScript('python3', [scriptPath], tempDir);
-    }
+    // Results are packed into one archive, which download.js serves as it is.
+    // The cache keeps that archive, so a hit is a single file copy.
+    const resultsArchive = path.join(resultsDir, `${sessionId}.zip`);
 
-    // Step 3: Generate PowerFactory format using original script
-    steps.push('Generating PowerFactory format...');
-
-    async function getOriginalPFScript() {
-      const candidates = [
-        path.join(__dirname, '..', '..', 'python scripts', 'PF_format_w_vertices.py'),
-        path.join(process.cwd(), 'python scripts', 'PF_format_w_vertices.py'),
-        path.join(__dirname, 'python scripts', 'PF_format_w_vertices.py'),
-      ];
-      for (const p of candidates) {
-        try {
-          const content = await fs.readFile(p, 'utf-8');
-          return content;
-        } catch (_) {}
+    // Reuse a cached result set if the same files were already processed with the same options
+    let cacheKey = null;
+    try {
+      const cacheOptions = { sheetName, limitsSheetName, lociUnit, reorderVertices, generatePlots, renderPlots, simplifyTolerance, optimizePng, pointIndex };
+      const keyResult = await executeScript('python3', [
+        'result_cache.py', 'key',
+        '--inputs', workingLociFile, workingHarmonicsFile,
+        '--options', JSON.stringify(cacheOptions),
+        '--scripts', ...pythonModules
+      ], tempDir);
+      cacheKey = keyResult.stdout.trim();
+      const cachedDir = path.join(tempDir, 'cached');
+      const getResult = await executeScript('python3', ['result_cache.py', 'get', cacheKey, cachedDir], tempDir);
+      const cached = JSON.parse(getResult.stdout);
+      if (cached.hit) {
+        steps.push('Reusing cached results...');
+        await fs.rename(path.join(cachedDir, CACHED_ARCHIVE), resultsArchive);
+        const listing = await executeScript('python3', ['output_sink.py', 'list', resultsArchive], tempDir);
+        await fs.rm(tempDir, { recursive: true, force: true });
+        return {
+          statusCode: 200,
+          headers,
+          body: JSON.stringify({
+            message: 'Workflow completed successfully',
+            sessionId: sessionId,
+            steps: steps,
+            resultFiles: JSON.parse(listing.stdout).files,
+            cached: true,
+            downloadUrl: `/api/download?sessionId=${sessionId}`
+          })
+        };
       }
-      return null;
+    } catch (cacheError) {
+      console.error('Result cache lookup failed:', cacheError);
+      cacheKey = null;
     }
 
-    let pfScriptContent = await getOriginalPFScript();
-    if (!pfScriptContent) {
-      throw new Error('Original PF_format_w_vertices.py not found');
+    // Compliance and plot rendering only run with renderPlots; otherwise the
+    // plot step writes its completion marker as before.
+    const runPlots = generatePlots && renderPlots;
+
+    // Check sheet names, headers and limits before any parsing or rendering.
+    // The harmonics workbook and the limits are only read when plots are rendered.
+    steps.push('Checking input files...');
+    const preflightArgs = [
+      'preflight.py',
+      '--loci', workingLociFile,
+      '--sheet-name', sheetName,
+      '--limits-sheet-name', limitsSheetName
+    ];
+    if (runPlots) preflightArgs.push('--harmonics', workingHarmonicsFile);
+    let preflight;
+    try {
+      const preflightResult = await executeScript('python3', preflightArgs, tempDir);
+      preflight = JSON.parse(preflightResult.stdout);
+    } catch (preflightError) {
+      // Exit code 1 means the inputs have errors; the report is still on stdout
+      try { preflight = JSON.parse(preflightError.stdout); } catch (_) { preflight = null; }
+      if (!preflight) console.error('Preflight check failed:', preflightError);
+    }
+    if (preflight && !preflight.ok) {
+      await fs.rm(tempDir, { recursive: true, force: true });
+      return {
+        statusCode: 400,
+        headers,
+        body: JSON.stringify({
+          error: 'Input files failed validation',
+          details: preflight.errors.map((issue) => issue.message).join('; '),
+          issues: preflight.errors,
+          warnings: preflight.warnings,
+          steps: steps
+        })
+      };
     }
-    pfScriptContent = pfScriptContent
-      .replace("loci_file = 'Loci_Script_Inputs.xlsm'", `loci_file = '${reorderVertices ? 'Loci_Script_Inputs_Clockwise.xlsx' : 'Loci_Script_Inputs.xlsm'}'`)
-      .replace("sheet_name = 'Impedance Loci Vertices'", `sheet_name = '${sheetName}'`)
-      .replace("Loci_unit = 'ohm'", `Loci_unit = '${lociUnit === 'Ω' ? 'ohm' : lociUnit}'`);
 
-    const pfScriptPath = path.join(tempDir, 'PF_format_w_vertices.py');
-    await fs.writeFile(pfScriptPath, pfScriptContent);
+    // Steps 2-4: Run clockwise ordering, PowerFactory format and plots as a resumable
+    // task graph. The job folder is keyed on the inputs and options, so a retried
+    // request (e.g. after a timeout) resumes without redoing finished tasks.
+    const job = await claimJobDir(cacheKey, sessionId);
+    const jobDir = job.jobDir;
+    jobLock = job.lockPath;
+    const runnerArgs = [
+      'workflow_runner.py',
+      '--job-dir', jobDir,
+      '--loci', workingLociFile,
+      '--harmonics', workingHarmonicsFile,
+      '--sheet-name', sheetName,
+      '--limits-sheet-name', limitsSheetName,
+      '--loci-unit', lociUnit
+    ];
+    if (!reorderVertices) runnerArgs.push('--no-reorder');
+    if (!runPlots) runnerArgs.push('--no-plots');
+    if (simplifyTolerance > 0) runnerArgs.push('--simplify-tolerance', String(simplifyTolerance));
+    if (optimizePng) runnerArgs.push('--optimize-png');
+    if (pointIndex) runnerArgs.push('--point-index');
 
-    await executeScript('python3', [pfScriptPath], tempDir);
+    const stepLabels = {
+      reorder: 'Processing loci clockwise ordering...',
+      ds_format: 'Generating PowerFactory format...',
+      compliance: 'Evaluating harmonic compliance...',
+      point_index: 'Building point index...',
+      render_page: 'Generating analysis plots...',
+      render_nc_page: 'Generating non-compliant summary...',
+      render_detail: 'Generating non-compliant detailed sheets...'
+    };
+    const runResult = await executeScript('python3', runnerArgs, tempDir);
+    let pngBytesSaved = 0;
+    for (const line of runResult.stdout.split('\n')) {
+      let progress;
+      try { progress = JSON.parse(line); } catch (_) { continue; }
+      if (progress.event !== 'task_finished' && progress.event !== 'task_skipped') continue;
+      pngBytesSaved += progress.png_bytes_saved || 0;
+      const label = stepLabels[progress.task.split(':')[0]];
+      if (label && !steps.includes(label)) steps.push(label);
+    }
 
-    // Step 4: Generate plots (if enabled) - simplified for serverless
-    if (generatePlots) {
+    if (generatePlots && !runPlots) {
       steps.push('Generating analysis plots...');
       
       // Create a basic plot completion marker
@@ -146,41 +221,28 @@ exports.handler = async (event, context) => {
       );
     }
 
-    // Copy results to results directory
-    const finalResultsDir = path.join(resultsDir, sessionId);
-    await fs.mkdir(finalResultsDir, { recursive: true });
-    
-    // Copy all generated files
-    const files = await fs.readdir(tempDir);
-    const resultFiles = [];
-    
-    for (const file of files) {
-      if (file.endsWith('.xlsx') || file.endsWith('.txt') || file.includes('Mins & Maxes')) {
-        const sourcePath = path.join(tempDir, file);
-        const stats = await fs.stat(sourcePath);
-        
-        if (stats.isDirectory()) {
-          // Copy directory contents
-          const dirFiles = await fs.readdir(sourcePath);
-          const destDir = path.join(finalResultsDir, file);
-          await fs.mkdir(destDir, { recursive: true });
-          
-          for (const dirFile of dirFiles) {
-            const srcFile = path.join(sourcePath, dirFile);
-            const destFile = path.join(destDir, dirFile);
-            await fs.copyFile(srcFile, destFile);
-            resultFiles.push(`${file}/${dirFile}`);
-          }
-        } else {
-          const destPath = path.join(finalResultsDir, file);
-          await fs.copyFile(sourcePath, destPath);
-          resultFiles.push(file);
-        }
+    // Pack the generated files straight from the job folder into the download
+    // archive, in one pass instead of copying them to a results folder first
+    const files = (await fs.readdir(jobDir)).filter((file) =>
+      file.endsWith('.xlsx') || file.includes('Mins & Maxes') || file === 'Output_Plots' || file === 'Point_Index');
+    const archived = await executeScript('python3', ['output_sink.py', 'archive', resultsArchive, ...files, '--root', jobDir], tempDir);
+    const resultFiles = JSON.parse(archived.stdout).files;
+
+    // Store the finished result set for identical resubmissions
+    if (cacheKey) {
+      try {
+        const cacheEntryDir = path.join(tempDir, 'cache_entry');
+        await fs.mkdir(cacheEntryDir, { recursive: true });
+        await fs.link(resultsArchive, path.join(cacheEntryDir, CACHED_ARCHIVE));
+        await executeScript('python3', ['result_cache.py', 'put', cacheKey, cacheEntryDir], tempDir);
+      } catch (cacheError) {
+        console.error('Result cache store failed:', cacheError);
       }
     }
 
-    // Clean up temp directory
+    // Clean up temp and job directories
     await fs.rm(tempDir, { recursive: true, force: true });
+    await fs.rm(jobDir, { recursive: true, force: true });
 
     return {
       statusCode: 200,
@@ -190,6 +252,8 @@ exports.handler = async (event, context) => {
         sessionId: sessionId,
         steps: steps,
         resultFiles: resultFiles,
+        cached: false,
+        pngBytesSaved: pngBytesSaved,
         downloadUrl: `/api/download?sessionId=${sessionId}`
       })
     };
@@ -204,6 +268,8 @@ exports.handler = async (event, context) => {
         details: error.message 
       })
     };
+  } finally {
+    if (jobLock) await fs.rm(jobLock, { force: true });
   }
 };
 
@@ -229,7 +295,9 @@ function executeScript(command, args, cwd) {
       if (code === 0) {
         resolve({ stdout, stderr });
       } else {
-        reject(new Error(`Script failed with code ${code}: ${stderr}`));
+        const error = new Error(`Script failed with code ${code}: ${stderr}`);
+        error.stdout = stdout;
+        reject(error);
       }
     });
     
@@ -237,4 +305,48 @@ function executeScript(command, args, cwd) {
       reject(error);
     });
   });
-}
\ No newline at end of file
+}
+
+// Claim the shared job folder of a cache key, so a retried request resumes its
+// finished tasks. While another invocation still runs that job, work in a
+// private folder keyed by session instead of sharing (and deleting) its files.
+async function claimJobDir(cacheKey, sessionId) {
+  const jobsRoot = path.join('/tmp', 'jobs');
+  await fs.mkdir(jobsRoot, { recursive: true });
+  if (cacheKey) {
+    const lockPath = path.join(jobsRoot, `${cacheKey}.lock`);
+    for (let attempt = 0; attempt < 2; attempt++) {
+      try {
+        await fs.writeFile(lockPath, JSON.stringify({ pid: process.pid, token: PROCESS_TOKEN }), { flag: 'wx' });
+        return { jobDir: path.join(jobsRoot, cacheKey), lockPath };
+      } catch (error) {
+        if (error.code !== 'EEXIST') throw error;
+      }
+      if (!(await isStaleLock(lockPath))) break;
+      await fs.rm(lockPath, { force: true });
+    }
+  }
+  return { jobDir: path.join(jobsRoot, sessionId), lockPath: null };
+}
+
+// A lock is stale when it is too old, or when the process that took it is gone
+// (a timed-out invocation whose runtime was restarted, possibly with the same pid)
+async function isStaleLock(lockPath) {
+  let owner;
+  try {
+    const stats = await fs.stat(lockPath);
+    if (Date.now() - stats.mtimeMs > JOB_LOCK_STALE_MS) return true;
+    owner = JSON.parse(await fs.readFile(lockPath, 'utf-8'));
+  } catch (error) {
+    // Released already, or still being written by its owner
+    return error.code === 'ENOENT';
+  }
+  if (owner.token === PROCESS_TOKEN) return false;
+  if (owner.pid === process.pid) return true;
+  try {
+    process.kill(owner.pid, 0);
+    return false;
+  } catch (error) {
+    return error.code === 'ESRCH';
+  }
+}
@@ -0,0 +1,31 @@
+const { promises: fs } = require('fs');
+const path = require('path');
+
+// Copy the Python modules a function runs into its working folder. The
+// scripts import these helpers, so a missing one is an error here rather
+// than an ImportError halfway through a run.
+async function copyPythonHelpers(destDir, names) {
+  for (const name of names) {
+    // Bundled functions sit two levels below the repository root, this
+    // module three; the working directory is the root in local development
+    const candidates = [
+      path.join(__dirname, '..', '..', 'python scripts', name),
+      path.join(__dirname, '..', '..', '..', 'python scripts', name),
+      path.join(process.cwd(), 'python scripts', name),
+      path.join(__dirname, 'python scripts', name),
+    ];
+    let copied = false;
+    for (const p of candidates) {
+      try {
+        await fs.copyFile(p, path.join(destDir, name));
+        copied = true;
+        break;
+      } catch (_) {}
+    }
+    if (!copied) {
+      throw new Error(`Python helper ${name} not found (looked in ${candidates.join(', ')})`);
+    }
+  }
+}
+
+module.exports = { copyPythonHelpers };
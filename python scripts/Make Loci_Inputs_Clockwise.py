@@ -1,6 +1,13 @@
 import math
 import pandas as pd
 import numpy as np
+from numbers import Number
+from openpyxl import load_workbook
+
+try:
+    from loci_io import load_vertex_array
+except ImportError:
+    load_vertex_array = None
 
 def sort_points_clockwise(points):
     """
@@ -22,6 +29,208 @@ def sort_points_clockwise(points):
     points_sorted.append(points_sorted[0])
     return points_sorted
 
+def reorder_shapes_clockwise(values):
+    """
+    Vectorized version of sort_points_clockwise for a whole sheet.
+
+    'values' is a 2D float array where each consecutive column pair holds
+    the R and X vertices of one shape (NaN where a shape has no vertex).
+    Every shape is sorted clockwise around its centroid, closed by
+    repeating its first point, and packed at the top of its columns.
+    The returned array has the same shape as 'values'; a closing point
+    that does not fit in the available rows is dropped, as before.
+
+    Rows where only one of R and X is a number are not vertices and are
+    dropped (the row-by-row version let them through as points with a NaN
+    coordinate, which made the centroid and the ordering meaningless);
+    partial_vertex_rows() counts them so callers can report them.
+    """
+    values = np.asarray(values, dtype=float)
+    num_rows, num_cols = values.shape
+    num_shapes = num_cols // 2
+    result = values.copy()
+    if num_rows == 0 or num_shapes == 0:
+        return result
+
+    R = values[:, 0:2 * num_shapes:2]
+    X = values[:, 1:2 * num_shapes:2]
+
+    # Only rows where both R and X are numbers count as vertices
+    valid = ~(np.isnan(R) | np.isnan(X))
+    counts = valid.sum(axis=0)
+
+    # Centroid of every shape (shapes without vertices get NaN, unused)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cx = np.where(valid, R, 0.0).sum(axis=0) / counts
+        cy = np.where(valid, X, 0.0).sum(axis=0) / counts
+
+    # Descending angle => clockwise; invalid rows are pushed to the end.
+    # A stable sort keeps ties in sheet order, like sorted(..., reverse=True).
+    with np.errstate(invalid='ignore'):
+        angles = np.arctan2(X - cy, R - cx)
+    sort_keys = np.where(valid, -angles, np.inf)
+    order = np.argsort(sort_keys, axis=0, kind='stable')
+    R_sorted = np.take_along_axis(R, order, axis=0)
+    X_sorted = np.take_along_axis(X, order, axis=0)
+
+    # Keep the sorted vertices, blank everything below them
+    row_index = np.arange(num_rows)[:, None]
+    keep = row_index < counts
+    R_out = np.where(keep, R_sorted, np.nan)
+    X_out = np.where(keep, X_sorted, np.nan)
+
+    # Close each shape by repeating its first point (if there is room)
+    closable = np.flatnonzero((counts > 0) & (counts < num_rows))
+    R_out[counts[closable], closable] = R_sorted[0, closable]
+    X_out[counts[closable], closable] = X_sorted[0, closable]
+
+    result[:, 0:2 * num_shapes:2] = R_out
+    result[:, 1:2 * num_shapes:2] = X_out
+    return result
+
+def partial_vertex_rows(values):
+    """
+    Number of rows of every shape where exactly one of R and X is a number.
+    These rows are skipped by reorder_shapes_clockwise.
+    """
+    values = np.asarray(values, dtype=float)
+    num_shapes = values.shape[1] // 2
+    R_nan = np.isnan(values[:, 0:2 * num_shapes:2])
+    X_nan = np.isnan(values[:, 1:2 * num_shapes:2])
+    return (R_nan != X_nan).sum(axis=0)
+
+def report_partial_vertex_rows(values, columns=None):
+    """Print a warning for every shape that has rows with only R or only X."""
+    for shape_index, count in enumerate(partial_vertex_rows(values)):
+        if count:
+            name = columns[2 * shape_index] if columns is not None else f'shape {shape_index + 1}'
+            print(f"Warning: {name}: skipped {count} row(s) with only one of R/X")
+
+def sheet_block_to_array(rows, num_cols):
+    """
+    Convert rows of raw cell values into a 2D float array.
+
+    Returns (values, blank) where 'values' holds NaN for every cell that is
+    empty or cannot be parsed as a number, and 'blank' marks the cells that
+    were truly empty in the sheet.
+    """
+    values = np.full((len(rows), num_cols), np.nan)
+    blank = np.ones((len(rows), num_cols), dtype=bool)
+    for row_i, row in enumerate(rows):
+        row = row[:num_cols]
+        blank[row_i, :len(row)] = [cell is None for cell in row]
+        try:
+            values[row_i, :len(row)] = row
+        except (TypeError, ValueError):
+            # Mixed row with text in it: convert cell by cell
+            for col_i, cell in enumerate(row):
+                try:
+                    values[row_i, col_i] = float(cell)
+                except (TypeError, ValueError):
+                    pass
+    return values, blank
+
+def reorder_sheet_in_place(input_file, sheet_name, first_data_row):
+    """
+    Reorder the loci shapes of one sheet directly inside the workbook.
+
+    The workbook is opened once with keep_vba=True so macros and all other
+    sheets are kept as they are. Only the cells of the vertex block whose
+    value actually changes are rewritten, then the workbook is saved over
+    'input_file'. Returns the number of cells that were updated.
+
+    keep_vba=True reads formulas as their '=...' text rather than their
+    value, so a vertex block holding formula or text cells cannot be
+    reordered safely: a ValueError is raised before anything is written.
+    A trailing column without an X partner is reported and left alone.
+    """
+    wb = load_workbook(input_file, keep_vba=True)
+    ws = wb[sheet_name]
+
+    num_shapes = ws.max_column // 2
+    num_cols = 2 * num_shapes
+    if ws.max_row < first_data_row:
+        return 0
+
+    if ws.max_column % 2:
+        odd_cells = sum(
+            value is not None
+            for (value,) in ws.iter_rows(min_row=first_data_row, max_row=ws.max_row,
+                                         min_col=ws.max_column, max_col=ws.max_column,
+                                         values_only=True)
+        )
+        if odd_cells:
+            print(f"Warning: column {ws.cell(row=1, column=ws.max_column).column_letter} of "
+                  f"{sheet_name} has no X column and was left unchanged ({odd_cells} values)")
+    if num_shapes == 0:
+        return 0
+
+    rows = list(ws.iter_rows(min_row=first_data_row, max_row=ws.max_row,
+                             min_col=1, max_col=num_cols))
+    not_numbers = [cell.coordinate for row in rows for cell in row
+                   if cell.value is not None and not isinstance(cell.value, Number)]
+    if not_numbers:
+        shown = ', '.join(not_numbers[:10]) + (' ...' if len(not_numbers) > 10 else '')
+        raise ValueError(f"{sheet_name} has formula or text cells in the vertex block "
+                         f"({shown}); reorder to a new file instead of in place")
+
+    values, blank = sheet_block_to_array([[cell.value for cell in row] for row in rows], num_cols)
+    report_partial_vertex_rows(values)
+    reordered = reorder_shapes_clockwise(values)
+
+    # A cell is unchanged if it keeps its number, or stays empty
+    unchanged = (reordered == values) | (np.isnan(reordered) & blank)
+    changed_cells = np.argwhere(~unchanged)
+    for row_i, col_i in changed_cells:
+        new_value = reordered[row_i, col_i]
+        ws.cell(row=first_data_row + int(row_i), column=int(col_i) + 1).value = (
+            None if np.isnan(new_value) else float(new_value)
+        )
+
+    if len(changed_cells):
+        wb.save(input_file)
+    return len(changed_cells)
+
+def reorder_workbook(input_file, output_file, sheet_name, header_option=0):
+    """
+    Reorder every shape of 'sheet_name' clockwise and save the sheet to
+    'output_file' (a new .xlsx holding only the reordered sheet).
+    header_option follows pd.read_excel: 0 for one header row, None for none.
+    """
+    # -------------------------------------------------------------------
+    # 1) READ THE EXCEL SHEET INTO A FLOAT ARRAY
+    # -------------------------------------------------------------------
+    # We do not drop NaNs here; we read everything, including empty cells,
+    # because shapes might not all have the same row count.
+    # Cells that cannot be parsed as numbers become NaN and are ignored.
+    if load_vertex_array is not None:
+        # Stream the sheet straight into a float array (read-only openpyxl)
+        header_rows = 0 if header_option is None else header_option + 1
+        header, values = load_vertex_array(input_file, sheet_name, header_rows=header_rows)
+        columns = list(header[-1]) if header else None
+    else:
+        df = pd.read_excel(input_file, sheet_name=sheet_name, header=header_option)
+        columns = df.columns
+        values = df.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    
+    # -------------------------------------------------------------------
+    # 2) PROCESS ALL SHAPES AT ONCE
+    # -------------------------------------------------------------------
+    # We assume each shape has exactly 2 columns: R and X.
+    # Sort every shape clockwise (first point repeated) in one pass.
+    # Shapes keep their columns and are filled from the top row downward;
+    # leftover rows become NaN and an extra closing point that does not
+    # fit in the sheet is lost, exactly as in sort_points_clockwise.
+    report_partial_vertex_rows(values, columns)
+    reordered = reorder_shapes_clockwise(values)
+    
+    # -------------------------------------------------------------------
+    # 3) SAVE THE REORDERED DATA TO A NEW EXCEL FILE
+    # -------------------------------------------------------------------
+    # Keep the sheet name so the output can be read like the input file
+    pd.DataFrame(reordered, columns=columns).to_excel(output_file, sheet_name=sheet_name, index=False)
+    print(f"Clockwise-converted data saved to {output_file}")
+
 def main():
     # -------------------------------------------------------------------
     # 1) CONFIGURATION
@@ -39,82 +248,22 @@ def main():
     # If your numeric data is literally from the first row, use header=None.
     # Adjust as needed:
     header_option = 0  # or None, depending on your file structure
+
+    # Update the input workbook in place instead of writing output_file?
+    # If True, only the changed cells of sheet_name are rewritten and the
+    # .xlsm is saved with its macros and other sheets untouched.
+    in_place = False
+
+    if in_place:
+        first_data_row = 1 if header_option is None else header_option + 2
+        updated = reorder_sheet_in_place(input_file, sheet_name, first_data_row)
+        print(f"Clockwise-converted data updated in place in {input_file} ({updated} cells changed)")
+        return
     
     # -------------------------------------------------------------------
-    # 2) READ THE EXCEL SHEET INTO A DATAFRAME
-    # -------------------------------------------------------------------
-    # We do not dropna here; we read everything, including NaNs, 
-    # because shapes might not all have the same row count.
-    df = pd.read_excel(input_file, sheet_name=sheet_name, header=header_option)
-    
-    # If you definitely do NOT have any header row and want to treat 
-    # the first row as data, use header=None:
-    # df = pd.read_excel(input_file, sheet_name=sheet_name, header=None)
-    
-    # -------------------------------------------------------------------
-    # 3) IDENTIFY SHAPES (COLUMN PAIRS)
-    # -------------------------------------------------------------------
-    all_columns = df.columns
-    num_cols = len(all_columns)
-    
-    # We assume each shape has exactly 2 columns: R and X
-    num_shapes = num_cols // 2
-    
-    # -------------------------------------------------------------------
-    # 4) PROCESS EACH SHAPE
-    # -------------------------------------------------------------------
-    for shape_index in range(num_shapes):
-        # Columns for this shape
-        r_col = all_columns[2 * shape_index]
-        x_col = all_columns[2 * shape_index + 1]
-        
-        # Gather all (R, X) pairs from these two columns, ignoring rows where both are NaN
-        shape_points = []
-        for row_i in range(len(df)):
-            r_val = df.at[row_i, r_col]
-            x_val = df.at[row_i, x_col]
-            
-            # If both are NaN or None, skip
-            if pd.isna(r_val) and pd.isna(x_val):
-                continue
-            
-            # If either is numeric, collect them (coercing them to float if possible)
-            try:
-                r_float = float(r_val)
-                x_float = float(x_val)
-                shape_points.append((r_float, x_float))
-            except:
-                # If there's a row that can't be parsed as float, skip or handle differently
-                pass
-        
-        # Sort the shape points in clockwise order, with the first repeated
-        shape_points_clockwise = sort_points_clockwise(shape_points)
-        
-        # Now we must write them back into the same columns/rows
-        # so that the format remains consistent.
-        # We'll fill from the top row downward with the new points.
-        # If the new shape has more points than the original, the extra will be lost
-        # If the new shape has fewer, we'll fill the leftover rows with NaN.
-        
-        # The total number of rows we can fill is the same as the existing DataFrame length.
-        max_rows = len(df)
-        
-        # Keep track of how many points we actually have
-        for row_i in range(max_rows):
-            if row_i < len(shape_points_clockwise):
-                # Write the reordered data
-                df.at[row_i, r_col] = shape_points_clockwise[row_i][0]
-                df.at[row_i, x_col] = shape_points_clockwise[row_i][1]
-            else:
-                # If no more points, set to NaN
-                df.at[row_i, r_col] = np.nan
-                df.at[row_i, x_col] = np.nan
-    
-    # -------------------------------------------------------------------
-    # 5) SAVE THE UPDATED DATAFRAME TO A NEW EXCEL FILE
+    # 2) REORDER AND SAVE
     # -------------------------------------------------------------------
-    df.to_excel(output_file, index=False)
-    print(f"Clockwise-converted data saved to {output_file}")
+    reorder_workbook(input_file, output_file, sheet_name, header_option)
 
 if __name__ == '__main__':
     main()
@@ -1,72 +1,30 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+import json
 import os
+import re
+import time
 from matplotlib.colors import LinearSegmentedColormap, Normalize
-from PIL import Image
+from PIL import Image, ImageDraw
 
-# UTILITY FUNCTIONS
+from output_sink import open_sink, as_sink, PalettePngSink
 
-def get_column_name(df, possible_names):
-    """
-    Find the actual column name from a list of possible column names.
-    Helps handle different naming conventions in input files.
-    
-    Args:
-        df: DataFrame to search in
-        possible_names: List of possible column names to look for
-        
-    Returns:
-        Actual column name if found, otherwise raises ValueError
-    """
-    for name in possible_names:
-        if name in df.columns:
-            return name
-    raise ValueError(f"Could not find any column with names: {possible_names}")
+# Reading and compliance evaluation live in loci_core.py; they are imported
+# here so existing callers of this script keep working
+from loci_core import (get_column_name, read_order_sheet, load_loci_inputs, determine_dynamic_titles,
+                       limit_column_for, colorbar_label_for, load_order_data, load_order_arrays,
+                       with_limit, order_summary, evaluate_limits, limit_basis_label,
+                       write_compliance_matrix, load_envelope_arrays, load_envelope_data,
+                       write_envelope_summary, write_compliance_summary)
 
-def load_loci_inputs(file_path, sheet_name='Harmonic Limits'):
-    """Loads harmonic limits from an Excel file."""
-    try:
-        df = pd.read_excel(file_path, sheet_name=sheet_name, engine='openpyxl')
-        print(f"Successfully loaded sheet '{sheet_name}' with columns: {df.columns.tolist()}")
-        return df
-    except Exception as e:
-        print(f"Error loading loci inputs: {e}")
-        print(f"Available sheets in file: {pd.ExcelFile(file_path, engine='openpyxl').sheet_names}")
-        return pd.DataFrame()
+# Written by plotsave when several limit columns are evaluated
+COMPLIANCE_MATRIX_FILE = 'Compliance_Matrix.xlsx'
 
-def determine_dynamic_titles(loci_inputs_file, excel_file):
-    """
-    Determine the main title and the dynamic label for the color bar.
-    """
-    try:
-        df = pd.read_excel(loci_inputs_file, sheet_name='Harmonic Limits', engine='openpyxl', header=None)
+# Written by plotsave when the envelope of several scenario workbooks is plotted
+ENVELOPE_SUMMARY_FILE = 'Scenario_Envelope.xlsx'
 
-        # Determine main title and colorbar label based on filename
-        excel_file_lower = excel_file.lower()
-        
-        if "vhinc" in excel_file_lower:
-            main_title = "Vhinc"
-            colorbar_label = "Incremental Distortion"
-        elif "vh inc" in excel_file_lower:
-            main_title = "Vh inc"
-            colorbar_label = "Incremental Distortion"
-        elif "vhtotal" in excel_file_lower or "vh total" in excel_file_lower:
-            main_title = "VhTotal"
-            colorbar_label = "Total Harmonic Distortion"
-        elif "g5" in excel_file_lower or "g55" in excel_file_lower:
-            # G5/5 files - different title and colorbar label
-            main_title = "G5/5"
-            colorbar_label = "G5/5 Planning"
-        else:
-            main_title = "VhTotal"
-            colorbar_label = "Total Harmonic Distortion"
-        
-        return main_title, colorbar_label
-    except Exception as e:
-        print(f"Error determining titles: {e}")
-        # Default values if there's an error
-        return "VhTotal", "Total Harmonic Distortion"
+# UTILITY FUNCTIONS
 
 def create_continuous_colormap():
     """
@@ -98,30 +56,757 @@ def plot_terr(ax, RR, XX, HD, cmap, norm, marker_size=8):
     scatter = ax.scatter(RR, XX, c=HD, cmap=cmap, norm=norm, s=marker_size, edgecolor='none', alpha=0.85)
     return scatter
 
+# PAGE RENDERING
+
+# Subplot appearance on the regular summary pages and the non-compliant pages
+SUMMARY_STYLE = dict(marker_size=7, star_size=18, title_fontsize=7, title_pad=18, tick_labelsize=6)
+NON_COMPLIANT_STYLE = dict(marker_size=10, star_size=22, title_fontsize=8, title_pad=19, tick_labelsize=7)
+
+def draw_order_subplot(ax, info, cmap, norm, Loci_unit, style):
+    """Draw one harmonic order (scatter, worst-case star and annotations) on ax."""
+    # Plot the scatter points
+    plot_terr(ax, info['RR'], info['XX'], info['HD'] / info['limit'], cmap, norm, marker_size=style['marker_size'])
+    
+    # Mark the worst-case point with a star
+    ax.scatter(
+        info['worst_case_R'], info['worst_case_X'],
+        color=cmap(norm(info['worst_case_hd'] / info['limit'])), marker='*', s=style['star_size'],
+        linewidths=0.4, edgecolor='black', zorder=1, label='Worst-case HD'
+    )
+    
+    # Title in red if this harmonic order exceeds its limit
+    title_color = 'red' if info['non_compliant'] else 'black'
+    ax.set_title(
+        f'Harmonic Order: {info["harmonic_order"]}', fontsize=style['title_fontsize'], weight='bold',
+        pad=style['title_pad'], color=title_color
+    )
+    
+    # Add worst-case details above plot
+    ax.text(
+        0.5, 1.1,
+        f"Worst-case HD = {info['worst_case_hd']:.2f}% at R = {info['worst_case_R']:.1f} {Loci_unit}, X = {info['worst_case_X']:.1f} {Loci_unit}",
+        ha='center', va='bottom', fontsize=5, transform=ax.transAxes,
+        color=title_color
+    )
+    
+    # Add axis labels
+    ax.set_xlabel(f'R [{Loci_unit}]', fontsize=6, labelpad=5)
+    ax.set_ylabel(f'X [{Loci_unit}]', fontsize=6, labelpad=5)
+    
+    # Add HD Limit annotation - positioned at top right inside plot area
+    ax.annotate(
+        f'HD Limit = {info["limit"]:.2f}%',
+        xy=(0.98, 0.98),
+        xycoords='axes fraction',
+        fontsize=5,
+        ha='right',
+        va='top',
+        bbox=dict(boxstyle='round,pad=0.2', fc='white', ec='gray', alpha=0.8),
+        rotation=0
+    )
+    
+    # Configure axis appearance
+    ax.tick_params(axis='both', which='major', labelsize=style['tick_labelsize'])
+    ax.grid(visible=True, which='major', color='gray', linestyle='-', linewidth=0.5, alpha=0.5)
+    ax.minorticks_on()
+
+def add_page_colorbar(fig, cmap, norm, colorbar_label):
+    """Add the horizontal HD/Limit colorbar at the bottom of a 5×3 page."""
+    cbar_ax = fig.add_axes([0.15, 0.05, 0.7, 0.025])
+    cbar = fig.colorbar(
+        plt.cm.ScalarMappable(norm=norm, cmap=cmap),
+        cax=cbar_ax, spacing='uniform', orientation='horizontal', ticks=[0, 1, 2, 3, 4, 5]
+    )
+    cbar.set_label(colorbar_label, fontsize=9)
+    cbar.ax.tick_params(labelsize=8)
+
+def render_summary_page(infos, page_number, main_title, colorbar_label, output_folder, Loci_unit='Ω', dpi=150):
+    """
+    Render one regular summary page (up to 15 harmonic orders in a 5×3 grid)
+    and save it as '<main_title>_Page_<page_number>.png'.
+    
+    Returns:
+        Path of the saved image
+    """
+    cmap, norm = create_continuous_colormap()
+    
+    # Create figure with 5×3 grid of subplots - original compact size
+    fig, axs = plt.subplots(5, 3, figsize=(10, 14), dpi=dpi)  # Back to original compact size
+    # Add a thin blue border to the entire figure
+    fig.patch.set_linewidth(1)  # Set border width
+    fig.patch.set_edgecolor('#1E90FF')  # Set border color to blue
+    axs = axs.flatten()  # Flatten 2D array of axes for easier indexing
+
+    # Create a subplot for each harmonic order, turn off remaining subplots
+    for subplot_idx in range(len(axs)):
+        if subplot_idx >= len(infos):
+            axs[subplot_idx].axis('off')
+            continue
+        draw_order_subplot(axs[subplot_idx], infos[subplot_idx], cmap, norm, Loci_unit, SUMMARY_STYLE)
+    
+    # Add page title showing harmonic orders on this page
+    harmonic_orders = [info['harmonic_order'] for info in infos]
+    fig.suptitle(
+        r'$\bf{' + main_title + '}$' + f'\nHarmonic Orders: {harmonic_orders}',
+        fontsize=10
+    )
+    
+    # Adjust layout - optimized for compact size with proper spacing and colorbar room
+    fig.subplots_adjust(hspace=0.65, wspace=0.25, left=0.08, right=0.92, top=0.93, bottom=0.12)
+    
+    # Add colorbar at the bottom with proper positioning
+    add_page_colorbar(fig, cmap, norm, colorbar_label)
+    
+    # Save the figure with optimized DPI for file size
+    sink = as_sink(output_folder)
+    output_name = f'{main_title}_Page_{page_number}.png'
+    with sink.open(output_name) as f:
+        fig.savefig(f, format='png', dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return sink.location(output_name)
+
+def render_non_compliant_page(infos, page_number, num_pages, main_title, colorbar_label, output_folder, Loci_unit='Ω',
+                              dpi=150):
+    """
+    Render one page of the non-compliant harmonic order summary and save it
+    as 'Non_Compliant_Harmonic_Summation_A4_Optimized[_Page_N].png'.
+    
+    Returns:
+        Path of the saved image
+    """
+    cmap, norm = create_continuous_colormap()
+    
+    # Create a figure for this page of non-compliant harmonic orders - SAME AS REGULAR SHEETS
+    fig_nc, axs_nc = plt.subplots(5, 3, figsize=(10, 14), dpi=dpi)
+    axs_nc = axs_nc.flatten()
+    
+    # Create a subplot for each non-compliant harmonic order on this page
+    for page_idx, info in enumerate(infos):
+        draw_order_subplot(axs_nc[page_idx], info, cmap, norm, Loci_unit, NON_COMPLIANT_STYLE)
+    
+    # Remove unused subplots - EXACTLY like regular sheets
+    for idx in range(len(infos), len(axs_nc)):
+        fig_nc.delaxes(axs_nc[idx])
+    
+    # Add title showing non-compliant harmonic orders for this page - SAME FORMAT AS REGULAR SHEETS
+    nc_harmonic_orders = sorted(info['harmonic_order'] for info in infos)
+    fig_nc.suptitle(
+        r'$\bf{' + main_title + '}$' + f'\nNon-Compliant Harmonic Orders: {nc_harmonic_orders}',
+        fontsize=10  # Same as regular sheets
+    )
+    
+    # Adjust layout - EXACTLY SAME AS REGULAR SHEETS
+    fig_nc.subplots_adjust(hspace=0.65, wspace=0.25, left=0.08, right=0.92, top=0.93, bottom=0.12)
+    
+    # Add colorbar - EXACTLY SAME POSITIONING AS REGULAR SHEETS
+    add_page_colorbar(fig_nc, cmap, norm, colorbar_label)
+    
+    # Save the figure with optimized DPI
+    page_suffix = f"_Page_{page_number}" if num_pages > 1 else ""
+    sink = as_sink(output_folder)
+    nc_output_name = f'Non_Compliant_Harmonic_Summation_A4_Optimized{page_suffix}.png'
+    with sink.open(nc_output_name) as f:
+        fig_nc.savefig(f, format='png', dpi=dpi, bbox_inches='tight')
+    plt.close(fig_nc)
+    return sink.location(nc_output_name)
+
+def render_detailed_sheet(info, main_title, colorbar_label, output_folder, Loci_unit='Ω', dpi=150):
+    """
+    Render the full-size sheet of one non-compliant harmonic order and save it
+    as 'Non_Compliant_Harmonic_Order_<N>_Detailed.png'.
+    
+    Returns:
+        Path of the saved image
+    """
+    cmap, norm = create_continuous_colormap()
+    
+    # Create a figure with a single subplot that fills most of the page
+    fig_ind = plt.figure(figsize=(10, 14), dpi=dpi)  # Consistent compact size with other plots
+    
+    # Create a single subplot that takes up most of the figure area
+    ax_ind = fig_ind.add_subplot(111)
+    
+    # Plot the data points
+    plot_terr(ax_ind, info['RR'], info['XX'], info['HD'] / info['limit'], cmap, norm, marker_size=7)
+    
+    # Mark the worst-case point with a star
+    ax_ind.scatter(
+        info['worst_case_R'], info['worst_case_X'],
+        color=cmap(norm(info['worst_case_hd'] / info['limit'])), marker='*', s=22,
+        linewidths=0.4, edgecolor='black', zorder=1
+    )
+    
+    # Set axis labels and grid
+    ax_ind.set_xlabel(f'R [{Loci_unit}]', fontsize=7, labelpad=5)
+    ax_ind.set_ylabel(f'X [{Loci_unit}]', fontsize=7, labelpad=5)
+    ax_ind.tick_params(axis='both', which='major', labelsize=7)
+    ax_ind.grid(visible=True, which='major', color='gray', linestyle='-', linewidth=0.5, alpha=0.5)
+    ax_ind.minorticks_on()
+    
+    # Main title (Vh inc)
+    fig_ind.text(0.5, 0.97, 
+                 main_title, 
+                 ha='center', va='top', 
+                 fontsize=14, fontweight='bold', color='black')
+    
+    # Non-Compliant Order Title in Red (reduced spacing)
+    fig_ind.text(0.5, 0.94, 
+                 f"Non-Compliant Harmonic Order: [{info['harmonic_order']}]", 
+                 ha='center', va='top', 
+                 fontsize=12, fontweight='bold', color='red')
+    
+    # Worst-case details with network impedance (reduced spacing)
+    fig_ind.text(0.5, 0.91, 
+                 f"Worst-case HD = {info['worst_case_hd']:.2f}% at:\n"
+                 f"Before Site Integration - Z = {info['worst_case_R']:.1f} {'+' if info['worst_case_X'] >= 0 else '-'} j{abs(info['worst_case_X']):.1f} {Loci_unit}\n"
+                 f"After Site Integration - Z = {info['network_R']:.1f} {'+' if info['network_X'] >= 0 else '-'} j{abs(info['network_X']):.1f} {Loci_unit}", 
+                 ha='center', va='top', 
+                 fontsize=10, color='black')
+    
+    # Place HD Limit text at top right inside plot area
+    ax_ind.text(
+        0.98, 0.98,  # Top right corner inside plot
+        f"HD Limit = {info['limit']:.2f}%",
+        transform=ax_ind.transAxes,  # Use axes coordinates
+        ha='right', va='top',  # Right-aligned, top-aligned
+        fontsize=9, fontweight='bold',
+        bbox=dict(boxstyle='round,pad=0.3', fc='white', ec='gray', alpha=0.8),
+        rotation=0
+    )
+    
+    # Adjust layout and add horizontal color bar (moved up to avoid overlap)
+    fig_ind.tight_layout(rect=[0.05, 0.12, 0.95, 0.88])  # Adjust the rectangle to leave space for titles and colorbar
+    
+    cbar_ax_ind = fig_ind.add_axes([0.15, 0.06, 0.7, 0.02])
+    sm_ind = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
+    sm_ind.set_array([])
+    cbar_ind = fig_ind.colorbar(sm_ind, cax=cbar_ax_ind, orientation='horizontal', ticks=[0, 1, 2, 3, 4, 5])
+    cbar_ind.set_label(colorbar_label, fontsize=9)
+    cbar_ind.ax.tick_params(labelsize=8)
+    
+    # Save individual detailed sheet with optimized DPI
+    sink = as_sink(output_folder)
+    individual_output_name = f'Non_Compliant_Harmonic_Order_{info["harmonic_order"]}_Detailed.png'
+    with sink.open(individual_output_name) as f:
+        fig_ind.savefig(f, format='png', dpi=dpi, bbox_inches='tight')
+    plt.close(fig_ind)
+    return sink.location(individual_output_name)
+
+# TILE COMPOSITING
+# Each harmonic order is drawn once into an image tile; summary and
+# non-compliant pages are then assembled from tiles with PIL instead of
+# redrawing every scatter plot for every page it appears on.
+
+PAGE_DPI = 150
+TILE_SIZE = (3.3, 2.5)        # inches per harmonic order tile
+PAGE_GRID = (5, 3)            # rows, columns of tiles per page
+TITLE_STRIP_HEIGHT = 0.5      # inches above the tiles
+COLORBAR_STRIP_HEIGHT = 0.8   # inches below the tiles
+PAGE_MARGIN = 0.15            # inches left/right of the tile grid
+SUMMARY_BORDER_COLOR = '#1E90FF'
+NON_COMPLIANT_BORDER_COLOR = 'red'
+
+def page_pixel_size(dpi=PAGE_DPI):
+    """Pixel (tile width, tile height, margin, page width) of a composed page."""
+    tile_w, tile_h = int(round(TILE_SIZE[0] * dpi)), int(round(TILE_SIZE[1] * dpi))
+    margin = int(round(PAGE_MARGIN * dpi))
+    return tile_w, tile_h, margin, PAGE_GRID[1] * tile_w + 2 * margin
+
+def strip_figsize(height, dpi=PAGE_DPI):
+    """Figure size of a strip spanning exactly the composed page width."""
+    # Agg truncates the figure size to whole pixels, so aim half a pixel over
+    return ((page_pixel_size(dpi)[3] + 0.5) / dpi, height)
+
+def figure_to_image(fig):
+    """Rasterize a matplotlib figure into an RGB PIL image and close it."""
+    fig.canvas.draw()
+    image = Image.fromarray(np.asarray(fig.canvas.buffer_rgba())).convert('RGB')
+    plt.close(fig)
+    return image
+
+def render_order_tile(info, Loci_unit='Ω', dpi=PAGE_DPI, style=SUMMARY_STYLE):
+    """Draw one harmonic order into an image tile (NON_COMPLIANT_STYLE for the non-compliant pages)."""
+    cmap, norm = create_continuous_colormap()
+    fig = plt.figure(figsize=TILE_SIZE, dpi=dpi)
+    fig.patch.set_facecolor('white')
+    ax = fig.add_axes([0.17, 0.17, 0.78, 0.58])
+    draw_order_subplot(ax, info, cmap, norm, Loci_unit, style)
+    return figure_to_image(fig)
+
+def render_title_strip(title, dpi=PAGE_DPI):
+    """Render the two-line page title (bold analysis type + harmonic orders)."""
+    fig = plt.figure(figsize=strip_figsize(TITLE_STRIP_HEIGHT, dpi), dpi=dpi)
+    fig.patch.set_facecolor('white')
+    fig.text(0.5, 0.5, title, ha='center', va='center', fontsize=10)
+    return figure_to_image(fig)
+
+def render_colorbar_strip(colorbar_label, dpi=PAGE_DPI):
+    """Render the horizontal HD/Limit colorbar once so every page can reuse it."""
+    cmap, norm = create_continuous_colormap()
+    fig = plt.figure(figsize=strip_figsize(COLORBAR_STRIP_HEIGHT, dpi), dpi=dpi)
+    fig.patch.set_facecolor('white')
+    cbar_ax = fig.add_axes([0.15, 0.6, 0.7, 0.25])
+    cbar = fig.colorbar(
+        plt.cm.ScalarMappable(norm=norm, cmap=cmap),
+        cax=cbar_ax, spacing='uniform', orientation='horizontal', ticks=[0, 1, 2, 3, 4, 5]
+    )
+    cbar.set_label(colorbar_label, fontsize=9)
+    cbar.ax.tick_params(labelsize=8)
+    return figure_to_image(fig)
+
+def compose_page(tiles, title_strip, colorbar_strip, border_color=None, dpi=PAGE_DPI):
+    """
+    Paste up to 15 tiles in a 5×3 grid between the title and colorbar strips.
+    
+    Returns:
+        The composed page as an RGB PIL image
+    """
+    rows, cols = PAGE_GRID
+    tile_w, tile_h, margin, width = page_pixel_size(dpi)
+    height = title_strip.height + rows * tile_h + colorbar_strip.height
+    
+    page = Image.new('RGB', (width, height), 'white')
+    page.paste(title_strip, (0, 0))
+    for idx, tile in enumerate(tiles[:rows * cols]):
+        row, col = divmod(idx, cols)
+        page.paste(tile, (margin + col * tile_w, title_strip.height + row * tile_h))
+    page.paste(colorbar_strip, (0, title_strip.height + rows * tile_h))
+    
+    if border_color:
+        # Thin border around the page, like the figure edge of regular sheets
+        ImageDraw.Draw(page).rectangle([0, 0, width - 1, height - 1], outline=border_color, width=1)
+    return page
+
+def save_page_image(page, output_name, output_folder):
+    """Save a composed page as PNG to a folder or output sink. Returns its location."""
+    sink = as_sink(output_folder)
+    with sink.open(output_name) as f:
+        page.save(f, format='PNG', dpi=(PAGE_DPI, PAGE_DPI))
+    return sink.location(output_name)
+
+def compose_summary_page(tiles, harmonic_orders, page_number, main_title, colorbar_strip, output_folder):
+    """Assemble a regular summary page from order tiles and save it as '<main_title>_Page_<n>.png'."""
+    title_strip = render_title_strip(r'$\bf{' + main_title + '}$' + f'\nHarmonic Orders: {harmonic_orders}')
+    page = compose_page(tiles, title_strip, colorbar_strip, border_color=SUMMARY_BORDER_COLOR)
+    return save_page_image(page, f'{main_title}_Page_{page_number}.png', output_folder)
+
+def compose_non_compliant_page(tiles, harmonic_orders, page_number, num_pages, main_title, colorbar_strip, output_folder):
+    """
+    Assemble one non-compliant summary page from non-compliant style tiles
+    (see render_order_tile) inside a red page border.
+    """
+    title_strip = render_title_strip(
+        r'$\bf{' + main_title + '}$' + f'\nNon-Compliant Harmonic Orders: {sorted(harmonic_orders)}'
+    )
+    page = compose_page(tiles, title_strip, colorbar_strip, border_color=NON_COMPLIANT_BORDER_COLOR)
+    page_suffix = f"_Page_{page_number}" if num_pages > 1 else ""
+    return save_page_image(page, f'Non_Compliant_Harmonic_Summation_A4_Optimized{page_suffix}.png', output_folder)
+
+# RENDER BUDGET
+# With a time budget the compliance summary is written first and the pages
+# are rendered most important first. Each page is drawn at the best quality
+# level that still leaves time for as many of the later pages as possible;
+# pages that no longer fit are skipped, and every decision is recorded in
+# Render_Report.json.
+
+# Quality levels from best to cheapest: (dpi, keep every n-th point)
+RENDER_LEVELS = [(150, 1), (100, 1), (100, 4), (72, 16)]
+
+# Measured render cost of each level, relative to the fixed cost of a page at
+# the best level. The DPI hardly matters (figure setup, the loci polygons and
+# the colorbar dominate); decimation saves through the point cost below.
+LEVEL_COST = {(150, 1): 1.0, (100, 1): 1.0, (100, 4): 0.9, (72, 16): 0.9}
+
+# Starting fixed cost per page kind at the best level, corrected from the pages rendered so far
+PAGE_SECONDS = {'non_compliant_page': 4.0, 'detailed_sheet': 0.45, 'summary_page': 3.5}
+POINT_SECONDS = 12e-6  # per scatter point drawn, at any DPI
+
+# Time kept free for writing the report
+BUDGET_RESERVE_SECONDS = 1.0
+
+COMPLIANCE_SUMMARY_FILE = 'Compliance_Summary.xlsx'
+RENDER_REPORT_FILE = 'Render_Report.json'
+
+def decimate_info(info, step):
+    """Copy of an order dict keeping every step-th point plus the worst-case point."""
+    if step <= 1:
+        return info
+    keep = np.union1d(np.arange(0, len(info['HD']), step), [int(np.argmax(info['HD']))])
+    thinned = dict(info)
+    for key in ('RR', 'XX', 'HD'):
+        thinned[key] = info[key][keep]
+    return thinned
+
+class RenderBudget:
+    """Deadline and cost model for rendering the pages within a time budget."""
+    
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.start = time.monotonic()
+        self.page_seconds = dict(PAGE_SECONDS)
+        self.load_seconds = 0.0  # per order, measured while evaluating compliance
+    
+    def elapsed(self):
+        return time.monotonic() - self.start
+    
+    def remaining(self):
+        return self.seconds - self.elapsed() - BUDGET_RESERVE_SECONDS
+    
+    def estimate(self, job, level):
+        """Estimated seconds to load and render 'job' at 'level'."""
+        _, step = level
+        return (self.page_seconds[job['kind']] * LEVEL_COST[level] + self.load_seconds * len(job['orders'])
+                + POINT_SECONDS * job['points'] / step)
+    
+    def pages_that_fit(self, jobs, seconds):
+        """Number of 'jobs' that fit in 'seconds' at the cheapest level, in priority order."""
+        count = 0
+        for job in jobs:
+            cost = self.estimate(job, RENDER_LEVELS[-1])
+            if cost <= seconds:
+                seconds -= cost
+                count += 1
+        return count
+    
+    def choose_level(self, job, later_jobs):
+        """
+        Level for 'job' that leaves time for the most of 'later_jobs' (at the
+        cheapest level); among those, the best quality. The page is degraded
+        rather than a later page skipped. None when even the cheapest level
+        does not fit.
+        """
+        remaining = self.remaining()
+        best_level, best_count = None, -1
+        for level in RENDER_LEVELS:
+            left = remaining - self.estimate(job, level)
+            if left < 0:
+                continue
+            count = self.pages_that_fit(later_jobs, left)
+            if count > best_count:
+                best_level, best_count = level, count
+        return best_level
+    
+    def record(self, job, level, seconds):
+        """Correct the fixed cost of this page kind from a measured render."""
+        _, step = level
+        fixed = (seconds - self.load_seconds * len(job['orders'])
+                 - POINT_SECONDS * job['points'] / step) / LEVEL_COST[level]
+        self.page_seconds[job['kind']] = (self.page_seconds[job['kind']] + max(fixed, 0.0)) / 2
+
+def plan_render_jobs(summaries, points, orders_per_page=15):
+    """
+    Pages to render in priority order: the non-compliant pages, the detailed
+    sheets, then the regular summary pages.
+    
+    Args:
+        summaries: Order summaries (see order_summary), in sheet order
+        points: Dict of harmonic order -> number of R/X points
+        orders_per_page: Orders per summary page
+    """
+    def job(kind, orders, page_number=None, num_pages=None):
+        return {'kind': kind, 'orders': orders, 'page_number': page_number, 'num_pages': num_pages,
+                'points': sum(points[order] for order in orders)}
+    
+    all_orders = [summary['harmonic_order'] for summary in summaries]
+    nc_orders = [summary['harmonic_order'] for summary in summaries if summary['non_compliant']]
+    nc_pages = [nc_orders[i:i + orders_per_page] for i in range(0, len(nc_orders), orders_per_page)]
+    
+    jobs = [job('non_compliant_page', orders, page_idx + 1, len(nc_pages))
+            for page_idx, orders in enumerate(nc_pages)]
+    jobs += [job('detailed_sheet', [order]) for order in nc_orders]
+    jobs += [job('summary_page', all_orders[i:i + orders_per_page], i // orders_per_page + 1)
+             for i in range(0, len(all_orders), orders_per_page)]
+    return jobs
+
+def render_within_budget(budget, source, sheet_names, loci_inputs, main_title, colorbar_label, output_folder,
+                         Loci_unit='Ω', orders_per_page=15):
+    """
+    Evaluate every order, write Compliance_Summary.xlsx, then render the
+    pages in priority order (see plan_render_jobs), lowering the DPI or
+    decimating the scatter points when the deadline gets close and skipping
+    pages that no longer fit. Render_Report.json lists every page with its
+    status ('full', 'degraded' or 'skipped'), DPI, decimation step and
+    estimated and measured seconds. When the deadline comes while the
+    orders are still being evaluated, the summary covers the orders done so
+    far and the report lists the others as 'unevaluated'.
+    
+    Args:
+        budget: RenderBudget started when the run began
+        source: Results workbook, or list of scenario workbooks (envelope)
+        sheet_names: 'Harmonic Order N' sheets to plot
+        output_folder: Folder path or OutputSink
+    
+    Returns:
+        List of order summaries (see order_summary), in sheet order, of the
+        evaluated orders
+    """
+    load = load_envelope_data if isinstance(source, (list, tuple)) else load_order_data
+    sink = as_sink(output_folder)
+    
+    # Compliance first: it is the result that must survive a timeout, so
+    # stop loading when the next order would not finish before the deadline
+    print('Evaluating compliance for Harmonic Orders:')
+    summaries, points, sheet_for = [], {}, {}
+    unevaluated = []
+    evaluation_start = budget.elapsed()
+    for sheet_idx, sheet in enumerate(sheet_names):
+        if summaries and budget.remaining() < (budget.elapsed() - evaluation_start) / len(summaries):
+            unevaluated = list(sheet_names[sheet_idx:])
+            print(f"Out of time: {len(unevaluated)} orders not evaluated")
+            break
+        info = load(source, sheet, loci_inputs, main_title)
+        summaries.append(order_summary(info))
+        points[info['harmonic_order']] = len(info['HD'])
+        sheet_for[info['harmonic_order']] = sheet
+        del info
+    budget.load_seconds = (budget.elapsed() - evaluation_start) / max(len(summaries), 1)
+    with sink.open(COMPLIANCE_SUMMARY_FILE) as f:
+        write_compliance_summary(summaries, f)
+    
+    jobs = plan_render_jobs(summaries, points, orders_per_page)
+    entries = []
+    for job_idx, job in enumerate(jobs):
+        level = budget.choose_level(job, jobs[job_idx + 1:])
+        entry = {'kind': job['kind'], 'page': job['page_number'], 'orders': job['orders'], 'file': None,
+                 'status': 'skipped', 'dpi': None, 'decimation': None,
+                 'estimated_seconds': round(budget.estimate(job, level or RENDER_LEVELS[-1]), 2),
+                 'seconds': None}
+        entries.append(entry)
+        if level is None:
+            print(f"Skipping {job['kind']} {job['orders']}: out of time")
+            continue
+        
+        start = time.monotonic()
+        dpi, step = level
+        infos = [decimate_info(load(source, sheet_for[order], loci_inputs, main_title), step)
+                 for order in job['orders']]
+        if job['kind'] == 'non_compliant_page':
+            location = render_non_compliant_page(infos, job['page_number'], job['num_pages'], main_title,
+                                                 colorbar_label, sink, Loci_unit, dpi)
+        elif job['kind'] == 'detailed_sheet':
+            print(f"Creating detailed sheet for Harmonic Order {job['orders'][0]}")
+            location = render_detailed_sheet(infos[0], main_title, colorbar_label, sink, Loci_unit, dpi)
+        else:
+            location = render_summary_page(infos, job['page_number'], main_title, colorbar_label, sink,
+                                           Loci_unit, dpi)
+        del infos
+        seconds = time.monotonic() - start
+        budget.record(job, level, seconds)
+        entry.update({'file': location, 'status': 'full' if level == RENDER_LEVELS[0] else 'degraded',
+                      'dpi': dpi, 'decimation': step, 'seconds': round(seconds, 2)})
+    
+    statuses = [entry['status'] for entry in entries]
+    report = {
+        'time_budget': budget.seconds,
+        'elapsed_seconds': round(budget.elapsed(), 2),
+        'complete': not unevaluated and all(status == 'full' for status in statuses),
+        'full': statuses.count('full'),
+        'degraded': statuses.count('degraded'),
+        'skipped': statuses.count('skipped'),
+        'unevaluated': unevaluated,
+        'pages': entries,
+    }
+    sink.write_bytes(RENDER_REPORT_FILE, json.dumps(report, indent=2, ensure_ascii=False).encode('utf-8'))
+    print(f"Render budget: {report['full']} full, {report['degraded']} degraded, "
+          f"{report['skipped']} skipped in {report['elapsed_seconds']} s")
+    return summaries
+
 # MAIN PLOTTING FUNCTION
 
+def print_png_savings(savings):
+    """Print the bytes saved per page by PNG palette quantization (see PalettePngSink)."""
+    print('\nPNG size optimization:')
+    for name, original, written in savings:
+        print(f"  {name}: {original:,} -> {written:,} bytes (saved {original - written:,})")
+    original_total = sum(original for _, original, _ in savings)
+    saved_total = original_total - sum(written for _, _, written in savings)
+    if original_total:
+        print(f"  Total: saved {saved_total:,} of {original_total:,} bytes ({saved_total / original_total:.0%})")
+
+def basis_folder_name(limit_column):
+    """Folder name for the plots checked against 'limit_column'."""
+    return re.sub(r'[\\/:*?"<>|]+', '-', limit_column).strip()
+
+def iter_order_pages(excel_file, sheet_names, loci_inputs, main_title, orders_per_page=15):
+    """
+    Load and evaluate the harmonic order sheets one summary page at a time.
+    A list of workbooks yields the envelope of those scenarios.
+    """
+    load = load_envelope_data if isinstance(excel_file, (list, tuple)) else load_order_data
+    for i in range(0, len(sheet_names), orders_per_page):
+        yield [load(excel_file, sheet, loci_inputs, main_title)
+               for sheet in sheet_names[i:i + orders_per_page]]
+
+def order_sheet_names(excel_file):
+    """Names of the 'Harmonic Order N' sheets of a results workbook."""
+    xl = pd.ExcelFile(excel_file, engine='openpyxl')
+    return [sheet for sheet in xl.sheet_names if sheet.startswith("Harmonic Order")]
+
+def scenario_sheet_names(scenario_files):
+    """Order sheets of the first scenario workbook that every scenario has (only those can be enveloped)."""
+    sheet_names = order_sheet_names(scenario_files[0])
+    for scenario_file in scenario_files[1:]:
+        scenario_sheets = set(order_sheet_names(scenario_file))
+        for sheet in sheet_names:
+            if sheet not in scenario_sheets:
+                print(f"Skipping {sheet}: not in scenario {scenario_file}")
+        sheet_names = [sheet for sheet in sheet_names if sheet in scenario_sheets]
+    return sheet_names
+
+def save_envelope_summary(summaries, scenario_files, output_folder):
+    """Write the per-order envelope results as Scenario_Envelope.xlsx. Returns its location."""
+    sink = as_sink(output_folder)
+    with sink.open(ENVELOPE_SUMMARY_FILE) as f:
+        write_envelope_summary(summaries, [os.path.basename(path) for path in scenario_files], f)
+    return sink.location(ENVELOPE_SUMMARY_FILE)
+
+def render_non_compliant_batch(batch, page_number, num_pages, main_title, colorbar_label, colorbar_strip,
+                               output_folder, Loci_unit='Ω', tile_pages=False):
+    """Render one non-compliant summary page from a list of (order dict, tile) pairs."""
+    infos = [info for info, _ in batch]
+    if tile_pages:
+        compose_non_compliant_page(
+            [tile for _, tile in batch], [info['harmonic_order'] for info in infos],
+            page_number, num_pages, main_title, colorbar_strip, output_folder
+        )
+    else:
+        render_non_compliant_page(infos, page_number, num_pages, main_title, colorbar_label, output_folder, Loci_unit)
+
+def render_order_pages(pages, main_title, colorbar_label, output_folder, Loci_unit='Ω', tile_pages=False):
+    """
+    Render the summary pages, the non-compliant pages and the detailed
+    sheets of one limit basis.
+    
+    'pages' is consumed one page at a time. Each order is drawn on its
+    summary page and, when non-compliant, on its detailed sheet while it is
+    loaded; a non-compliant page is drawn as soon as it is full. Besides the
+    page being drawn, only the non-compliant orders waiting for the next
+    non-compliant page and a compact summary per order are kept, so memory
+    is bounded by about one page rather than the whole study.
+    
+    Args:
+        pages: Iterable of lists of evaluated order dicts, one list per
+            summary page (see iter_order_pages / with_limit)
+        main_title: Analysis type from determine_dynamic_titles
+        colorbar_label: Colorbar label of this limit basis
+        output_folder: Folder path or OutputSink where plots will be saved
+        Loci_unit: Unit for impedance values
+        tile_pages: If True, compose the summary and non-compliant pages
+            from image tiles (see render_order_tile)
+    
+    Returns:
+        List of order summaries (see order_summary), in sheet order
+    """
+    summaries = []
+    
+    # Non-compliant orders (with their tiles) not yet placed on a non-compliant page
+    items_per_page = 15
+    pending = []
+    nc_pages_written = 0
+    colorbar_strip = render_colorbar_strip(colorbar_label) if tile_pages else None
+    
+    # Generate main summary pages with all harmonic order
+    print('Creating plots for Harmonic Orders:')
+    for fig_idx, infos in enumerate(pages):
+        if tile_pages:
+            tiles = [render_order_tile(info, Loci_unit) for info in infos]
+            harmonic_orders = [info['harmonic_order'] for info in infos]
+            compose_summary_page(tiles, harmonic_orders, fig_idx + 1, main_title, colorbar_strip, output_folder)
+        else:
+            tiles = [None] * len(infos)
+            render_summary_page(infos, fig_idx + 1, main_title, colorbar_label, output_folder, Loci_unit)
+        
+        for info, tile in zip(infos, tiles):
+            summaries.append(order_summary(info))
+            if info['non_compliant']:
+                # Individual full-size sheet while the order is still loaded
+                print(f"Creating detailed sheet for Harmonic Order {info['harmonic_order']}")
+                render_detailed_sheet(info, main_title, colorbar_label, output_folder, Loci_unit)
+                if tile_pages:
+                    # The non-compliant pages use the larger markers of render_non_compliant_page
+                    tile = render_order_tile(info, Loci_unit, style=NON_COMPLIANT_STYLE)
+                pending.append((info, tile))
+        
+        # More orders than fit on one page means the non-compliant pages are
+        # numbered, so full pages can be written now (num_pages only needs to
+        # tell one page from several)
+        while len(pending) > items_per_page:
+            nc_pages_written += 1
+            render_non_compliant_batch(pending[:items_per_page], nc_pages_written, nc_pages_written + 1,
+                                       main_title, colorbar_label, colorbar_strip, output_folder,
+                                       Loci_unit, tile_pages)
+            del pending[:items_per_page]
+        
+        # Release this page before the next one is loaded
+        del infos, tiles
+    
+    # Generate the last (or only) non-compliant summary page
+    if pending:
+        render_non_compliant_batch(pending, nc_pages_written + 1, nc_pages_written + 1,
+                                   main_title, colorbar_label, colorbar_strip, output_folder,
+                                   Loci_unit, tile_pages)
+    return summaries
+
 def plotsave(
     excel_file, loci_inputs_file, loci_file, color_thresholds, output_folder,
     background_harmonics_file=None,
     background_sheet_name="Background Harmonic",
-    limits_sheetname='Harmonic Limits', Loci_unit='Ω', limit_label="Total Harmonic Distortion Limit"
+    limits_sheetname='Harmonic Limits', Loci_unit='Ω', limit_label="Total Harmonic Distortion Limit",
+    tile_pages=False, limit_columns=None, time_budget=None, optimize_png=False, point_index=False,
+    shard=None
 ):
     """
     Generate comprehensive harmonic plots from calculation results.
     
     Args:
-        excel_file: Path to Excel file with harmonic calculation results
+        excel_file: Path to Excel file with harmonic calculation results, or a
+            list of paths of scenario workbooks (e.g. import/export, HLF
+            cases). For a list, each order is plotted and checked on the
+            envelope of the scenarios (element-wise maximum HD per R/X
+            point) and Scenario_Envelope.xlsx records which scenario gives
+            each worst case; titles follow the first workbook.
         loci_inputs_file: Path to Excel file with harmonic limits
         loci_file: Path to impedance loci file (can be same as loci_inputs_file)
         color_thresholds: List of threshold values for color scale
-        output_folder: Path to folder where plots will be saved
+        output_folder: Where plots will be saved: a folder path, a path ending in
+            '.zip' (pages are compressed into the archive as they are rendered)
+            or an OutputSink (see output_sink.py), e.g. a MemorySink
         background_harmonics_file: Path to file with background harmonics (optional)
         background_sheet_name: Sheet name for background harmonics
         limits_sheetname: Sheet name containing harmonic limits (default: 'Harmonic Limits')
         Loci_unit: Unit for impedance values (Ω by default)
         limit_label: Label for distortion limits
+        tile_pages: If True, draw every harmonic order once as an image tile and
+            build the summary and non-compliant pages by pasting tiles
+        limit_columns: Optional list of limit columns of the limits sheet. Every
+            order is then loaded once and checked against all of them in one
+            pass; the ratio and pass/fail matrix is written to
+            Compliance_Matrix.xlsx and each limit basis is rendered into its
+            own subfolder from the same arrays.
+        time_budget: Optional seconds available for the whole run (e.g. the
+            serverless function limit). Compliance_Summary.xlsx is written
+            first, then the non-compliant pages, the detailed sheets and the
+            summary pages, at lower DPI or with decimated points when time
+            runs short; Render_Report.json records what was degraded or
+            skipped. Applies to a single limit basis; tile_pages is ignored.
+        optimize_png: If True, re-encode every page in memory as an adaptive
+            palette PNG with optimized compression before it is written, and
+            print the bytes saved per page.
+        point_index: If True, also save a spatial index of the R/X/HD points
+            (and network R/X) of every order in Point_Index/ for
+            interactive lookups (see point_index.py).
+        shard: Optional shard specification ('pages=1-2', 'orders=2-16' or the
+            same as a dict, see shard_page_numbers). Only those summary pages
+            and the detailed sheets of their non-compliant orders are
+            rendered (and, with point_index, indexed), and a partial
+            compliance summary is written; the non-compliant pages are left
+            to reduce_shards. Applies to a single limit basis; tile_pages
+            and time_budget are ignored.
     """
+    sink, owns_sink = None, False
     try:
+        budget = RenderBudget(time_budget) if time_budget else None
+        
         # Print diagnostic information to help with debugging
         print(f"Plot_subscript.py: Starting plot generation")
         print(f"Excel file: {excel_file}")
@@ -129,377 +814,255 @@ def plotsave(
         print(f"Output folder: {output_folder}")
         print(f"Looking for harmonic limits in sheet: {limits_sheetname}")
         
-        # Create output folder if it doesn't exist
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
-            print(f"Created output folder: {output_folder}")
+        # Create output folder (or archive) if it doesn't exist
+        sink, owns_sink = open_sink(output_folder)
+        if optimize_png:
+            sink = PalettePngSink(sink)
+        
+        # Several scenario workbooks are plotted as their envelope
+        scenario_files = list(excel_file) if isinstance(excel_file, (list, tuple)) else None
+        if scenario_files:
+            excel_file = scenario_files[0]
             
         # Load harmonic limits from Excel
         print(f"Loading harmonic limits from {limits_sheetname} sheet...")
         loci_inputs = load_loci_inputs(loci_inputs_file, limits_sheetname)
         print(f"Successfully loaded harmonic limits")
         
-        # Setup and initialization
-        
-        # Create colormap for HD/Limit ratio visualization
-        cmap, norm = create_continuous_colormap()
-        
         # Determine titles based on data type (incremental vs. total)
         main_title, colorbar_label = determine_dynamic_titles(loci_inputs_file, excel_file)
         
-        # Final colorbar label combines the type and the limit description
-        final_colorbar_label = f"HD/Limit ratio | Limit: {colorbar_label} Limit (%V1) at PCC"
+        # Set colorbar label based on the type of analysis
+        final_colorbar_label = colorbar_label_for(main_title)
         
         # Load all harmonic order sheets from the Excel file
-        xl = pd.ExcelFile(excel_file, engine='openpyxl')
-        sheet_names = [sheet for sheet in xl.sheet_names if sheet.startswith("Harmonic Order")]
+        sheet_names = order_sheet_names(excel_file)
+        source, load_arrays = excel_file, load_order_arrays
+        if scenario_files:
+            sheet_names = scenario_sheet_names(scenario_files)
+            print(f"Envelope of {len(scenario_files)} scenarios: {scenario_files}")
+            source, load_arrays = scenario_files, load_envelope_arrays
         
         # Define page layout parameters
         max_subplots = 15  # Maximum subplots per page (5×3 grid)
-        num_figures = (len(sheet_names) + max_subplots - 1) // max_subplots
-
-        # List to store information about non-compliant harmonic orders
-        non_compliant_info = []
-
-        # Set colorbar label based on the type of analysis
-        if main_title == "Vh inc" or main_title == "Vhinc":
-            final_colorbar_label = "HD/Limit ratio  |  Limit: Incremental Distortion Limit (%V1) at PCC"
-        elif main_title == "G5/5":
-            final_colorbar_label = "HD/Limit ratio  |  Limit: G5/5 Planning Limit (%V1) at PCC"
-        else:
-            final_colorbar_label = "HD/Limit ratio  |  Limit: Total Harmonic Distortion Limit (%V1) at PCC"
         
-        # Set title color based on the type of analysis
-        title_color = 'black'
+        if shard is not None:
+            pages = shard_page_numbers(shard, [int(sheet.split()[-1]) for sheet in sheet_names], max_subplots)
         
-        # Generate main summary pages with all harmonic order
-        print('Creating plots for Harmonic Orders:')
-        for fig_idx in range(num_figures):
-            # Create figure with 5×3 grid of subplots - original compact size
-            fig, axs = plt.subplots(5, 3, figsize=(10, 14), dpi=150)  # Back to original compact size
-            # Add a thin blue border to the entire figure
-            fig.patch.set_linewidth(1)  # Set border width
-            fig.patch.set_edgecolor('#1E90FF')  # Set border color to blue
-            axs = axs.flatten()  # Flatten 2D array of axes for easier indexing
-
-            # Create a subplot for each harmonic order
-            for subplot_idx in range(max_subplots):
-                global_idx = fig_idx * max_subplots + subplot_idx
-                
-                # If we've processed all sheets, turn off remaining subplots
-                if global_idx >= len(sheet_names):
-                    axs[subplot_idx].axis('off')
-                    continue
-                    
-                # Extract data for current harmonic order
-                sheet_name = sheet_names[global_idx]
-                df = pd.read_excel(excel_file, sheet_name=sheet_name, engine='openpyxl')
-                harmonic_order = int(sheet_name.split()[-1])
-                
-                # Find the appropriate column names (handles different naming conventions)
-                R_col = get_column_name(df, ['Initial R (Ω)', 'Initial R (ohm)', 'R (Ω)', 'R (ohm)'])
-                X_col = get_column_name(df, ['Initial X (Ω)', 'Initial X (ohm)', 'X (Ω)', 'X (ohm)'])
-                HD_col = get_column_name(df, ['Result HD', 'Max HD'])
-                
-                # Extract data values (skip header row)
-                RR = df[R_col].values[1:]
-                XX = df[X_col].values[1:]
-                HD = df[HD_col].values[1:]
-                
-                # Find worst-case (maximum) harmonic distortion
-                worst_case_hd = HD.max()
-                worst_case_index = np.argmax(HD)
-                worst_case_R = RR[worst_case_index]
-                worst_case_X = XX[worst_case_index]
-                
-                # Get limit for this harmonic order
-                limit_row = loci_inputs[loci_inputs['Harmonic Order (H)'] == harmonic_order]
-                if main_title == "Vh inc" or main_title == "Vhinc":
-                    limit = limit_row.iloc[0]['Incremental Distortion Limit (%V1) at PCC'] if not limit_row.empty else 1.0
-                else:  # For "VhTotal", "G5/5", or other total distortion types
-                    limit = limit_row.iloc[0]['Total Limit (%V1) at PCC'] if not limit_row.empty else 1.0
-                
-                # Ensure limit is valid
-                if limit <= 0:
-                    raise ValueError(f"Invalid limit ({limit}) for Harmonic Order {harmonic_order}")
-                
-                # Get current axis for this subplot
-                ax = axs[subplot_idx]
-                
-                # Plot the scatter points
-                scatter = plot_terr(ax, RR, XX, HD / limit, cmap, norm, marker_size=7)
-                
-                # Mark the worst-case point with a star
-                ax.scatter(
-                    worst_case_R, worst_case_X,
-                    color=cmap(norm(worst_case_hd / limit)), marker='*', s=18,
-                    linewidths=0.4, edgecolor='black', zorder=1, label='Worst-case HD'
-                )
-                
-                # Before setting the title, determine if this harmonic order exceeds its limit
-                title_color = 'red' if worst_case_hd / limit > 1 else 'black'
-                
-                # Add title with dynamic color
-                if subplot_idx < len(axs):
-                    ax.set_title(
-                        f'Harmonic Order: {harmonic_order}', fontsize=7, weight='bold', pad=18, color=title_color
-                    )
-                
-                # Add worst-case details above plot
-                ax.text(
-                    0.5, 1.1,
-                    f"Worst-case HD = {worst_case_hd:.2f}% at R = {worst_case_R:.1f} {Loci_unit}, X = {worst_case_X:.1f} {Loci_unit}",
-                    ha='center', va='bottom', fontsize=5, transform=ax.transAxes,
-                    color=title_color
-                )
-                
-                # Add axis labels
-                ax.set_xlabel(f'R [{Loci_unit}]', fontsize=6, labelpad=5)
-                ax.set_ylabel(f'X [{Loci_unit}]', fontsize=6, labelpad=5)
-                
-                # Add HD Limit annotation - positioned at top right inside plot area
-                ax.annotate(
-                    f'HD Limit = {limit:.2f}%',
-                    xy=(0.98, 0.98),
-                    xycoords='axes fraction',
-                    fontsize=5,
-                    ha='right',
-                    va='top',
-                    bbox=dict(boxstyle='round,pad=0.2', fc='white', ec='gray', alpha=0.8),
-                    rotation=0
-                )
-                
-                # Configure axis appearance
-                ax.tick_params(axis='both', which='major', labelsize=6)
-                ax.grid(visible=True, which='major', color='gray', linestyle='-', linewidth=0.5, alpha=0.5)
-                ax.minorticks_on()
-                
-                # Check if this harmonic order is non-compliant (exceeds limit)
-                if worst_case_hd / limit > 1:
-                    # For non-compliant orders, get network impedance values (post-integration)
-                    try:
-                        network_R = df['Network R (ohm)'].values[1:][worst_case_index]
-                        network_X = df['Network X (ohm)'].values[1:][worst_case_index]
-                    except (KeyError, IndexError):
-                        # Fallback if columns don't exist or index is out of range
-                        network_R = worst_case_R
-                        network_X = worst_case_X
-                    
-                    # Store information for non-compliant summary and individual sheets
-                    non_compliant_info.append({
-                        'harmonic_order': harmonic_order,
-                        'RR': RR,
-                        'XX': XX,
-                        'HD': HD,
-                        'limit': limit,
-                        'worst_case_hd': worst_case_hd,
-                        'worst_case_R': worst_case_R,
-                        'worst_case_X': worst_case_X,
-                        'network_R': network_R,
-                        'network_X': network_X
-                    })
-            
-            # Add page title showing harmonic orders on this page
-            harmonic_orders = [
-                int(sheet.split()[-1]) for sheet in sheet_names[fig_idx * max_subplots:(fig_idx + 1) * max_subplots]
+        if point_index:
+            # Optional feature: point_index.py is only needed when it is used
+            from point_index import INDEX_FOLDER, write_point_indexes
+            print(f"Writing point indexes to {INDEX_FOLDER}")
+            # A shard indexes the orders of its own pages only
+            index_sheets = sheet_names if shard is None else [
+                sheet for page_number in pages for sheet in page_sheet_names(sheet_names, page_number, max_subplots)
             ]
-            fig.suptitle(
-                r'$\bf{' + main_title + '}$' + f'\nHarmonic Orders: {harmonic_orders}',
-                fontsize=10
-            )
-            
-            # Adjust layout - optimized for compact size with proper spacing and colorbar room
-            fig.subplots_adjust(hspace=0.65, wspace=0.25, left=0.08, right=0.92, top=0.93, bottom=0.12)
-            
-            # Add colorbar at the bottom with proper positioning
-            cbar_ax = fig.add_axes([0.15, 0.05, 0.7, 0.025])
-            cbar = fig.colorbar(
-                plt.cm.ScalarMappable(norm=norm, cmap=cmap),
-                cax=cbar_ax, spacing='uniform', orientation='horizontal', ticks=[0, 1, 2, 3, 4, 5]
-            )
-            cbar.set_label(final_colorbar_label, fontsize=9)
-            cbar.ax.tick_params(labelsize=8)
-            
-            # Save the figure with optimized DPI for file size
-            output_file = os.path.join(output_folder, f'{main_title}_Page_{fig_idx + 1}.png')
-            fig.savefig(output_file, format='png', dpi=150, bbox_inches='tight')
-            plt.close(fig)
-        
-        # Generate summary sheet for all non-compliant harmonic orders
-        
-        if non_compliant_info:
-            # Determine how many pages we need
-            items_per_page = 15
-            num_pages = (len(non_compliant_info) + items_per_page - 1) // items_per_page  # Ceiling division
-            
-            for page in range(num_pages):
-                # Create a figure for this page of non-compliant harmonic orders - SAME AS REGULAR SHEETS
-                fig_nc, axs_nc = plt.subplots(5, 3, figsize=(10, 14), dpi=150)
-                axs_nc = axs_nc.flatten()
-                
-                # Calculate how many plots we'll have on this page
-                start_idx = page * items_per_page
-                end_idx = min((page + 1) * items_per_page, len(non_compliant_info))
-                num_plots_on_page = end_idx - start_idx
-                
-                # Process items for this page (start_idx and end_idx already calculated above)
-                
-                # Create a subplot for each non-compliant harmonic order on this page
-                for page_idx, overall_idx in enumerate(range(start_idx, end_idx)):
-                    ax = axs_nc[page_idx]
-                    info = non_compliant_info[overall_idx]
-                    
-                    # Plot data and mark worst-case point
-                    scatter_nc = plot_terr(ax, info['RR'], info['XX'], info['HD'] / info['limit'], cmap, norm, marker_size=10)
-                    ax.scatter(
-                        info['worst_case_R'], info['worst_case_X'],
-                        color=cmap(norm(info['worst_case_hd'] / info['limit'])), marker='*', s=22,
-                        linewidths=0.4, edgecolor='black', zorder=1, label='Worst-case HD'
-                    )
-                    
-                    # Add title in red to highlight non-compliance
-                    ax.set_title(
-                        f'Harmonic Order: {info["harmonic_order"]}', fontsize=8, weight='bold', pad=19, color='red'
-                    )
-                    
-                    # Add worst-case details
-                    ax.text(
-                        0.5, 1.1,
-                        f"Worst-case HD = {info['worst_case_hd']:.2f}% at R = {info['worst_case_R']:.1f} {Loci_unit}, X = {info['worst_case_X']:.1f} {Loci_unit}",
-                        ha='center', va='bottom', fontsize=5, transform=ax.transAxes,
-                        color=title_color
-                    )
-                    
-                    # Add axis labels
-                    ax.set_xlabel(f'R [{Loci_unit}]', fontsize=6, labelpad=5)
-                    ax.set_ylabel(f'X [{Loci_unit}]', fontsize=6, labelpad=5)
-                    
-                    # Add HD Limit annotation - positioned at top right inside plot area
-                    ax.annotate(
-                        f'HD Limit = {info["limit"]:.2f}%',
-                        xy=(0.98, 0.98),
-                        xycoords='axes fraction',
-                        fontsize=5,
-                        ha='right',
-                        va='top',
-                        bbox=dict(boxstyle='round,pad=0.2', fc='white', ec='gray', alpha=0.8),
-                        rotation=0
-                    )
-                    
-                    # Configure axis appearance
-                    ax.tick_params(axis='both', which='major', labelsize=7)
-                    ax.grid(visible=True, which='major', color='gray', linestyle='-', linewidth=0.5, alpha=0.5)
-                    ax.minorticks_on()
-                
-                # Remove unused subplots - EXACTLY like regular sheets
-                for idx in range(num_plots_on_page, len(axs_nc)):
-                    fig_nc.delaxes(axs_nc[idx])
-                
-                # Add title showing non-compliant harmonic orders for this page - SAME FORMAT AS REGULAR SHEETS
-                nc_harmonic_orders = sorted(info['harmonic_order'] for info in non_compliant_info[start_idx:end_idx])
-                fig_nc.suptitle(
-                    r'$\bf{' + main_title + '}$' + f'\nNon-Compliant Harmonic Orders: {nc_harmonic_orders}',
-                    fontsize=10  # Same as regular sheets
-                )
-                
-                # Adjust layout - EXACTLY SAME AS REGULAR SHEETS
-                fig_nc.subplots_adjust(hspace=0.65, wspace=0.25, left=0.08, right=0.92, top=0.93, bottom=0.12)
-                
-                # Add colorbar - EXACTLY SAME POSITIONING AS REGULAR SHEETS
-                cbar_ax_nc = fig_nc.add_axes([0.15, 0.05, 0.7, 0.025])
-                cbar_nc = fig_nc.colorbar(
-                    plt.cm.ScalarMappable(norm=norm, cmap=cmap),
-                    cax=cbar_ax_nc, spacing='uniform', orientation='horizontal', ticks=[0, 1, 2, 3, 4, 5]
-                )
-                cbar_nc.set_label(final_colorbar_label, fontsize=9)
-                cbar_nc.ax.tick_params(labelsize=8)
-                
-                # Save the figure with optimized DPI
-                page_suffix = f"_Page_{page+1}" if num_pages > 1 else ""
-                nc_output_file = os.path.join(output_folder, f'Non_Compliant_Harmonic_Summation_A4_Optimized{page_suffix}.png')
-                fig_nc.savefig(nc_output_file, format='png', dpi=150, bbox_inches='tight')
-                plt.close(fig_nc)
-        
-        # Generate individual full-size sheets for each non-compliant harmonic order
-        
-        for info in non_compliant_info:
-            print(f"Creating detailed sheet for Harmonic Order {info['harmonic_order']}")
-            
-            # Create a figure with a single subplot that fills most of the page
-            fig_ind = plt.figure(figsize=(10, 14), dpi=150)  # Consistent compact size with other plots
-            
-            # Create a single subplot that takes up most of the figure area
-            ax_ind = fig_ind.add_subplot(111)
-            
-            # Plot the data points
-            scatter_ind = plot_terr(ax_ind, info['RR'], info['XX'], info['HD'] / info['limit'], cmap, norm, marker_size=7)
-            
-            # Mark the worst-case point with a star
-            ax_ind.scatter(
-                info['worst_case_R'], info['worst_case_X'],
-                color=cmap(norm(info['worst_case_hd'] / info['limit'])), marker='*', s=22,
-                linewidths=0.4, edgecolor='black', zorder=1
-            )
-            
-            # Set axis labels and grid
-            ax_ind.set_xlabel(f'R [{Loci_unit}]', fontsize=7, labelpad=5)
-            ax_ind.set_ylabel(f'X [{Loci_unit}]', fontsize=7, labelpad=5)
-            ax_ind.tick_params(axis='both', which='major', labelsize=7)
-            ax_ind.grid(visible=True, which='major', color='gray', linestyle='-', linewidth=0.5, alpha=0.5)
-            ax_ind.minorticks_on()
-            
-            # Main title (Vh inc)
-            fig_ind.text(0.5, 0.97, 
-                         main_title, 
-                         ha='center', va='top', 
-                         fontsize=14, fontweight='bold', color='black')
-            
-            # Non-Compliant Order Title in Red (reduced spacing)
-            fig_ind.text(0.5, 0.94, 
-                         f"Non-Compliant Harmonic Order: [{info['harmonic_order']}]", 
-                         ha='center', va='top', 
-                         fontsize=12, fontweight='bold', color='red')
-            
-            # Worst-case details with network impedance (reduced spacing)
-            fig_ind.text(0.5, 0.91, 
-                         f"Worst-case HD = {info['worst_case_hd']:.2f}% at:\n"
-                         f"Before Site Integration - Z = {info['worst_case_R']:.1f} {'+' if info['worst_case_X'] >= 0 else '-'} j{abs(info['worst_case_X']):.1f} {Loci_unit}\n"
-                         f"After Site Integration - Z = {info['network_R']:.1f} {'+' if info['network_X'] >= 0 else '-'} j{abs(info['network_X']):.1f} {Loci_unit}", 
-                         ha='center', va='top', 
-                         fontsize=10, color='black')
-            
-            # Place HD Limit text at top right inside plot area
-            ax_ind.text(
-                0.98, 0.98,  # Top right corner inside plot
-                f"HD Limit = {info['limit']:.2f}%",
-                transform=ax_ind.transAxes,  # Use axes coordinates
-                ha='right', va='top',  # Right-aligned, top-aligned
-                fontsize=9, fontweight='bold',
-                bbox=dict(boxstyle='round,pad=0.3', fc='white', ec='gray', alpha=0.8),
-                rotation=0
-            )
-            
-            # Adjust layout and add horizontal color bar (moved up to avoid overlap)
-            fig_ind.tight_layout(rect=[0.05, 0.12, 0.95, 0.88])  # Adjust the rectangle to leave space for titles and colorbar
-            
-            cbar_ax_ind = fig_ind.add_axes([0.15, 0.06, 0.7, 0.02])
-            sm_ind = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
-            sm_ind.set_array([])
-            cbar_ind = fig_ind.colorbar(sm_ind, cax=cbar_ax_ind, orientation='horizontal', ticks=[0, 1, 2, 3, 4, 5])
-            cbar_ind.set_label(final_colorbar_label, fontsize=9)
-            cbar_ind.ax.tick_params(labelsize=8)
-            
-            # Save individual detailed sheet with optimized DPI
-            individual_output_file = os.path.join(
-                output_folder,
-                f'Non_Compliant_Harmonic_Order_{info["harmonic_order"]}_Detailed.png'
-            )
-            fig_ind.savefig(individual_output_file, format='png', dpi=150, bbox_inches='tight')
-            plt.close(fig_ind)
+            write_point_indexes(source, index_sheets, sink)
+
+        if shard is not None:
+            print(f"Rendering shard: summary pages {pages}")
+            render_shard(source, sheet_names, pages, loci_inputs, main_title, final_colorbar_label, sink,
+                         Loci_unit, max_subplots)
+        elif limit_columns:
+            # Load every order once and check it against all limit bases in one pass
+            order_arrays = [load_arrays(source, sheet) for sheet in sheet_names]
+            matrix = evaluate_limits(order_arrays, loci_inputs, limit_columns)
+            with sink.open(COMPLIANCE_MATRIX_FILE) as f:
+                write_compliance_matrix(matrix, f)
+            for col_idx, limit_column in enumerate(matrix['limit_columns']):
+                print(f"\nLimit basis: {limit_column}")
+                basis_folder = sink.subfolder(basis_folder_name(limit_column))
+                infos = [with_limit(info, matrix['limits'][row_idx, col_idx])
+                         for row_idx, info in enumerate(order_arrays)]
+                pages = [infos[i:i + max_subplots] for i in range(0, len(infos), max_subplots)]
+                summaries = render_order_pages(pages, main_title, limit_basis_label(limit_column), basis_folder,
+                                               Loci_unit, tile_pages)
+                if scenario_files:
+                    save_envelope_summary(summaries, scenario_files, basis_folder)
+        elif budget:
+            summaries = render_within_budget(budget, source, sheet_names, loci_inputs, main_title,
+                                             final_colorbar_label, sink, Loci_unit, max_subplots)
+            if scenario_files:
+                save_envelope_summary(summaries, scenario_files, sink)
+        else:
+            pages = iter_order_pages(source, sheet_names, loci_inputs, main_title, max_subplots)
+            summaries = render_order_pages(pages, main_title, final_colorbar_label, sink, Loci_unit, tile_pages)
+            if scenario_files:
+                save_envelope_summary(summaries, scenario_files, sink)
         
+        if optimize_png:
+            print_png_savings(sink.savings)
         print('\nAll plots generated successfully!')
     except Exception as e:
         print(f"Error in plotsave function: {e}")
+    finally:
+        # A ZIP archive gets its central directory even when a page failed,
+        # so the pages written so far stay readable
+        if owns_sink:
+            sink.close()
+
+# SHARDING
+# A study too large for one invocation is rendered in shards:
+# plotsave(shard=...) renders some summary pages with their detailed sheets
+# and writes a partial compliance summary, and reduce_shards merges the
+# partial summaries into the non-compliant pages and the final summary.
+
+# Partial summaries are written as Compliance_Shard_Pages_<pages>.json
+SHARD_SUMMARY_PREFIX = 'Compliance_Shard_'
+
+def parse_number_list(text):
+    """Numbers of a list like '1-3,5' -> [1, 2, 3, 5]."""
+    numbers = []
+    for part in str(text).split(','):
+        first, _, last = part.strip().partition('-')
+        numbers.extend(range(int(first), int(last or first) + 1))
+    return numbers
+
+def shard_page_numbers(shard, harmonic_orders, orders_per_page=15):
+    """
+    Summary pages selected by a shard specification, numbered as in the
+    unsharded study.
+    
+    Args:
+        shard: 'pages=1-2' or {'pages': [1, 2]} for page numbers, or
+            'orders=2-16' or {'orders': [2, 3, ...]} for harmonic orders
+            (the pages holding those orders are rendered whole)
+        harmonic_orders: Harmonic orders of the study, in sheet order
+        orders_per_page: Orders per summary page
+    
+    Returns:
+        Sorted list of page numbers
+    """
+    if isinstance(shard, str):
+        key, _, value = shard.partition('=')
+        shard = {key.strip(): parse_number_list(value)}
+    (key, numbers), = shard.items()
+    num_pages = (len(harmonic_orders) + orders_per_page - 1) // orders_per_page
+    if key == 'pages':
+        pages = sorted(set(numbers) & set(range(1, num_pages + 1)))
+    elif key == 'orders':
+        pages = sorted({idx // orders_per_page + 1 for idx, order in enumerate(harmonic_orders)
+                        if order in set(numbers)})
+    else:
+        raise ValueError(f"Unknown shard specification: {shard} (use 'pages' or 'orders')")
+    if not pages:
+        raise ValueError(f"Shard {shard} selects none of the {num_pages} summary pages")
+    return pages
+
+def page_sheet_names(sheet_names, page_number, orders_per_page=15):
+    """Order sheets drawn on summary page 'page_number' (numbered from 1)."""
+    return sheet_names[(page_number - 1) * orders_per_page:page_number * orders_per_page]
+
+def render_shard(source, sheet_names, pages, loci_inputs, main_title, colorbar_label, output_folder,
+                 Loci_unit='Ω', orders_per_page=15):
+    """
+    Render the given summary pages and the detailed sheets of their
+    non-compliant orders, then write the partial compliance summary of
+    those orders for reduce_shards.
+    
+    Returns:
+        List of order summaries (see order_summary) of the shard
+    """
+    load = load_envelope_data if isinstance(source, (list, tuple)) else load_order_data
+    sink = as_sink(output_folder)
+    summaries, files = [], []
+    for page_number in pages:
+        infos = [load(source, sheet, loci_inputs, main_title)
+                 for sheet in page_sheet_names(sheet_names, page_number, orders_per_page)]
+        files.append(render_summary_page(infos, page_number, main_title, colorbar_label, sink, Loci_unit))
+        for info in infos:
+            summaries.append(order_summary(info))
+            if info['non_compliant']:
+                print(f"Creating detailed sheet for Harmonic Order {info['harmonic_order']}")
+                files.append(render_detailed_sheet(info, main_title, colorbar_label, sink, Loci_unit))
+        del infos
+    
+    partial = {
+        'pages': pages,
+        'main_title': main_title,
+        'colorbar_label': colorbar_label,
+        'orders': summaries,
+        'files': files,
+    }
+    name = f"{SHARD_SUMMARY_PREFIX}Pages_{'_'.join(str(page) for page in pages)}.json"
+    sink.write_bytes(name, json.dumps(partial, indent=2, ensure_ascii=False).encode('utf-8'))
+    return summaries
+
+def reduce_shards(excel_file, shard_summaries, output_folder, Loci_unit='Ω'):
+    """
+    Merge the partial summaries of a sharded plotsave run: write
+    Compliance_Summary.xlsx, the non-compliant summary pages and, for
+    scenario workbooks, Scenario_Envelope.xlsx.
+    
+    Only the non-compliant orders are read again (their limits come from
+    the partial summaries), so the reduce step is cheap compared to the
+    shards.
+    
+    Args:
+        excel_file: Results workbook, or list of scenario workbooks, the
+            shards were rendered from
+        shard_summaries: Paths of the Compliance_Shard_*.json files, or a
+            folder holding them
+        output_folder: Folder path, '.zip' path or OutputSink
+        Loci_unit: Unit for impedance values
+    
+    Returns:
+        List of the merged order summaries, in sheet order
+    """
+    if isinstance(shard_summaries, str) and os.path.isdir(shard_summaries):
+        shard_summaries = sorted(
+            os.path.join(shard_summaries, name) for name in os.listdir(shard_summaries)
+            if name.startswith(SHARD_SUMMARY_PREFIX) and name.endswith('.json')
+        )
+    partials = []
+    for path in shard_summaries:
+        with open(path, encoding='utf-8') as f:
+            partials.append(json.load(f))
+    if not partials:
+        raise ValueError('No shard summaries to merge')
+    print(f"Merging {len(partials)} shard summaries")
+    
+    # Pages rendered by several shards give the same summaries
+    by_order = {}
+    for partial in partials:
+        for summary in partial['orders']:
+            by_order[summary['harmonic_order']] = summary
+    
+    scenario_files = list(excel_file) if isinstance(excel_file, (list, tuple)) else None
+    sheet_names = scenario_sheet_names(scenario_files) if scenario_files else order_sheet_names(excel_file)
+    sheet_for = {int(sheet.split()[-1]): sheet for sheet in sheet_names}
+    missing = [order for order in sheet_for if order not in by_order]
+    if missing:
+        print(f"Warning: no shard rendered Harmonic Orders {missing}; they are left out of the summary")
+    summaries = [by_order[order] for order in sheet_for if order in by_order]
+    main_title, colorbar_label = partials[0]['main_title'], partials[0]['colorbar_label']
+    
+    sink, owns_sink = open_sink(output_folder)
+    try:
+        with sink.open(COMPLIANCE_SUMMARY_FILE) as f:
+            write_compliance_summary(summaries, f)
+        
+        # Non-compliant pages in sheet order, as plotsave draws them
+        source, load_arrays = ((scenario_files, load_envelope_arrays) if scenario_files
+                               else (excel_file, load_order_arrays))
+        items_per_page = 15
+        non_compliant = [summary for summary in summaries if summary['non_compliant']]
+        nc_pages = [non_compliant[i:i + items_per_page] for i in range(0, len(non_compliant), items_per_page)]
+        for page_idx, page in enumerate(nc_pages):
+            infos = [with_limit(load_arrays(source, sheet_for[summary['harmonic_order']]), summary['limit'])
+                     for summary in page]
+            render_non_compliant_page(infos, page_idx + 1, len(nc_pages), main_title, colorbar_label, sink,
+                                      Loci_unit)
+            del infos
+        
+        if scenario_files:
+            save_envelope_summary(summaries, scenario_files, sink)
+    finally:
+        # As in plotsave, an archive is completed even when a page failed
+        if owns_sink:
+            sink.close()
+    print(f"Merged {len(summaries)} orders, {len(non_compliant)} non-compliant")
+    return summaries
 
 if __name__ == "__main__":
     # For standalone testing
@@ -0,0 +1,226 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from matplotlib.tri import Triangulation, LinearTriInterpolator
+
+from loci_core import load_loci_inputs, titles_for_file, order_limit
+from point_index import read_point_arrays
+from result_cache import file_digest
+
+# Bump when the layout of cached surrogates changes
+SURROGATE_FORMAT_VERSION = '1'
+
+# Where built surrogates are kept between runs
+CACHE_DIR = os.environ.get('SURROGATE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'hd_surrogates'))
+
+# Triangles with an edge longer than this many times the median edge span
+# a gap or a concave part of the loci rather than sampled area
+EDGE_LENGTH_FACTOR = 4.0
+
+
+# UTILITY FUNCTIONS
+
+def long_edge_mask(triangulation, factor=EDGE_LENGTH_FACTOR):
+    """True for the triangles whose longest edge exceeds 'factor' times the median edge."""
+    x = triangulation.x[triangulation.triangles]
+    y = triangulation.y[triangulation.triangles]
+    edges = np.hypot(x - np.roll(x, 1, axis=1), y - np.roll(y, 1, axis=1))
+    return edges.max(axis=1) > factor * np.median(edges)
+
+
+def surrogate_cache_path(excel_file, sheet_name, cache_dir=CACHE_DIR):
+    """Cache file of the surrogate of one order sheet, keyed on the workbook contents."""
+    key = hashlib.sha256(
+        f'{SURROGATE_FORMAT_VERSION}|{file_digest(excel_file)}|{sheet_name}'.encode('utf-8')
+    ).hexdigest()
+    return os.path.join(cache_dir, f'{key}.npz')
+
+
+# SURROGATE
+
+class HDSurrogate:
+    """
+    Piecewise-linear model of HD over the impedance plane of one harmonic
+    order, interpolated on the Delaunay triangulation of the sampled points.
+
+    The points are the network (post-integration) R/X of every result row
+    when the sheet has those columns ('network' basis), otherwise the
+    loci R/X ('loci' basis). Queries outside the triangulation, or in
+    triangles spanning gaps between the sampled loci (see long_edge_mask),
+    are flagged as outside and get NaN.
+    """
+
+    def __init__(self, R, X, HD, basis='network', harmonic_order=None, limit=None,
+                 triangles=None, mask=None):
+        R = np.asarray(R, dtype=float)
+        X = np.asarray(X, dtype=float)
+        HD = np.asarray(HD, dtype=float)
+        if triangles is None:
+            valid = np.isfinite(R) & np.isfinite(X) & np.isfinite(HD)
+            R, X, HD = R[valid], X[valid], HD[valid]
+            triangulation = Triangulation(R, X)
+            mask = long_edge_mask(triangulation)
+        else:
+            triangulation = Triangulation(R, X, triangles=triangles)
+        triangulation.set_mask(mask)
+
+        self.R, self.X, self.HD = R, X, HD
+        self.basis = basis
+        self.harmonic_order = harmonic_order
+        self.limit = limit
+        self.triangulation = triangulation
+        self.interpolator = LinearTriInterpolator(triangulation, HD)
+
+    @classmethod
+    def from_sheet(cls, excel_file, sheet_name, limit=None):
+        """Build the surrogate of a 'Harmonic Order N' sheet."""
+        arrays = read_point_arrays(excel_file, sheet_name)
+        if arrays['network_RR'] is not None:
+            R, X, basis = arrays['network_RR'], arrays['network_XX'], 'network'
+        else:
+            R, X, basis = arrays['RR'], arrays['XX'], 'loci'
+        return cls(R, X, arrays['HD'], basis, arrays['harmonic_order'], limit)
+
+    def evaluate(self, R, X):
+        """
+        Interpolate HD at a batch of impedances in one vectorized call.
+
+        Args:
+            R, X: Arrays (or scalars) of query resistances and reactances,
+                in the units of the results sheet
+
+        Returns:
+            Dict of arrays shaped like the queries: HD (NaN outside), ratio
+            (HD / limit, NaN without a limit) and inside (False where the
+            query is outside the sampled loci)
+        """
+        R, X = np.broadcast_arrays(np.asarray(R, dtype=float), np.asarray(X, dtype=float))
+        hd = self.interpolator(R, X)
+        inside = ~np.ma.getmaskarray(hd)
+        hd = np.ma.filled(hd.astype(float), np.nan)
+        ratio = hd / self.limit if self.limit else np.full(hd.shape, np.nan)
+        return {'HD': hd, 'ratio': ratio, 'inside': inside}
+
+    def save(self, file):
+        """Write the points and the triangulation as a .npz archive (path or binary file object)."""
+        np.savez(
+            file, R=self.R, X=self.X, HD=self.HD,
+            triangles=self.triangulation.triangles, mask=self.triangulation.mask,
+            basis=np.array(self.basis),
+            harmonic_order=np.array(-1 if self.harmonic_order is None else self.harmonic_order)
+        )
+
+    @classmethod
+    def load(cls, file, limit=None):
+        """Read a surrogate written by save(); the triangulation is reused as is."""
+        with np.load(file) as data:
+            order = int(data['harmonic_order'])
+            return cls(data['R'], data['X'], data['HD'], str(data['basis']),
+                       None if order < 0 else order, limit, data['triangles'], data['mask'])
+
+
+def load_surrogate(excel_file, sheet_name, limit=None, cache_dir=CACHE_DIR):
+    """
+    Surrogate of one order sheet, built once and then read from the disk
+    cache for as long as the workbook contents do not change.
+
+    Args:
+        excel_file: Path to Excel file with harmonic calculation results
+        sheet_name: Name of the harmonic order sheet
+        limit: Limit used for the HD/limit ratio (not cached)
+        cache_dir: Cache folder, or None to always build
+
+    Returns:
+        HDSurrogate
+    """
+    if cache_dir is None:
+        return HDSurrogate.from_sheet(excel_file, sheet_name, limit)
+    path = surrogate_cache_path(excel_file, sheet_name, cache_dir)
+    try:
+        return HDSurrogate.load(path, limit)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    surrogate = HDSurrogate.from_sheet(excel_file, sheet_name, limit)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        surrogate.save(f)
+    os.replace(tmp_path, path)
+    return surrogate
+
+
+# COMMAND LINE
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Interpolate HD of one harmonic order at network impedances that were not sampled.')
+    parser.add_argument('--harmonics', required=True, help='Harmonic results workbook')
+    parser.add_argument('--order', type=int, required=True, help='Harmonic order')
+    parser.add_argument('--loci', help='Loci inputs workbook (for the HD/limit ratio)')
+    parser.add_argument('--limits-sheet-name', default='Harmonic Limits')
+    parser.add_argument('--query', nargs=2, type=float, action='append', metavar=('R', 'X'),
+                        help='Impedance to evaluate (repeatable)')
+    parser.add_argument('--queries', help='CSV file with R and X columns')
+    parser.add_argument('--output', help='CSV file for the results of --queries (default: stdout JSON)')
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true', help='Build the surrogate without the disk cache')
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    # Loader messages go to stderr so stdout stays JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        limit = None
+        if args.loci:
+            main_title, _ = titles_for_file(args.harmonics)
+            limit = float(order_limit(load_loci_inputs(args.loci, args.limits_sheet_name), args.order, main_title))
+        surrogate = load_surrogate(args.harmonics, f'Harmonic Order {args.order}', limit,
+                                   None if args.no_cache else args.cache_dir)
+    load_seconds = time.time() - start
+
+    if args.queries:
+        import pandas as pd
+        queries = pd.read_csv(args.queries)
+        R, X = queries['R'].to_numpy(dtype=float), queries['X'].to_numpy(dtype=float)
+    else:
+        points = np.array(args.query or [], dtype=float).reshape(-1, 2)
+        R, X = points[:, 0], points[:, 1]
+
+    start = time.time()
+    result = surrogate.evaluate(R, X)
+    evaluate_seconds = time.time() - start
+
+    report = {
+        'harmonic_order': surrogate.harmonic_order,
+        'basis': surrogate.basis,
+        'limit': limit,
+        'queries': len(R),
+        'outside': int((~result['inside']).sum()),
+        'load_seconds': round(load_seconds, 3),
+        'evaluate_seconds': round(evaluate_seconds, 6),
+    }
+    if args.output:
+        import pandas as pd
+        pd.DataFrame({'R': R, 'X': X, 'HD': result['HD'], 'HD/Limit ratio': result['ratio'],
+                      'Inside loci': result['inside']}).to_csv(args.output, index=False)
+        report['output'] = args.output
+    else:
+        report['results'] = [
+            {'R': float(r), 'X': float(x), 'inside': bool(inside),
+             'HD': float(hd) if inside else None, 'ratio': float(ratio) if inside and limit else None}
+            for r, x, hd, ratio, inside in zip(R, X, result['HD'], result['ratio'], result['inside'])
+        ]
+    json.dump(report, sys.stdout, ensure_ascii=False)
+    print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,994 @@
+import heapq
+import io
+import math
+
+import numpy as np
+
+from output_sink import as_sink
+
+try:
+    from loci_io import load_vertex_array
+except ImportError:
+    load_vertex_array = None
+
+# pandas is only imported by the functions that read or write DataFrames,
+# so DS-format jobs on the fast readers start without it.
+
+
+# GEOMETRY
+
+def linear_interpolate(x, xp, fp):
+    """Simple linear interpolation."""
+    n = len(xp)
+    result = []
+    for val in x:
+        for i in range(1, n):
+            if xp[i-1] <= val <= xp[i]:
+                slope = (fp[i] - fp[i-1]) / (xp[i] - xp[i-1])
+                result.append(fp[i-1] + slope*(val - xp[i-1]))
+                break
+    return result
+
+
+def linspace(start, stop, num):
+    """Equivalent to numpy.linspace for integer num steps."""
+    step = (stop - start) / (num - 1)
+    return [start + step * i for i in range(num)]
+
+
+def convert_to_2d_list(array):
+    """Convert a nested structure to standard Python lists."""
+    return [list(row) for row in array]
+
+
+def print_table(headers, data):
+    """Print a Markdown-like table in terminal."""
+    col_widths = [max(len(str(item)) for item in col) 
+                  for col in zip(*([headers] + data))]
+    row_format = " | ".join(["{:<" + str(width) + "}" for width in col_widths])
+    # Header
+    print("|" + row_format.format(*headers) + "|")
+    print("|" + "-" * (sum(col_widths) + 3*(len(headers) - 1)) + "|")
+    # Rows
+    for row in data:
+        print("|" + row_format.format(*row) + "|")
+
+
+def write_table(headers, data):
+    """Return a Markdown-like table as a string."""
+    ret = ''
+    col_widths = [max(len(str(item)) for item in col) 
+                  for col in zip(*([headers] + data))]
+    row_format = " | ".join(["{:<" + str(width) + "}" for width in col_widths])
+    # Header
+    ret += "|" + row_format.format(*headers) + "|\n"
+    ret += "|" + "-" * (sum(col_widths) + 3*(len(headers) - 1)) + "|\n"
+    # Rows
+    for row in data:
+        ret += "|" + row_format.format(*row) + "|\n"
+    return ret
+
+
+def vertices_left_out(R_pu, X_pu, matrix):
+    """
+    Return vertices not initially included in the data points.
+    (Typically not used in main workflow by default.)
+    """
+    vertices = {}
+    inorout = {}
+    counter1 = 0
+    for heights in X_pu:
+        vertices[heights] = R_pu[counter1]
+        inorout[heights] = False
+        for vert in matrix:
+            if vert[0] == heights:
+                inorout[heights] = True
+        counter1 += 1
+    points_list = []
+    for point, value in inorout.items():
+        if value is False:
+            points_list.append((vertices[point], point))
+    return points_list
+
+
+def calculate_distance(point1, point2):
+    """Euclidean distance between two points (x1,y1) and (x2,y2)."""
+    return math.sqrt((point1[0] - point2[0])**2 + (point1[1] - point2[1])**2)
+
+
+def get_polygon_perimeter(vertices):
+    """Calculate the perimeter of a polygon given ordered vertices."""
+    perimeter = 0
+    for i in range(len(vertices)):
+        next_index = (i + 1) % len(vertices)
+        perimeter += calculate_distance(vertices[i], vertices[next_index])
+    return perimeter
+
+
+def get_equally_spaced_points_on_perimeter(vertices, num_points):
+    """
+    Distribute num_points equally along the perimeter of a polygon 
+    given in connecting order.
+    """
+    perimeter = get_polygon_perimeter(vertices)
+    segment_length = perimeter / num_points
+    points = []
+    current_index = 0
+    carryover = 0
+
+    while len(points) < num_points:
+        start = vertices[current_index]
+        next_index = (current_index + 1) % len(vertices)
+        end = vertices[next_index]
+        distance = calculate_distance(start, end)
+        remaining_length = carryover + distance
+
+        while remaining_length >= segment_length:
+            remaining_length -= segment_length
+            ratio = (distance - remaining_length) / distance
+            new_point = (
+                start[0] + ratio * (end[0] - start[0]),
+                start[1] + ratio * (end[1] - start[1])
+            )
+            points.append(new_point)
+            if len(points) == num_points:
+                break
+        carryover = remaining_length
+        current_index = next_index
+
+    return points
+
+
+def polygon_area(vertices):
+    """Shoelace formula for polygon area."""
+    n = len(vertices)
+    if n < 3:
+        return 0  
+    area = 0
+    for i in range(n):
+        x1, y1 = vertices[i]
+        x2, y2 = vertices[(i + 1) % n]
+        area += x1*y2 - y1*x2
+    return abs(area) / 2
+
+
+def inner_points(delta, datamatrix, option):
+    """
+    Create internal points at intervals of delta along each row of datamatrix. 
+    (Used in advanced polygon fill.)
+    """
+    innerds = []
+    for row in datamatrix[1:len(datamatrix)-1]:
+        newR = row[1]
+        row_distance = row[2] - row[1]
+        counter = 0
+        while newR < row[2]:
+            if (row[2] - newR) < (2 * delta) and option == 2:
+                counter -= 1
+            counter += 1
+            newR += delta
+        try:
+            line_delta = row_distance / counter
+        except:
+            continue
+        rowR = row[1] + line_delta
+        while round(rowR, 10) < round(row[2], 10):
+            innerds.append((rowR, row[0]))
+            rowR += line_delta
+    return innerds
+
+
+def filter_points_in_polygon(polygon_vertices, points):
+    """Return only the subset of 'points' that lie inside 'polygon_vertices'."""
+    return [pt for pt in points if is_point_in_polygon(pt[0], pt[1], polygon_vertices)]
+
+
+def is_point_in_polygon(x, y, polygon):
+    """
+    Ray casting to detect if (x, y) is inside the polygon (list of (x_i, y_i)).
+    """
+    n = len(polygon)
+    inside = False
+    p1x, p1y = polygon[0]
+    for i in range(n + 1):
+        p2x, p2y = polygon[i % n]
+        if y > min(p1y, p2y):
+            if y <= max(p1y, p2y):
+                if x <= max(p1x, p2x):
+                    if p1y != p2y:
+                        xinters = (y - p1y)*(p2x - p1x)/(p2y - p1y) + p1x
+                    else:
+                        xinters = p1x
+                    if p1x == p2x or x <= xinters:
+                        inside = not inside
+        p1x, p1y = p2x, p2y
+    return inside
+
+
+def find_min_max_x_at_height(x_vertices, y_vertices, height, epsilon=1e-9):
+    """
+    For a polygon defined by x_vertices[i], y_vertices[i],
+    return (min_x, max_x) where it intersects a horizontal line at 'height'.
+    """
+    min_x = float('inf')
+    max_x = float('-inf')
+    num_vertices = len(x_vertices)
+    for i in range(num_vertices - 1):
+        x1, y1 = x_vertices[i], y_vertices[i]
+        x2, y2 = x_vertices[i + 1], y_vertices[i + 1]
+        
+        # Check if line from y1->y2 intersects horizontal 'height'
+        if (y1 - height)*(y2 - height) <= epsilon:
+            if abs(y1 - y2) > epsilon:
+                # linear interpolation
+                x_at_height = x1 + (x2 - x1)*(height - y1)/(y2 - y1)
+            else:
+                x_at_height = x1
+            min_x = min(min_x, x_at_height)
+            max_x = max(max_x, x_at_height)
+    return min_x, max_x
+
+
+def sort_points_clockwise(points):
+    """
+    Sort a list of (x, y) points in clockwise order, 
+    then append the first point to the end to 'close' the shape.
+    """
+    # 1) Compute centroid
+    cx = sum(p[0] for p in points) / len(points)
+    cy = sum(p[1] for p in points) / len(points)
+    
+    # 2) Sort in descending angle order w.r.t. centroid => clockwise
+    def angle_from_centroid(pt):
+        dx = pt[0] - cx
+        dy = pt[1] - cy
+        return math.atan2(dy, dx)
+    
+    points_sorted = sorted(points, key=angle_from_centroid, reverse=True)
+
+    # 3) Append the first point again at the end
+    if points_sorted:
+        points_sorted.append(points_sorted[0])
+    return points_sorted
+
+
+# LOCI SIMPLIFICATION
+
+def cross_product(o, a, b):
+    """z-component of (a - o) x (b - a): > 0 for a left turn at a."""
+    return (a[0] - o[0]) * (b[1] - a[1]) - (a[1] - o[1]) * (b[0] - a[0])
+
+
+def point_segment_distance(p, a, b):
+    """Distance from point p to the segment a-b."""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length_sq = dx*dx + dy*dy
+    if length_sq == 0:
+        return calculate_distance(p, a)
+    t = max(0.0, min(1.0, ((p[0] - a[0])*dx + (p[1] - a[1])*dy) / length_sq))
+    return calculate_distance(p, (a[0] + t*dx, a[1] + t*dy))
+
+
+def simplify_loci(R_pu, X_pu, tolerance):
+    """
+    Remove vertices from a dense locus without shrinking the enclosed region.
+
+    Vertices are removed greedily, cheapest first (Visvalingam style), with
+    two moves that can only grow the polygon:
+      - a concave or collinear vertex is dropped and its neighbours joined;
+      - two neighbouring convex vertices b, c are replaced by the point where
+        the edges a-b and d-c meet when extended.
+    Every edge keeps an upper bound of its distance to the original outline
+    and a move is only taken while that bound stays within 'tolerance'.
+
+    Args:
+        R_pu: R values of the locus vertices (closed or open ring)
+        X_pu: X values of the locus vertices
+        tolerance: Largest allowed deviation from the original outline, in
+            the units of the vertices. 0 disables simplification.
+
+    Returns:
+        Tuple of (R_pu, X_pu, stats). The ring is closed again if it was
+        closed on input. stats holds vertices_before, vertices_after,
+        vertices_removed and max_deviation (upper bound).
+    """
+    closed = len(R_pu) > 1 and R_pu[0] == R_pu[-1] and X_pu[0] == X_pu[-1]
+    pts = list(zip(R_pu, X_pu))
+    if closed:
+        pts = pts[:-1]
+    count = len(pts)
+    stats = {'vertices_before': count, 'vertices_after': count,
+             'vertices_removed': 0, 'max_deviation': 0.0}
+
+    doubled_area = sum(pts[i-1][0]*pts[i][1] - pts[i][0]*pts[i-1][1] for i in range(count))
+    if tolerance <= 0 or count <= 3 or doubled_area == 0:
+        return list(R_pu), list(X_pu), stats
+    # Turns towards the inside are positive for either winding direction
+    orient = 1 if doubled_area > 0 else -1
+
+    nxt = [(i + 1) % count for i in range(count)]
+    prv = [(i - 1) % count for i in range(count)]
+    alive = [True] * count
+    version = [0] * count
+    # err[i]: deviation bound of the edge from vertex i to vertex nxt[i]
+    err = [0.0] * count
+
+    def removal_cost(v):
+        p, n = prv[v], nxt[v]
+        if orient * cross_product(pts[p], pts[v], pts[n]) > 0:
+            return None
+        return max(err[p], err[v]) + point_segment_distance(pts[v], pts[p], pts[n])
+
+    def collapse(b):
+        a, c = prv[b], nxt[b]
+        d = nxt[c]
+        if (orient * cross_product(pts[a], pts[b], pts[c]) <= 0
+                or orient * cross_product(pts[b], pts[c], pts[d]) <= 0):
+            return None
+        # Intersect the rays a->b and d->c
+        u = (pts[b][0] - pts[a][0], pts[b][1] - pts[a][1])
+        w = (pts[c][0] - pts[d][0], pts[c][1] - pts[d][1])
+        denom = u[0]*w[1] - u[1]*w[0]
+        if denom == 0:
+            return None
+        ad = (pts[d][0] - pts[a][0], pts[d][1] - pts[a][1])
+        t = (ad[0]*w[1] - ad[1]*w[0]) / denom
+        s = (ad[0]*u[1] - ad[1]*u[0]) / denom
+        if t < 1 or s < 1:
+            return None
+        e = (pts[a][0] + t*u[0], pts[a][1] + t*u[1])
+        dev = err[b] + point_segment_distance(e, pts[b], pts[c])
+        return max(err[a], dev), max(err[c], dev), e
+
+    def push(i):
+        cost = removal_cost(i)
+        if cost is not None and cost <= tolerance:
+            heapq.heappush(heap, (cost, 0, i, version[i]))
+        if count >= 4:
+            moved = collapse(i)
+            if moved is not None and max(moved[:2]) <= tolerance:
+                heapq.heappush(heap, (max(moved[:2]), 1, i, version[i]))
+
+    heap = []
+    for i in range(count):
+        push(i)
+
+    while heap and count > 3:
+        _, kind, i, ver = heapq.heappop(heap)
+        if not alive[i] or ver != version[i]:
+            continue
+        if kind == 0:
+            p, n = prv[i], nxt[i]
+            err[p] = removal_cost(i)
+            removed, anchor = i, p
+        else:
+            if count < 4:
+                continue
+            a, c = prv[i], nxt[i]
+            err[a], err[i], pts[i] = collapse(i)
+            n = nxt[c]
+            removed, anchor, p = c, i, i
+        nxt[p] = n
+        prv[n] = p
+        alive[removed] = False
+        count -= 1
+
+        # Re-evaluate the moves whose neighbourhood changed
+        node = anchor
+        for _ in range(3):
+            node = prv[node]
+        for _ in range(7):
+            version[node] += 1
+            push(node)
+            node = nxt[node]
+
+    start = alive.index(True)
+    R_out, X_out, node = [], [], start
+    while True:
+        R_out.append(pts[node][0])
+        X_out.append(pts[node][1])
+        node = nxt[node]
+        if node == start:
+            break
+    if closed:
+        R_out.append(R_out[0])
+        X_out.append(X_out[0])
+
+    stats['vertices_after'] = count
+    stats['vertices_removed'] = stats['vertices_before'] - count
+    stats['max_deviation'] = max(err[i] for i in range(len(err)) if alive[i])
+    return R_out, X_out, stats
+
+
+# DS FORMAT
+
+def excel_to_matrix(loci_file, sheet_name):
+    """
+    Reads matrix of vertices from an Excel file/sheet.
+    The first row is treated as 'ranges',
+    and subsequent rows are the vertex data.
+    Uses the streaming float loader from loci_io when it is available.
+    """
+    if load_vertex_array is not None:
+        _, Impedance_Loci = load_vertex_array(loci_file, sheet_name)
+    else:
+        import pandas as pd
+        df = pd.read_excel(loci_file, sheet_name=sheet_name, header=None)
+        Impedance_Loci = df.values.tolist()
+    # 'ranges' = first row, the rest are vertices
+    ranges = Impedance_Loci[0:1]  
+    Impedance_Loci = Impedance_Loci[1:]
+    range_count = len(Impedance_Loci[0]) / 2
+    return Impedance_Loci, range_count, ranges
+
+
+def extract_range_vertices(Impedance_Loci, Calculation_Range, reorder=False):
+    """
+    Return the R and X vertices (lists) of one Calculation_Range.
+    Rows where either value is NaN are skipped. If reorder is True the
+    points are sorted clockwise and the first point is repeated at the end.
+    """
+    R_pu = []
+    X_pu = []
+    for row in Impedance_Loci:
+        # 2*(Calc_Range-1) is the R column, 2*(Calc_Range-1)+1 is the X column
+        if not math.isnan(row[2*(Calculation_Range-1)]) and not math.isnan(row[2*(Calculation_Range-1)+1]):
+            R_pu.append(row[2*(Calculation_Range-1)])
+            X_pu.append(row[2*(Calculation_Range-1)+1])
+
+    # Reorder the points if needed (clockwise + repeat first point)
+    if reorder:
+        combined_points = list(zip(R_pu, X_pu))
+        reordered = sort_points_clockwise(combined_points)
+        # Overwrite R_pu and X_pu with the newly sorted/closed shape
+        R_pu = [pt[0] for pt in reordered]
+        X_pu = [pt[1] for pt in reordered]
+    return R_pu, X_pu
+
+
+def build_ds_format(R_pu, X_pu, range_start, range_end):
+    """
+    Build the DS_Format matrix of one range.
+
+    The first row is [-9999.0, range_start, range_end]; every following row
+    is [X, R_min, R_max] for one level. Levels are equidistant heights plus
+    a level at every vertex height.
+
+    Returns:
+        Tuple of (DS_Format, number of levels created)
+    """
+    # Create grid of y values (levels)
+    y_min = min(X_pu)
+    y_max = max(X_pu)
+    
+    # Decide how many levels to generate based on # of vertices
+    if len(X_pu) < 10:
+        levels = 20
+    elif len(X_pu) < 20:
+        levels = 16
+    elif len(X_pu) < 30:
+        levels = 12
+    elif len(X_pu) < 40:
+        levels = 8
+    else:
+        levels = 7
+
+    y_grid = linspace(y_min, y_max, levels)
+
+    vertices = {}
+    inorout = {}
+    counter1 = 1
+    counterlevels = 0
+    # Mark each vertex to see if it corresponds to a level
+    for heights in X_pu[1:len(X_pu)]:
+        vertices[heights] = R_pu[counter1]
+        inorout[heights] = False
+        for height in y_grid:
+            if round(height, 10) == round(heights, 10):
+                inorout[heights] = True
+        counter1 += 1
+    points_list = []
+    for point, value in inorout.items():
+        if value is False:
+            points_list.append(point)
+            counterlevels += 1
+    y_grid += points_list
+    y_grid.sort()
+    
+    # Initialize arrays for x-min and x-max values
+    x_min_vals = [0]*len(y_grid)
+    x_max_vals = [0]*len(y_grid)
+
+    # For each height in y_grid, find min and max R
+    for i, height in enumerate(y_grid):
+        x_min_vals[i], x_max_vals[i] = find_min_max_x_at_height(R_pu, X_pu, height)
+
+    # DS_Format structure
+    # First row is [-9999.0, RangeStart, RangeEnd]
+    DS_Format = [[-9999.0, range_start, range_end]]
+    DS_Format += [[y_grid[i], x_min_vals[i], x_max_vals[i]] 
+                  for i in range(len(y_grid))]
+    return DS_Format, levels + counterlevels
+
+
+def write_ds_format(DS_Format, range_start, range_end, folder_path, Loci_unit='ohm', decimalrounding=5):
+    """
+    Round DS_Format and write it to '<start>-<end>_data_points.xlsx' in a
+    folder or OutputSink. Returns the location of the file.
+    """
+    import pandas as pd
+
+    rounded_DS_Format = [[round(num, decimalrounding) for num in row] 
+                         for row in DS_Format]
+
+    # Prepare for Excel/printing
+    headers = ['X(' + Loci_unit + ')', 'R_min(' + Loci_unit + ')', 'R_max(' + Loci_unit + ')']
+    excel_output_name = (str(range_start)
+                         + "-" + str(range_end)
+                         + '_data_points.xlsx')
+    dfoutput = pd.DataFrame(rounded_DS_Format, columns=headers)
+
+    # Write to new Excel file in output folder (built in memory, so a failed
+    # engine leaves nothing behind)
+    buffer = io.BytesIO()
+    try:
+        dfoutput.to_excel(buffer, sheet_name='Sheet1', index=False, engine='xlsxwriter')
+    except ModuleNotFoundError:
+        try:
+            dfoutput.to_excel(buffer, sheet_name='Sheet1', index=False, engine='openpyxl')
+        except ModuleNotFoundError:
+            dfoutput.to_excel(buffer, sheet_name='Sheet1', index=False)
+            print("Warning: Excel engine modules not found. Using default engine.")
+    # print_table(headers, rounded_DS_Format) # uncomment to see table in console
+    sink = as_sink(folder_path)
+    sink.write_bytes(excel_output_name, buffer.getvalue())
+    return sink.location(excel_output_name)
+
+
+# HARMONIC COMPLIANCE
+
+# Accepted names of the columns read from the 'Harmonic Order N' sheets
+R_COLUMN_NAMES = ['Initial R (Ω)', 'Initial R (ohm)', 'R (Ω)', 'R (ohm)']
+X_COLUMN_NAMES = ['Initial X (Ω)', 'Initial X (ohm)', 'X (Ω)', 'X (ohm)']
+HD_COLUMN_NAMES = ['Result HD', 'Max HD']
+NETWORK_COLUMNS = ['Network R (ohm)', 'Network X (ohm)']
+
+# Key column of the harmonic limits sheet
+HARMONIC_ORDER_COLUMN = 'Harmonic Order (H)'
+
+def get_column_name(df, possible_names):
+    """
+    Find the actual column name from a list of possible column names.
+    Helps handle different naming conventions in input files.
+    
+    Args:
+        df: DataFrame to search in
+        possible_names: List of possible column names to look for
+        
+    Returns:
+        Actual column name if found, otherwise raises ValueError
+    """
+    for name in possible_names:
+        if name in df.columns:
+            return name
+    raise ValueError(f"Could not find any column with names: {possible_names}")
+
+
+def read_order_sheet(excel_file, sheet_name):
+    """
+    Read a 'Harmonic Order N' sheet into a DataFrame whose columns are the
+    first row of the sheet. Numeric cells are read straight from the sheet
+    XML by loci_io when it is available: text cells become NaN and their
+    rows are kept per column in df.attrs['text_cells'] for numeric_column.
+    """
+    import pandas as pd
+
+    if load_vertex_array is not None:
+        header, values, text_cells = load_vertex_array(excel_file, sheet_name, header_rows=1, text_cells=True)
+        df = pd.DataFrame(values, columns=list(header[0]) if header else None)
+        df.attrs['text_cells'] = {}
+        for row_i, col_i in text_cells.tolist():
+            df.attrs['text_cells'].setdefault(df.columns[col_i], []).append(row_i)
+        return df
+    return pd.read_excel(excel_file, sheet_name=sheet_name, engine='openpyxl')
+
+
+def numeric_column(df, column):
+    """
+    Float values of a column of an order sheet, below its units row.
+
+    Raises:
+        ValueError: If a cell below the units row holds text, as
+            astype(float) does on a sheet read by pandas
+    """
+    text_rows = sorted(row_i for row_i in df.attrs.get('text_cells', {}).get(column, []) if row_i > 0)
+    if text_rows:
+        # Row 0 of the values is the units row, on Excel row 2
+        excel_rows = ', '.join(str(row_i + 2) for row_i in text_rows[:5])
+        more = ', ...' if len(text_rows) > 5 else ''
+        raise ValueError(f"Column '{column}' has {len(text_rows)} non-numeric cell(s) "
+                         f"(Excel rows {excel_rows}{more})")
+    return df[column].values[1:].astype(float)
+
+
+def load_loci_inputs(file_path, sheet_name='Harmonic Limits'):
+    """Loads harmonic limits from an Excel file."""
+    import pandas as pd
+
+    try:
+        df = pd.read_excel(file_path, sheet_name=sheet_name, engine='openpyxl')
+        print(f"Successfully loaded sheet '{sheet_name}' with columns: {df.columns.tolist()}")
+        return df
+    except Exception as e:
+        print(f"Error loading loci inputs: {e}")
+        print(f"Available sheets in file: {pd.ExcelFile(file_path, engine='openpyxl').sheet_names}")
+        return pd.DataFrame()
+
+
+def titles_for_file(excel_file):
+    """Main title and colorbar label of the analysis type named in the results file name."""
+    excel_file_lower = excel_file.lower()
+    
+    if "vhinc" in excel_file_lower:
+        return "Vhinc", "Incremental Distortion"
+    elif "vh inc" in excel_file_lower:
+        return "Vh inc", "Incremental Distortion"
+    elif "vhtotal" in excel_file_lower or "vh total" in excel_file_lower:
+        return "VhTotal", "Total Harmonic Distortion"
+    elif "g5" in excel_file_lower or "g55" in excel_file_lower:
+        # G5/5 files - different title and colorbar label
+        return "G5/5", "G5/5 Planning"
+    return "VhTotal", "Total Harmonic Distortion"
+
+
+def determine_dynamic_titles(loci_inputs_file, excel_file):
+    """
+    Determine the main title and the dynamic label for the color bar.
+    """
+    import pandas as pd
+
+    try:
+        df = pd.read_excel(loci_inputs_file, sheet_name='Harmonic Limits', engine='openpyxl', header=None)
+
+        # Determine main title and colorbar label based on filename
+        return titles_for_file(excel_file)
+    except Exception as e:
+        print(f"Error determining titles: {e}")
+        # Default values if there's an error
+        return "VhTotal", "Total Harmonic Distortion"
+
+
+def limit_column_for(main_title):
+    """Name of the limit column that results of this analysis type are checked against."""
+    if main_title == "Vh inc" or main_title == "Vhinc":
+        return 'Incremental Distortion Limit (%V1) at PCC'
+    # For "VhTotal", "G5/5", or other total distortion types
+    return 'Total Limit (%V1) at PCC'
+
+
+def colorbar_label_for(main_title):
+    """Colorbar label used on every page for this analysis type."""
+    if main_title == "Vh inc" or main_title == "Vhinc":
+        return "HD/Limit ratio  |  Limit: Incremental Distortion Limit (%V1) at PCC"
+    elif main_title == "G5/5":
+        return "HD/Limit ratio  |  Limit: G5/5 Planning Limit (%V1) at PCC"
+    return "HD/Limit ratio  |  Limit: Total Harmonic Distortion Limit (%V1) at PCC"
+
+
+def load_order_arrays(excel_file, sheet_name):
+    """
+    Read one 'Harmonic Order N' sheet without evaluating it against a limit.
+
+    Args:
+        excel_file: Path to Excel file with harmonic calculation results
+        sheet_name: Name of the harmonic order sheet
+
+    Returns:
+        Dict with the R/X/HD arrays and the worst-case details
+    """
+    df = read_order_sheet(excel_file, sheet_name)
+    harmonic_order = int(sheet_name.split()[-1])
+    
+    # Find the appropriate column names (handles different naming conventions)
+    R_col = get_column_name(df, R_COLUMN_NAMES)
+    X_col = get_column_name(df, X_COLUMN_NAMES)
+    HD_col = get_column_name(df, HD_COLUMN_NAMES)
+    
+    # Extract data values (skip header row)
+    RR = numeric_column(df, R_col)
+    XX = numeric_column(df, X_col)
+    HD = numeric_column(df, HD_col)
+    
+    # Find worst-case (maximum) harmonic distortion
+    worst_case_hd = HD.max()
+    worst_case_index = np.argmax(HD)
+    worst_case_R = RR[worst_case_index]
+    worst_case_X = XX[worst_case_index]
+    
+    # Network impedance values (post-integration) at the worst-case point
+    try:
+        network_R = df[NETWORK_COLUMNS[0]].values[1:][worst_case_index]
+        network_X = df[NETWORK_COLUMNS[1]].values[1:][worst_case_index]
+    except (KeyError, IndexError):
+        # Fallback if columns don't exist or index is out of range
+        network_R = worst_case_R
+        network_X = worst_case_X
+    
+    return {
+        'harmonic_order': harmonic_order,
+        'RR': RR,
+        'XX': XX,
+        'HD': HD,
+        'worst_case_hd': worst_case_hd,
+        'worst_case_R': worst_case_R,
+        'worst_case_X': worst_case_X,
+        'network_R': network_R,
+        'network_X': network_X,
+    }
+
+
+def with_limit(info, limit):
+    """
+    Copy of an order dict (see load_order_arrays) evaluated against 'limit'.
+    The point arrays are shared, not copied.
+    """
+    # Ensure limit is valid
+    if limit <= 0:
+        raise ValueError(f"Invalid limit ({limit}) for Harmonic Order {info['harmonic_order']}")
+    evaluated = dict(info)
+    evaluated['limit'] = limit
+    evaluated['non_compliant'] = info['worst_case_hd'] / limit > 1
+    return evaluated
+
+
+def load_order_data(excel_file, sheet_name, loci_inputs, main_title):
+    """
+    Read one 'Harmonic Order N' sheet and evaluate it against its limit.
+    
+    Args:
+        excel_file: Path to Excel file with harmonic calculation results
+        sheet_name: Name of the harmonic order sheet
+        loci_inputs: DataFrame of harmonic limits (see load_loci_inputs)
+        main_title: Analysis type from determine_dynamic_titles
+        
+    Returns:
+        Dict with the R/X/HD arrays, the limit and the worst-case details
+    """
+    info = load_order_arrays(excel_file, sheet_name)
+    return with_limit(info, order_limit(loci_inputs, info['harmonic_order'], main_title))
+
+
+def order_limit(loci_inputs, harmonic_order, main_title):
+    """Limit of one harmonic order for this analysis type (1.0 if the order has no row)."""
+    limit_row = loci_inputs[loci_inputs[HARMONIC_ORDER_COLUMN] == harmonic_order]
+    return limit_row.iloc[0][limit_column_for(main_title)] if not limit_row.empty else 1.0
+
+
+def order_summary(info):
+    """Compact, JSON-serialisable summary of an evaluated order dict (no point arrays)."""
+    summary = {
+        'harmonic_order': int(info['harmonic_order']),
+        'limit': float(info['limit']),
+        'worst_case_hd': float(info['worst_case_hd']),
+        'worst_case_R': float(info['worst_case_R']),
+        'worst_case_X': float(info['worst_case_X']),
+        'network_R': float(info['network_R']),
+        'network_X': float(info['network_X']),
+        'non_compliant': bool(info['non_compliant']),
+    }
+    if 'worst_case_scenario' in info:
+        summary['worst_case_scenario'] = int(info['worst_case_scenario'])
+        summary['scenario_worst_hd'] = [float(hd) for hd in info['scenario_worst_hd']]
+    return summary
+
+
+def write_compliance_summary(summaries, path):
+    """
+    Write one row per order (see order_summary) to an Excel file (path or
+    binary file object): worst-case HD and point, limit and pass/fail.
+    """
+    import pandas as pd
+
+    rows = [{
+        HARMONIC_ORDER_COLUMN: summary['harmonic_order'],
+        'Worst-case HD': summary['worst_case_hd'],
+        'Worst-case R': summary['worst_case_R'],
+        'Worst-case X': summary['worst_case_X'],
+        'Limit': summary['limit'],
+        'HD/Limit ratio': summary['worst_case_hd'] / summary['limit'],
+        'Result': 'Fail' if summary['non_compliant'] else 'Pass',
+    } for summary in summaries]
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame(rows).to_excel(writer, sheet_name='Compliance', index=False)
+    return path
+
+
+# MULTI-LIMIT COMPLIANCE
+
+def limit_columns_in(loci_inputs):
+    """Names of the limit columns of the 'Harmonic Limits' sheet."""
+    return [column for column in loci_inputs.columns
+            if isinstance(column, str) and 'Limit' in column]
+
+
+def limit_basis_label(limit_column):
+    """Colorbar label for results checked against 'limit_column'."""
+    return f"HD/Limit ratio  |  Limit: {limit_column}"
+
+
+def order_limits(loci_inputs, harmonic_orders, limit_columns):
+    """
+    Limits of every harmonic order for every limit column.
+
+    Like load_order_data, the first row of an order is used and orders
+    without a row get a limit of 1.0.
+
+    Returns:
+        Float array of shape (len(harmonic_orders), len(limit_columns))
+    """
+    missing = [column for column in limit_columns if column not in loci_inputs.columns]
+    if missing:
+        raise ValueError(f"Could not find limit columns: {missing}")
+    table = (loci_inputs.drop_duplicates(HARMONIC_ORDER_COLUMN)
+             .set_index(HARMONIC_ORDER_COLUMN)[list(limit_columns)])
+    limits = table.reindex(list(harmonic_orders)).to_numpy(dtype=float, copy=True)
+    limits[[order not in table.index for order in harmonic_orders]] = 1.0
+    return limits
+
+
+def evaluate_limits(infos, loci_inputs, limit_columns):
+    """
+    Evaluate the worst-case HD of every order against several limit columns
+    in one vectorized pass.
+
+    Args:
+        infos: Order dicts (see load_order_arrays), one per harmonic order
+        loci_inputs: DataFrame of harmonic limits (see load_loci_inputs)
+        limit_columns: Limit columns to compare against, e.g.
+            ['Incremental Distortion Limit (%V1) at PCC', 'Total Limit (%V1) at PCC']
+
+    Returns:
+        Dict with harmonic_orders, limit_columns, the limits, ratio
+        (worst-case HD / limit) and passed matrices, each of shape
+        (orders, limit columns)
+    """
+    harmonic_orders = [info['harmonic_order'] for info in infos]
+    limits = order_limits(loci_inputs, harmonic_orders, limit_columns)
+    invalid = limits <= 0
+    if invalid.any():
+        row, col = np.argwhere(invalid)[0]
+        raise ValueError(f"Invalid limit ({limits[row, col]}) for Harmonic Order {harmonic_orders[row]}"
+                         f" in '{limit_columns[col]}'")
+    worst_case_hd = np.array([info['worst_case_hd'] for info in infos], dtype=float)
+    ratio = worst_case_hd[:, None] / limits
+    return {
+        'harmonic_orders': harmonic_orders,
+        'limit_columns': list(limit_columns),
+        'limits': limits,
+        'ratio': ratio,
+        'passed': ~(ratio > 1),
+    }
+
+
+def write_compliance_matrix(matrix, path):
+    """Write the ratio and pass/fail matrices of evaluate_limits to an Excel file (path or binary file object)."""
+    import pandas as pd
+
+    index = pd.Index(matrix['harmonic_orders'], name=HARMONIC_ORDER_COLUMN)
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame(matrix['ratio'], index=index, columns=matrix['limit_columns']).to_excel(
+            writer, sheet_name='HD-Limit Ratio')
+        pd.DataFrame(np.where(matrix['passed'], 'Pass', 'Fail'), index=index,
+                     columns=matrix['limit_columns']).to_excel(writer, sheet_name='Pass-Fail')
+    return path
+
+
+# SCENARIO ENVELOPE
+
+# R/X values are matched between scenarios after rounding to this many decimals
+ENVELOPE_DECIMALS = 6
+
+
+def align_scenario_points(infos, decimals=ENVELOPE_DECIMALS):
+    """
+    Put the HD values of several scenarios of one order on common R/X points.
+
+    Scenarios sampled on the same grid are stacked as they are. Otherwise
+    points are matched on their rounded R/X values, in order of first
+    appearance; a point a scenario lacks is NaN for that scenario.
+
+    Returns:
+        Tuple of (RR, XX, HD) with HD of shape (scenarios, points)
+    """
+    RR, XX = infos[0]['RR'], infos[0]['XX']
+    if all(np.array_equal(info['RR'], RR) and np.array_equal(info['XX'], XX) for info in infos[1:]):
+        return RR, XX, np.vstack([info['HD'] for info in infos])
+
+    keys = np.concatenate([np.round(np.column_stack([info['RR'], info['XX']]), decimals) for info in infos])
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    point = rank[inverse.ravel()]
+
+    scenario = np.repeat(np.arange(len(infos)), [len(info['HD']) for info in infos])
+    HD = np.full((len(infos), len(order)), np.nan)
+    # A point listed twice in one scenario keeps its larger HD
+    np.fmax.at(HD, (scenario, point), np.concatenate([info['HD'] for info in infos]))
+    return keys[first[order], 0], keys[first[order], 1], HD
+
+
+def scenario_envelope(infos):
+    """
+    Envelope of one harmonic order over several scenarios.
+
+    Args:
+        infos: Order dicts of the same order, one per scenario
+            (see load_order_arrays)
+
+    Returns:
+        Order dict like load_order_arrays whose HD is the element-wise
+        maximum over the scenarios, plus 'worst_scenario' (index of the
+        scenario giving each point's HD), 'worst_case_scenario' and
+        'scenario_worst_hd' (worst-case HD of every scenario)
+    """
+    RR, XX, stacked = align_scenario_points(infos)
+    filled = np.where(np.isnan(stacked), -np.inf, stacked)
+    worst_scenario = filled.argmax(axis=0)
+    HD = filled.max(axis=0)
+    HD[np.isneginf(HD)] = np.nan
+
+    worst_case_index = np.argmax(HD)
+    worst_case_scenario = int(worst_scenario[worst_case_index])
+    worst = infos[worst_case_scenario]
+    return {
+        'harmonic_order': infos[0]['harmonic_order'],
+        'RR': RR,
+        'XX': XX,
+        'HD': HD,
+        'worst_case_hd': HD.max(),
+        'worst_case_R': RR[worst_case_index],
+        'worst_case_X': XX[worst_case_index],
+        # The envelope maximum is the worst case of that scenario
+        'network_R': worst['network_R'],
+        'network_X': worst['network_X'],
+        'worst_scenario': worst_scenario,
+        'worst_case_scenario': worst_case_scenario,
+        'scenario_worst_hd': [info['worst_case_hd'] for info in infos],
+    }
+
+
+def load_envelope_arrays(excel_files, sheet_name):
+    """Read one 'Harmonic Order N' sheet from every scenario workbook and return its envelope."""
+    return scenario_envelope([load_order_arrays(excel_file, sheet_name) for excel_file in excel_files])
+
+
+def load_envelope_data(excel_files, sheet_name, loci_inputs, main_title):
+    """Like load_order_data, for the envelope of several scenario workbooks."""
+    info = load_envelope_arrays(excel_files, sheet_name)
+    return with_limit(info, order_limit(loci_inputs, info['harmonic_order'], main_title))
+
+
+def write_envelope_summary(summaries, scenario_names, path):
+    """
+    Write the per-order envelope results (see order_summary) to an Excel
+    file (path or binary file object): worst-case HD, the scenario it comes
+    from, the limit check and the worst-case HD of every scenario.
+    """
+    import pandas as pd
+
+    rows = []
+    for summary in summaries:
+        row = {
+            HARMONIC_ORDER_COLUMN: summary['harmonic_order'],
+            'Worst-case HD': summary['worst_case_hd'],
+            'Worst-case scenario': scenario_names[summary['worst_case_scenario']],
+            'Limit': summary['limit'],
+            'HD/Limit ratio': summary['worst_case_hd'] / summary['limit'],
+            'Result': 'Fail' if summary['non_compliant'] else 'Pass',
+        }
+        row.update(zip(scenario_names, summary['scenario_worst_hd']))
+        rows.append(row)
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame(rows).to_excel(writer, sheet_name='Envelope', index=False)
+    return path
@@ -0,0 +1,675 @@
+import html
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from itertools import chain
+
+import numpy as np
+
+# Rows added to the buffer at a time when the sheet has no usable dimension
+GROW_ROWS = 4096
+
+# Most cells allocated up front from a recorded used range, which can be
+# bogus (e.g. 'A1:XFD1048576'); larger sheets grow the buffer as they go
+INITIAL_CELLS = 1 << 20
+
+# SpreadsheetML namespaces used by the direct XML reader
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Bytes of worksheet XML decompressed and scanned at a time
+XML_CHUNK_BYTES = 1 << 22
+
+# Byte patterns for scanning worksheet XML (any namespace prefix)
+SHEET_DATA_RE = re.compile(rb'<(\w+:)?sheetData\b[^>]*>')
+DIMENSION_RE = re.compile(rb'<(?:\w+:)?dimension\b[^>]*?\sref="([^"]*)"')
+ROW_NUMBER_RE = re.compile(rb'\sr="(\d+)"')
+CELL_REF_RE = re.compile(rb'\sr="([A-Z]+)\d*"')
+CELL_TYPE_RE = re.compile(rb'\st="(\w+)"')
+VALUE_RE = re.compile(rb'<(?:\w+:)?v(?:\s[^>]*)?>([^<]*)</(?:\w+:)?v>')
+FAST_CELL_RE = re.compile(rb'<c r="([A-Z]+)(\d+)"([^>]*)>(?:<f\b[^>]*?(?:/>|>[^<]*</f>))?<v>([^<]*)</v>')
+INLINE_TEXT_RE = re.compile(rb'<(?:\w+:)?t(?:\s[^>]*)?>([^<]*)</(?:\w+:)?t>')
+
+# Cell types (t="...") whose value is a number, and those holding text
+# (error cells such as #N/A are neither: pandas reads them as NaN too)
+NUMERIC_CELL_TYPES = (None, b'n', b'b')
+TEXT_CELL_TYPES = (b's', b'str', b'inlineStr')
+
+# Errors that make load_vertex_array fall back from the XML reader to openpyxl
+# (MemoryError: the openpyxl reader keeps no decompressed chunks around)
+XML_READER_ERRORS = (zipfile.BadZipFile, KeyError, ValueError, ET.ParseError, MemoryError)
+
+
+# UTILITY FUNCTIONS
+
+def row_to_floats(row, out):
+    """
+    Write one row of raw cell values into the float buffer 'out'.
+    Empty cells and cells that cannot be parsed as numbers stay NaN.
+
+    Returns:
+        Column indexes of the cells holding text (not Excel errors)
+    """
+    try:
+        out[:len(row)] = row
+        return []
+    except (TypeError, ValueError):
+        # Mixed row with text in it: convert cell by cell
+        text_cols = []
+        for col_i, cell in enumerate(row):
+            try:
+                out[col_i] = float(cell)
+            except (TypeError, ValueError):
+                out[col_i] = np.nan
+                if isinstance(cell, str) and not cell.startswith('#'):
+                    text_cols.append(col_i)
+        return text_cols
+
+
+def used_column_count(ws):
+    """
+    Number of columns in the used range of a read-only worksheet, or None if
+    the sheet does not record its dimension.
+    """
+    try:
+        max_col = ws.max_column
+    except (TypeError, ValueError):
+        return None
+    if not max_col or max_col < 1:
+        return None
+    return max_col
+
+
+def initial_rows(num_rows, num_cols):
+    """Rows to allocate up front for a used range of num_rows x num_cols."""
+    return max(1, min(num_rows, GROW_ROWS, INITIAL_CELLS // max(num_cols, 1)))
+
+
+def column_index(letters):
+    """Zero-based index of an Excel column name ('A' -> 0, 'AB' -> 27)."""
+    index = 0
+    for letter in letters:
+        index = index * 26 + (ord(letter) - 64)
+    return index - 1
+
+
+def split_cell_ref(ref):
+    """Split 'AB12' into ('AB', 12)."""
+    letters = ref.rstrip('0123456789')
+    return letters, int(ref[len(letters):])
+
+
+def used_range(ref):
+    """(rows, columns) of a used-range reference such as 'A1:F11'. Raises ValueError if malformed."""
+    letters, max_row = split_cell_ref(ref.split(':')[-1])
+    if not letters:
+        raise ValueError(f"Malformed range {ref}")
+    return max_row, column_index(letters) + 1
+
+
+def text_cell_array(chunks):
+    """Stack (rows, columns) chunks of text cell positions into an (n, 2) int array."""
+    if not chunks:
+        return np.empty((0, 2), dtype=np.intp)
+    return np.column_stack([np.concatenate([np.asarray(rows, dtype=np.intp) for rows, _ in chunks]),
+                            np.concatenate([np.asarray(cols, dtype=np.intp) for _, cols in chunks])])
+
+
+def parse_number(text):
+    """Cell text to int or float, the way openpyxl types numeric cells."""
+    if '.' in text or 'E' in text or 'e' in text:
+        return float(text)
+    return int(text)
+
+
+def element_text(elem):
+    """Text of a shared or inline string item: its <t> or rich-text runs, without phonetic runs."""
+    parts = []
+    for child in elem:
+        if child.tag == MAIN_NS + 't':
+            parts.append(child.text or '')
+        elif child.tag == MAIN_NS + 'r':
+            t = child.find(MAIN_NS + 't')
+            if t is not None:
+                parts.append(t.text or '')
+    return ''.join(parts)
+
+
+# DIRECT XML READER
+
+def sheet_part_name(zf, sheet_name):
+    """Path of the worksheet XML of 'sheet_name' inside the xlsx zip."""
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    rel_id = None
+    for sheet in workbook.iter(MAIN_NS + 'sheet'):
+        if sheet.get('name') == sheet_name:
+            rel_id = sheet.get(REL_NS + 'id')
+            break
+    if rel_id is None:
+        raise KeyError(f"Worksheet {sheet_name} does not exist.")
+
+    rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels.iter(PKG_REL_NS + 'Relationship'):
+        if rel.get('Id') == rel_id:
+            target = rel.get('Target')
+            if target.startswith('/'):
+                return target.lstrip('/')
+            return posixpath.normpath(posixpath.join('xl', target))
+    raise KeyError(f"No relationship {rel_id} for worksheet {sheet_name}")
+
+
+def read_shared_strings(zf):
+    """List of the workbook's shared strings (empty if it has none)."""
+    try:
+        stream = zf.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+    strings = []
+    with stream:
+        for _, elem in ET.iterparse(stream):
+            if elem.tag == MAIN_NS + 'si':
+                strings.append(element_text(elem))
+                elem.clear()
+    return strings
+
+
+def cell_type_of(cell_attrs):
+    """Value of the t="..." attribute of a cell (None if absent)."""
+    cell_type = CELL_TYPE_RE.search(cell_attrs)
+    return cell_type.group(1) if cell_type else None
+
+
+def raw_cell_value(cell_type, v, cell_body, shared_strings):
+    """Python value of a header cell, typed like openpyxl's values_only rows."""
+    if cell_type == b'inlineStr':
+        texts = INLINE_TEXT_RE.findall(cell_body)
+        return html.unescape(b''.join(texts).decode('utf-8')) if texts else None
+    if v is None:
+        return None
+    text = html.unescape(v.group(1).decode('utf-8'))
+    if cell_type in (None, b'n'):
+        return parse_number(text)
+    if cell_type == b's':
+        return shared_strings()[int(text)]
+    if cell_type == b'b':
+        return bool(int(text))
+    return text
+
+
+def row_patterns(prefix):
+    """
+    Compiled (row, cell, row close tag) patterns for a worksheet whose
+    elements use the namespace prefix 'prefix' (e.g. b'x:' or b'').
+    """
+    p = re.escape(prefix)
+    row_re = re.compile(rb'<' + p + rb'row\b([^>]*?)(?:/>|>(.*?)</' + p + rb'row>)', re.S)
+    cell_re = re.compile(rb'<' + p + rb'c\b([^>]*?)(?:/>|>(.*?)</' + p + rb'c>)', re.S)
+    return row_re, cell_re, b'</' + prefix + b'row>'
+
+
+class SheetBuffer:
+    """
+    Growable float buffer that read_sheet_xml fills row by row or block by
+    block. Row numbers are the 1-based Excel row numbers; the first
+    header_rows rows are kept as raw values in 'header' instead. The
+    recorded used range only sizes the initial allocation (see
+    initial_rows); rows past it are added by reserve().
+    """
+
+    def __init__(self, max_row, max_col, header_rows):
+        self.header_rows = header_rows
+        self.values = np.full((initial_rows(max_row - header_rows, max_col), max(max_col, 1)), np.nan)
+        self.flat = self.values.reshape(-1)
+        self.header = []
+        self.num_cols = max_col
+        self.last_used = 0
+        self.column_cache = {}
+        self.text_cells = []  # (rows, columns) arrays of data cells holding text
+
+    def column(self, letters):
+        col_i = self.column_cache.get(letters)
+        if col_i is None:
+            col_i = self.column_cache[letters] = column_index(letters.decode())
+        return col_i
+
+    def reserve(self, row_i, col_i):
+        """Grow the buffer so that values[row_i, col_i] exists."""
+        rows, cols = self.values.shape
+        if row_i < rows and col_i < cols:
+            return
+        new_rows = rows if row_i < rows else max(2 * rows, row_i + 1)
+        grown = np.full((new_rows, max(cols, col_i + 1)), np.nan)
+        grown[:rows, :cols] = self.values
+        self.values = grown
+        self.flat = grown.reshape(-1)
+
+    def scan_row(self, row_number, row_body, cell_re, shared_strings):
+        """Parse one <row> element cell by cell (header rows and unusual layouts)."""
+        is_header = row_number <= self.header_rows
+        if is_header:
+            while len(self.header) < row_number:
+                self.header.append({})
+        row_i = row_number - self.header_rows - 1
+
+        col_i = -1
+        used = False
+        for cell_attrs, cell_body in cell_re.findall(row_body):
+            ref = CELL_REF_RE.search(cell_attrs)
+            col_i = self.column(ref.group(1)) if ref else col_i + 1
+            if not cell_body:
+                continue
+            cell_type = cell_type_of(cell_attrs)
+            v = VALUE_RE.search(cell_body)
+
+            if is_header:
+                value = raw_cell_value(cell_type, v, cell_body, shared_strings)
+                if value is not None:
+                    self.header[row_number - 1][col_i] = value
+                    self.num_cols = max(self.num_cols, col_i + 1)
+                continue
+            if v is None:
+                if cell_type == b'inlineStr' and INLINE_TEXT_RE.search(cell_body):
+                    used = True
+                    self.text_cells.append(([row_i], [col_i]))
+                continue
+            used = True
+            if cell_type not in NUMERIC_CELL_TYPES:
+                # Text and error cells stay NaN
+                if cell_type in TEXT_CELL_TYPES:
+                    self.text_cells.append(([row_i], [col_i]))
+                continue
+            self.reserve(row_i, col_i)
+            self.num_cols = max(self.num_cols, col_i + 1)
+            self.values[row_i, col_i] = float(v.group(1))
+
+        if used:
+            self.last_used = max(self.last_used, row_i + 1)
+
+    def scan_block(self, block):
+        """
+        Parse a block of complete data rows in one vectorized pass.
+
+        Only handles the layout Excel and most writers produce (unprefixed
+        tags, every cell with an 'r' reference, plain <v> values). Returns
+        False, without changing the buffer, for anything else.
+        """
+        cells = FAST_CELL_RE.findall(block)
+        if (len(cells) != block.count(b'<v>') or b'<v ' in block or b'<is>' in block
+                or block.count(b'<c ') != block.count(b'<c r="')):
+            return False
+        if not cells:
+            return True
+        letters, rows, attrs, texts = zip(*cells)
+        row_i = np.fromiter(map(int, rows), dtype=np.intp, count=len(rows)) - (self.header_rows + 1)
+        if row_i.min() < 0:
+            return False
+        for l in set(letters).difference(self.column_cache):
+            self.column(l)
+        col_i = np.fromiter(map(self.column_cache.__getitem__, letters), dtype=np.intp, count=len(letters))
+
+        # Cells with a value make their row used, but only numbers are kept
+        self.last_used = max(self.last_used, int(row_i.max()) + 1)
+        numeric_attrs = {a: cell_type_of(a) in NUMERIC_CELL_TYPES for a in set(attrs)}
+        if not all(numeric_attrs.values()):
+            numeric = np.fromiter(map(numeric_attrs.__getitem__, attrs), dtype=bool, count=len(attrs))
+            text_attrs = {a: cell_type_of(a) in TEXT_CELL_TYPES for a in numeric_attrs}
+            text = np.fromiter(map(text_attrs.__getitem__, attrs), dtype=bool, count=len(attrs))
+            if text.any():
+                self.text_cells.append((row_i[text], col_i[text]))
+            row_i, col_i = row_i[numeric], col_i[numeric]
+            texts = [t for t, keep in zip(texts, numeric) if keep]
+            if not texts:
+                return True
+
+        self.reserve(int(row_i.max()), int(col_i.max()))
+        self.num_cols = max(self.num_cols, int(col_i.max()) + 1)
+        self.flat[row_i * self.values.shape[1] + col_i] = np.fromiter(map(float, texts), dtype=float, count=len(texts))
+        return True
+
+    def result(self, row_number):
+        # Header rows that are missing from the XML are empty rows
+        while len(self.header) < min(self.header_rows, row_number):
+            self.header.append({})
+        header = [tuple(row.get(col_i) for col_i in range(self.num_cols)) for row in self.header]
+        return header, self.values[:self.last_used, :self.num_cols]
+
+    def text_cell_array(self):
+        """(row, column) positions in the values of the data cells holding text, as an (n, 2) array."""
+        cells = text_cell_array(self.text_cells)
+        # Text in columns past the last header or number is outside the values
+        return cells[cells[:, 1] < self.num_cols]
+
+
+def read_sheet_xml(file_path, sheet_name, header_rows=0, text_cells=False):
+    """
+    Read a numeric sheet straight from the worksheet XML of an .xlsx/.xlsm.
+
+    The sheet XML is decompressed in chunks of whole rows. Each chunk is
+    scanned with one regular expression and its numbers are converted and
+    scattered into the float buffer by NumPy, so no per-cell objects are
+    created. Shared strings are only loaded when a header row refers to
+    them. Same contract as load_vertex_array.
+
+    Raises:
+        KeyError: If the sheet (or a workbook part) does not exist
+        zipfile.BadZipFile, ET.ParseError, ValueError: If the file is not
+            a workbook this reader understands
+    """
+    with zipfile.ZipFile(file_path) as zf:
+        part = sheet_part_name(zf, sheet_name)
+
+        strings = []
+
+        def shared_strings():
+            if not strings:
+                strings.append(read_shared_strings(zf))
+            return strings[0]
+
+        buffer = None
+        patterns = None
+        row_number = 0
+        pending = b''
+
+        with zf.open(part) as stream:
+            while True:
+                chunk = stream.read(XML_CHUNK_BYTES)
+                pending += chunk
+                if patterns is None:
+                    start = SHEET_DATA_RE.search(pending)
+                    if start is None:
+                        if chunk:
+                            continue
+                        raise ValueError(f"No sheetData in worksheet {sheet_name}")
+                    # Size the buffer from the recorded used range (e.g. 'A1:F11')
+                    max_row, max_col = GROW_ROWS + header_rows, 0
+                    dimension = DIMENSION_RE.search(pending, 0, start.start())
+                    if dimension is not None:
+                        try:
+                            max_row, max_col = used_range(dimension.group(1).decode())
+                        except ValueError:
+                            max_row, max_col = GROW_ROWS + header_rows, 0
+                    buffer = SheetBuffer(max_row, max_col, header_rows)
+                    prefix = start.group(1) or b''
+                    patterns = row_patterns(prefix)
+                    pending = pending[start.end():]
+
+                row_re, cell_re, row_close = patterns
+                if chunk:
+                    cut = pending.rfind(row_close)
+                    if cut < 0:
+                        continue
+                    cut += len(row_close)
+                    block, pending = pending[:cut], pending[cut:]
+                else:
+                    block, pending = pending, b''
+
+                # Header rows (and rows without an 'r' number) go row by row
+                offset = 0
+                for match in row_re.finditer(block):
+                    r = ROW_NUMBER_RE.search(match.group(1))
+                    if r and int(r.group(1)) > header_rows and not prefix:
+                        offset = match.start()
+                        break
+                    row_number = int(r.group(1)) if r else row_number + 1
+                    if match.group(2):
+                        buffer.scan_row(row_number, match.group(2), cell_re, shared_strings)
+                    offset = match.end()
+
+                # Data rows in one pass, or row by row if the layout is unusual
+                rest = block[offset:]
+                if not buffer.scan_block(rest):
+                    for match in row_re.finditer(rest):
+                        r = ROW_NUMBER_RE.search(match.group(1))
+                        row_number = int(r.group(1)) if r else row_number + 1
+                        if match.group(2):
+                            buffer.scan_row(row_number, match.group(2), cell_re, shared_strings)
+                elif b'<row' in rest:
+                    last = ROW_NUMBER_RE.search(rest, rest.rfind(b'<row'))
+                    if last:
+                        row_number = int(last.group(1))
+                if not chunk:
+                    break
+
+    header, values = buffer.result(row_number)
+    if text_cells:
+        return header, values, buffer.text_cell_array()
+    return header, values
+
+
+def read_workbook_sheet_names(zf):
+    """Sheet names of the workbook zip, in workbook order."""
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    return [sheet.get('name') for sheet in workbook.iter(MAIN_NS + 'sheet')]
+
+
+def read_header_xml(file_path, sheet_name, header_rows=1):
+    """
+    Read the first header_rows rows and the recorded used range of a sheet
+    from the worksheet XML. Decompression stops at the first row after the
+    header, so the cost does not depend on the size of the sheet. Same
+    contract and errors as read_sheet_header / read_sheet_xml.
+    """
+    with zipfile.ZipFile(file_path) as zf:
+        part = sheet_part_name(zf, sheet_name)
+
+        strings = []
+
+        def shared_strings():
+            if not strings:
+                strings.append(read_shared_strings(zf))
+            return strings[0]
+
+        buffer = SheetBuffer(header_rows, 0, header_rows)
+        dimension = None
+        patterns = None
+        row_number = 0
+        pending = b''
+        done = False
+
+        with zf.open(part) as stream:
+            while not done:
+                chunk = stream.read(XML_CHUNK_BYTES)
+                pending += chunk
+                if patterns is None:
+                    start = SHEET_DATA_RE.search(pending)
+                    if start is None:
+                        if chunk:
+                            continue
+                        raise ValueError(f"No sheetData in worksheet {sheet_name}")
+                    ref = DIMENSION_RE.search(pending, 0, start.start())
+                    if ref is not None:
+                        try:
+                            dimension = used_range(ref.group(1).decode())
+                        except ValueError:
+                            dimension = None
+                    patterns = row_patterns(start.group(1) or b'')
+                    pending = pending[start.end():]
+
+                row_re, cell_re, row_close = patterns
+                if chunk:
+                    cut = pending.rfind(row_close)
+                    if cut < 0 and len(pending) < XML_CHUNK_BYTES:
+                        continue
+                    block = pending
+                else:
+                    block, done = pending, True
+
+                offset = 0
+                for match in row_re.finditer(block):
+                    r = ROW_NUMBER_RE.search(match.group(1))
+                    number = int(r.group(1)) if r else row_number + 1
+                    if number > header_rows:
+                        done = True
+                        break
+                    row_number = number
+                    if match.group(2):
+                        buffer.scan_row(row_number, match.group(2), cell_re, shared_strings)
+                    offset = match.end()
+                    if row_number == header_rows:
+                        done = True
+                        break
+                pending = block[offset:]
+
+    header, _ = buffer.result(header_rows)
+    return header, dimension
+
+
+# OPENPYXL READER
+
+def read_sheet_openpyxl(file_path, sheet_name, header_rows=0, text_cells=False):
+    """
+    Stream a sheet with openpyxl in read-only mode into a float array.
+    Same contract as load_vertex_array.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name]
+        num_cols = used_column_count(ws)
+        try:
+            max_row = ws.max_row
+        except (TypeError, ValueError):
+            max_row = None
+
+        rows = ws.iter_rows(min_col=1, max_col=num_cols, values_only=True)
+
+        header = []
+        for _ in range(header_rows):
+            row = next(rows, None)
+            if row is None:
+                break
+            header.append(tuple(row))
+
+        if num_cols is None:
+            # No dimension recorded: size the buffer from the header (or
+            # the first data row) and grow it as needed
+            first = header[0] if header else next(rows, ())
+            num_cols = len(first)
+            pending = [] if header else [first]
+        else:
+            pending = []
+
+        # The used range is only a hint: allocate a bounded buffer and grow
+        # it when a non-empty row does not fit, so empty rows cost nothing
+        capacity = GROW_ROWS if not max_row else initial_rows(max_row - len(header), num_cols)
+        values = np.full((capacity, num_cols), np.nan)
+        blank_row = (None,) * num_cols
+
+        num_rows = 0
+        last_used = 0
+        text_chunks = []
+        for row in chain(pending, rows):
+            row = row[:num_cols]
+            if row != blank_row[:len(row)]:
+                if num_rows >= values.shape[0]:
+                    grown = np.full((max(2 * values.shape[0], num_rows + 1, GROW_ROWS), num_cols), np.nan)
+                    grown[:values.shape[0]] = values
+                    values = grown
+                text_cols = row_to_floats(row, values[num_rows])
+                if text_cols:
+                    text_chunks.append(([num_rows] * len(text_cols), text_cols))
+                last_used = num_rows + 1
+            num_rows += 1
+    finally:
+        wb.close()
+
+    # Drop trailing empty rows (pandas does the same)
+    if text_cells:
+        return header, values[:last_used], text_cell_array(text_chunks)
+    return header, values[:last_used]
+
+
+def read_header_openpyxl(file_path, sheet_name, header_rows=1):
+    """Header rows and used range of a sheet with openpyxl in read-only mode (see read_sheet_header)."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name]
+        num_cols = used_column_count(ws)
+        try:
+            max_row = ws.max_row
+        except (TypeError, ValueError):
+            max_row = None
+        dimension = (max_row, num_cols) if max_row and num_cols else None
+        header = [tuple(row) for row in ws.iter_rows(min_row=1, max_row=header_rows,
+                                                      max_col=num_cols, values_only=True)]
+    finally:
+        wb.close()
+    return header, dimension
+
+
+# MAIN LOADER
+
+def load_vertex_array(file_path, sheet_name, header_rows=0, text_cells=False):
+    """
+    Load a numeric sheet (e.g. 'Impedance Loci Vertices' or a 'Harmonic
+    Order N' sheet) into a float array.
+
+    The worksheet XML is read directly from the workbook zip and numeric
+    cells go straight into a preallocated NumPy buffer (read_sheet_xml).
+    Workbooks that reader cannot handle are streamed with openpyxl in
+    read-only mode instead (read_sheet_openpyxl).
+
+    Args:
+        file_path: Path to the .xlsx/.xlsm workbook
+        sheet_name: Name of the sheet holding the numeric matrix
+        header_rows: Number of leading rows returned as raw values instead
+            of being converted to floats
+        text_cells: If True, also return where the data cells holding text
+            are (they are NaN in the values like empty cells)
+
+    Returns:
+        Tuple of (header, values) where header is a list of the raw header
+        rows (tuples) and values is a 2D float array with NaN for empty or
+        non-numeric cells. Trailing empty rows are dropped. With
+        text_cells, a third item: an (n, 2) int array of the (row, column)
+        positions in values of the cells holding text (not Excel errors).
+    """
+    try:
+        return read_sheet_xml(file_path, sheet_name, header_rows, text_cells)
+    except XML_READER_ERRORS:
+        return read_sheet_openpyxl(file_path, sheet_name, header_rows, text_cells)
+
+
+def list_sheet_names(file_path):
+    """Sheet names of an .xlsx/.xlsm workbook, read without loading any sheet."""
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            return read_workbook_sheet_names(zf)
+    except XML_READER_ERRORS:
+        from openpyxl import load_workbook
+
+        wb = load_workbook(file_path, read_only=True)
+        try:
+            return list(wb.sheetnames)
+        finally:
+            wb.close()
+
+
+def read_sheet_header(file_path, sheet_name, header_rows=1):
+    """
+    Read only the header rows and the used range of a sheet (for checks
+    that must not parse the data).
+
+    Args:
+        file_path: Path to the .xlsx/.xlsm workbook
+        sheet_name: Name of the sheet
+        header_rows: Number of leading rows to return
+
+    Returns:
+        Tuple of (header, dimension) where header is a list of the raw
+        header rows (tuples, like load_vertex_array) and dimension is the
+        (rows, columns) of the used range recorded in the workbook, or
+        None if it records none
+
+    Raises:
+        KeyError: If the sheet does not exist
+    """
+    try:
+        return read_header_xml(file_path, sheet_name, header_rows)
+    except XML_READER_ERRORS:
+        return read_header_openpyxl(file_path, sheet_name, header_rows)
@@ -0,0 +1,330 @@
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import zipfile
+
+# Artifacts that are already compressed are stored in the archive as they are
+STORED_EXTENSIONS = ('.png', '.xlsx', '.xlsm', '.zip')
+
+# Colours kept when PNG artifacts are palette-quantized (see PalettePngSink)
+PNG_PALETTE_COLORS = 256
+
+
+# UTILITY FUNCTIONS
+
+def join_name(*parts):
+    """Join artifact name parts with '/' (the separator used inside every sink)."""
+    return '/'.join(part.strip('/') for part in parts if part)
+
+
+def compress_type_for(name):
+    """Compression used for 'name' in a ZIP archive."""
+    if name.lower().endswith(STORED_EXTENSIONS):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def quantize_png(data, colors=PNG_PALETTE_COLORS):
+    """
+    Re-encode PNG bytes as an adaptive palette image with optimized
+    compression. The plots are a few colormap colours on white, so this
+    is no visible loss at 256 colours.
+
+    Returns:
+        The new PNG bytes, or 'data' itself when they would not be smaller
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        # Keep the resolution recorded by savefig
+        save_options = {'dpi': image.info['dpi']} if 'dpi' in image.info else {}
+        if image.mode == 'RGBA' and image.getextrema()[3][0] < 255:
+            # Only the octree method keeps real transparency
+            quantized = image.quantize(colors=colors, method=Image.Quantize.FASTOCTREE)
+        else:
+            quantized = image.convert('RGB').quantize(colors=colors, method=Image.Quantize.MEDIANCUT,
+                                                      dither=Image.Dither.NONE)
+    buffer = io.BytesIO()
+    quantized.save(buffer, format='PNG', optimize=True, **save_options)
+    optimized = buffer.getvalue()
+    return optimized if len(optimized) < len(data) else data
+
+
+# SINKS
+
+class OutputSink:
+    """
+    Destination for the files produced by the scripts.
+
+    Artifacts are addressed by relative names with '/' separators
+    (e.g. 'Total Limit (%V1) at PCC/VhTotal_Page_1.png'). Subclasses
+    implement write_bytes; open() buffers a single artifact in memory and
+    hands it to write_bytes when the 'with' block ends.
+    """
+
+    def __init__(self):
+        self.written = []
+
+    def write_bytes(self, name, data):
+        """Store 'data' as artifact 'name'. Returns its location."""
+        raise NotImplementedError
+
+    def location(self, name):
+        """Path or archive name reported for artifact 'name'."""
+        return name
+
+    def open(self, name):
+        """Binary file object for artifact 'name', to be used as a context manager."""
+        return _ArtifactBuffer(self, name)
+
+    def write_file(self, name, path):
+        """Store the file at 'path' as artifact 'name'. Returns its location."""
+        with open(path, 'rb') as f:
+            return self.write_bytes(name, f.read())
+
+    def subfolder(self, name):
+        """Sink writing into the folder 'name' of this sink."""
+        return SubfolderSink(self, name)
+
+    def close(self):
+        """Finish writing (e.g. write the ZIP central directory)."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class _ArtifactBuffer(io.BytesIO):
+    """In-memory file that is written to its sink when closed without error."""
+
+    def __init__(self, sink, name):
+        super().__init__()
+        self.sink = sink
+        self.name = name
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.sink.write_bytes(self.name, self.getvalue())
+        self.close()
+
+
+class DirectorySink(OutputSink):
+    """Write artifacts as loose files below a folder (the scripts' original behaviour)."""
+
+    def __init__(self, root):
+        super().__init__()
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def location(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def open(self, name):
+        # Write straight to the file; nothing is buffered for folders
+        path = self.location(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.written.append(name)
+        return open(path, 'wb')
+
+    def write_bytes(self, name, data):
+        with self.open(name) as f:
+            f.write(data)
+        return self.location(name)
+
+
+class ZipSink(OutputSink):
+    """
+    Compress artifacts into a ZIP archive as they are produced.
+
+    'target' is a path or a writable binary file object; the file object
+    does not need to be seekable, so the archive can be streamed (e.g. to
+    sys.stdout.buffer). PNG and Excel files are stored, other files are
+    deflated.
+    """
+
+    def __init__(self, target):
+        super().__init__()
+        if isinstance(target, str):
+            parent = os.path.dirname(os.path.abspath(target))
+            os.makedirs(parent, exist_ok=True)
+        self.target = target
+        self.archive = zipfile.ZipFile(target, 'w')
+
+    def write_bytes(self, name, data):
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = compress_type_for(name)
+        self.archive.writestr(info, data)
+        self.written.append(name)
+        return self.location(name)
+
+    def write_file(self, name, path):
+        # Compressed straight from disk in chunks, without loading the file
+        self.archive.write(path, name, compress_type=compress_type_for(name))
+        self.written.append(name)
+        return self.location(name)
+
+    def close(self):
+        self.archive.close()
+
+
+class MemorySink(OutputSink):
+    """Keep artifacts in memory, in the dict 'files' (name -> bytes)."""
+
+    def __init__(self):
+        super().__init__()
+        self.files = {}
+
+    def write_bytes(self, name, data):
+        self.files[name] = data
+        self.written.append(name)
+        return name
+
+    def to_zip_bytes(self):
+        """Return all artifacts packed as a ZIP archive."""
+        buffer = io.BytesIO()
+        with ZipSink(buffer) as archive:
+            for name, data in self.files.items():
+                archive.write_bytes(name, data)
+        return buffer.getvalue()
+
+
+class SubfolderSink(OutputSink):
+    """View of another sink that prefixes every artifact name with a folder."""
+
+    def __init__(self, parent, folder):
+        super().__init__()
+        self.parent = parent
+        self.folder = folder
+
+    def location(self, name):
+        return self.parent.location(join_name(self.folder, name))
+
+    def open(self, name):
+        self.written.append(name)
+        return self.parent.open(join_name(self.folder, name))
+
+    def write_bytes(self, name, data):
+        self.written.append(name)
+        return self.parent.write_bytes(join_name(self.folder, name), data)
+
+
+class PalettePngSink(OutputSink):
+    """
+    View of another sink that palette-quantizes PNG artifacts in memory
+    (see quantize_png) before they reach it; other artifacts pass through.
+
+    'savings' lists (name, original bytes, written bytes) per PNG.
+    """
+
+    def __init__(self, parent, colors=PNG_PALETTE_COLORS):
+        super().__init__()
+        self.parent = parent
+        self.colors = colors
+        self.savings = []
+
+    def location(self, name):
+        return self.parent.location(name)
+
+    def write_bytes(self, name, data):
+        if name.lower().endswith('.png'):
+            optimized = quantize_png(data, self.colors)
+            self.savings.append((name, len(data), len(optimized)))
+            data = optimized
+        self.written.append(name)
+        return self.parent.write_bytes(name, data)
+
+    def close(self):
+        self.parent.close()
+
+
+# CONSTRUCTION
+
+def open_sink(target):
+    """
+    Create the sink for an output target.
+
+    Args:
+        target: An OutputSink (returned as is), None for a MemorySink, a path
+            ending in '.zip' for a ZipSink, or a folder path for a DirectorySink
+
+    Returns:
+        Tuple of (sink, owned); 'owned' is True when the caller created the
+        sink here and must close it
+    """
+    if isinstance(target, OutputSink):
+        return target, False
+    if target is None:
+        return MemorySink(), True
+    if str(target).lower().endswith('.zip'):
+        return ZipSink(target), True
+    return DirectorySink(target), True
+
+
+def as_sink(target):
+    """Sink for a folder path or an existing sink (used by the per-file writers)."""
+    if isinstance(target, OutputSink):
+        return target
+    return DirectorySink(target)
+
+
+def archive_paths(target, root, names):
+    """
+    Write files and folders below 'root' into the ZIP archive 'target' in a
+    single pass, keeping their relative names. The archive only appears at
+    'target' once it is complete.
+
+    Returns:
+        The archived names, in archive order
+    """
+    partial = target + '.partial'
+    try:
+        with ZipSink(partial) as sink:
+            for name in names:
+                path = os.path.join(root, name)
+                if not os.path.isdir(path):
+                    sink.write_file(name, path)
+                    continue
+                for folder, subfolders, files in os.walk(path):
+                    subfolders.sort()
+                    rel = os.path.relpath(folder, root).replace(os.sep, '/')
+                    for file_name in sorted(files):
+                        sink.write_file(join_name(rel, file_name), os.path.join(folder, file_name))
+        os.replace(partial, target)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return sink.written
+
+
+# COMMAND LINE
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pack result files into a ZIP archive or list one.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    archive_parser = sub.add_parser('archive', help='Write files and folders into a new archive')
+    archive_parser.add_argument('target', help='Archive to create')
+    archive_parser.add_argument('names', nargs='+', help='Files and folders, relative to --root')
+    archive_parser.add_argument('--root', default='.', help='Folder the names are relative to')
+
+    list_parser = sub.add_parser('list', help='List the files of an archive')
+    list_parser.add_argument('archive')
+
+    args = parser.parse_args(argv)
+    if args.command == 'archive':
+        files = archive_paths(args.target, args.root, args.names)
+    else:
+        with zipfile.ZipFile(args.archive) as archive:
+            files = [name for name in archive.namelist() if not name.endswith('/')]
+    print(json.dumps({'files': files}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,324 @@
+import argparse
+import io
+import json
+import math
+import sys
+import time
+
+import numpy as np
+
+from output_sink import open_sink, as_sink, join_name
+from loci_io import list_sheet_names
+from loci_core import (R_COLUMN_NAMES, X_COLUMN_NAMES, HD_COLUMN_NAMES, NETWORK_COLUMNS,
+                       get_column_name, read_order_sheet, numeric_column, load_envelope_arrays)
+
+# Folder of the serialized indexes, next to the plots
+INDEX_FOLDER = 'Point_Index'
+
+# Average number of result points per grid cell
+POINTS_PER_CELL = 4
+
+# Upper bound on the grid size along R and along X
+MAX_CELLS_PER_AXIS = 2048
+
+
+# UTILITY FUNCTIONS
+
+def index_name(harmonic_order):
+    """Artifact name of the index of one harmonic order."""
+    return join_name(INDEX_FOLDER, f'Harmonic_Order_{harmonic_order}.npz')
+
+
+def read_point_arrays(excel_file, sheet_name):
+    """
+    Read the R/X/HD of every result point of a 'Harmonic Order N' sheet,
+    with the network (post-integration) R/X of every point when the sheet
+    has those columns.
+
+    Returns:
+        Dict with harmonic_order, RR, XX, HD, network_RR and network_XX
+        (None when missing)
+    """
+    df = read_order_sheet(excel_file, sheet_name)
+    arrays = {'harmonic_order': int(sheet_name.split()[-1])}
+    for key, names in (('RR', R_COLUMN_NAMES), ('XX', X_COLUMN_NAMES), ('HD', HD_COLUMN_NAMES)):
+        # Skip the units row below the header, as load_order_arrays does
+        arrays[key] = numeric_column(df, get_column_name(df, names))
+    for key, column in zip(('network_RR', 'network_XX'), NETWORK_COLUMNS):
+        arrays[key] = numeric_column(df, column) if column in df.columns else None
+    return arrays
+
+
+def optional_float(value):
+    """float(value), or None for NaN (JSON has no NaN)."""
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+# SPATIAL INDEX
+
+class PointIndex:
+    """
+    Uniform-grid index over the R/X result points of one harmonic order.
+
+    The points are sorted by grid cell (row-major, rows along X) and
+    'cell_start' holds the offset of every cell, so the points of a run of
+    cells in one row are one contiguous slice. Nearest-point queries search
+    rings of cells outward from the query point; rectangle queries read
+    one slice per grid row. Both touch only the cells near the query.
+    """
+
+    def __init__(self, RR, XX, HD, network_RR=None, network_XX=None, harmonic_order=None):
+        RR = np.asarray(RR, dtype=float)
+        XX = np.asarray(XX, dtype=float)
+        HD = np.asarray(HD, dtype=float)
+        if network_RR is None or network_XX is None:
+            network_RR = network_XX = np.full(len(RR), np.nan)
+        # Rows with text or empty cells cannot be placed on the grid
+        valid = np.isfinite(RR) & np.isfinite(XX) & np.isfinite(HD)
+        RR, XX, HD = RR[valid], XX[valid], HD[valid]
+        network_RR = np.asarray(network_RR, dtype=float)[valid]
+        network_XX = np.asarray(network_XX, dtype=float)[valid]
+        n = len(RR)
+
+        self.harmonic_order = harmonic_order
+        self.origin = (float(RR.min()), float(XX.min())) if n else (0.0, 0.0)
+        width = float(RR.max()) - self.origin[0] if n else 0.0
+        height = float(XX.max()) - self.origin[1] if n else 0.0
+
+        # About POINTS_PER_CELL points per cell, with cells close to square
+        cells = max(n / POINTS_PER_CELL, 1.0)
+        if width > 0 and height > 0:
+            nx = round(math.sqrt(cells * width / height))
+        else:
+            nx = round(cells) if width > 0 else 1
+        nx = min(max(nx, 1), MAX_CELLS_PER_AXIS)
+        ny = min(max(round(cells / nx), 1), MAX_CELLS_PER_AXIS) if height > 0 else 1
+        self.shape = (nx, ny)
+        self.cell_size = (width / nx or 1.0, height / ny or 1.0)
+
+        cell_ids = self.cell_ids(RR, XX)
+        order = np.argsort(cell_ids, kind='stable')
+        self.RR = RR[order]
+        self.XX = XX[order]
+        self.HD = HD[order]
+        self.network_RR = network_RR[order]
+        self.network_XX = network_XX[order]
+        self.cell_start = np.searchsorted(cell_ids[order], np.arange(nx * ny + 1))
+
+    def __len__(self):
+        return len(self.RR)
+
+    def cell_of(self, R, X):
+        """Grid cell (column, row) of a point; points outside the grid map to the nearest border cell."""
+        nx, ny = self.shape
+        i = min(max(int((R - self.origin[0]) // self.cell_size[0]), 0), nx - 1)
+        j = min(max(int((X - self.origin[1]) // self.cell_size[1]), 0), ny - 1)
+        return i, j
+
+    def cell_ids(self, RR, XX):
+        nx, ny = self.shape
+        i = np.clip(((RR - self.origin[0]) // self.cell_size[0]).astype(int), 0, nx - 1)
+        j = np.clip(((XX - self.origin[1]) // self.cell_size[1]).astype(int), 0, ny - 1)
+        return j * nx + i
+
+    def row_slice(self, j, i0, i1):
+        """Point positions in cells i0..i1 (inclusive) of grid row j."""
+        nx = self.shape[0]
+        return self.cell_start[j * nx + i0], self.cell_start[j * nx + i1 + 1]
+
+    def point(self, position, **extra):
+        """Result dict of the point at 'position' of the sorted arrays."""
+        found = {
+            'R': float(self.RR[position]),
+            'X': float(self.XX[position]),
+            'HD': float(self.HD[position]),
+            'network_R': optional_float(self.network_RR[position]),
+            'network_X': optional_float(self.network_XX[position]),
+        }
+        found.update(extra)
+        return found
+
+    def nearest(self, R, X, k=1):
+        """
+        The k points closest to (R, X) in the R/X plane.
+
+        Returns:
+            List of point dicts (R, X, HD, network_R, network_X, distance),
+            closest first
+        """
+        if not len(self):
+            return []
+        k = min(k, len(self))
+        nx, ny = self.shape
+        ci, cj = self.cell_of(R, X)
+        positions, distances = [], []
+        ring = 0
+        while True:
+            # Cells at Chebyshev distance 'ring' from the query cell
+            i0, i1 = max(ci - ring, 0), min(ci + ring, nx - 1)
+            j0, j1 = max(cj - ring, 0), min(cj + ring, ny - 1)
+            slices = []
+            for j in (cj - ring, cj + ring) if ring else (cj,):
+                if 0 <= j < ny:
+                    slices.append(self.row_slice(j, i0, i1))
+            for i in (ci - ring, ci + ring) if ring else ():
+                if 0 <= i < nx:
+                    slices.extend(self.row_slice(j, i, i) for j in range(max(cj - ring + 1, 0),
+                                                                        min(cj + ring, ny)))
+            for start, end in slices:
+                if end > start:
+                    positions.append(np.arange(start, end))
+                    distances.append(np.hypot(self.RR[start:end] - R, self.XX[start:end] - X))
+
+            # Points outside the searched block are at least this far away
+            left = R - (self.origin[0] + i0 * self.cell_size[0]) if i0 > 0 else math.inf
+            right = self.origin[0] + (i1 + 1) * self.cell_size[0] - R if i1 < nx - 1 else math.inf
+            below = X - (self.origin[1] + j0 * self.cell_size[1]) if j0 > 0 else math.inf
+            above = self.origin[1] + (j1 + 1) * self.cell_size[1] - X if j1 < ny - 1 else math.inf
+            bound = min(left, right, below, above)
+
+            found = sum(len(p) for p in positions)
+            if found >= k:
+                all_distances = np.concatenate(distances)
+                kth = np.partition(all_distances, k - 1)[k - 1]
+                if kth <= bound:
+                    break
+            if bound == math.inf:
+                break
+            ring += 1
+
+        all_positions = np.concatenate(positions)
+        all_distances = np.concatenate(distances)
+        best = np.argsort(all_distances, kind='stable')[:k]
+        return [self.point(all_positions[b], distance=float(all_distances[b])) for b in best]
+
+    def top_in_rect(self, R_min, R_max, X_min, X_max, k=10):
+        """
+        The k points with the highest HD inside R_min <= R <= R_max and
+        X_min <= X <= X_max.
+
+        Returns:
+            List of point dicts (R, X, HD, network_R, network_X), highest HD first
+        """
+        if not len(self) or R_min > R_max or X_min > X_max:
+            return []
+        i0, j0 = self.cell_of(R_min, X_min)
+        i1, j1 = self.cell_of(R_max, X_max)
+        slices = [self.row_slice(j, i0, i1) for j in range(j0, j1 + 1)]
+        positions = np.concatenate([np.arange(start, end) for start, end in slices])
+        inside = positions[(self.RR[positions] >= R_min) & (self.RR[positions] <= R_max)
+                           & (self.XX[positions] >= X_min) & (self.XX[positions] <= X_max)]
+        if len(inside) > k:
+            inside = inside[np.argpartition(-self.HD[inside], k - 1)[:k]]
+        inside = inside[np.argsort(-self.HD[inside], kind='stable')]
+        return [self.point(position) for position in inside]
+
+    def save(self, file):
+        """Write the index as a .npz archive (path or binary file object)."""
+        np.savez(
+            file, RR=self.RR, XX=self.XX, HD=self.HD,
+            network_RR=self.network_RR, network_XX=self.network_XX, cell_start=self.cell_start,
+            origin=np.array(self.origin), cell_size=np.array(self.cell_size), shape=np.array(self.shape),
+            harmonic_order=np.array(-1 if self.harmonic_order is None else self.harmonic_order)
+        )
+
+    @classmethod
+    def load(cls, file):
+        """Read an index written by save()."""
+        index = cls.__new__(cls)
+        with np.load(file) as data:
+            for key in ('RR', 'XX', 'HD', 'network_RR', 'network_XX', 'cell_start'):
+                setattr(index, key, data[key])
+            index.origin = tuple(float(v) for v in data['origin'])
+            index.cell_size = tuple(float(v) for v in data['cell_size'])
+            index.shape = tuple(int(v) for v in data['shape'])
+            order = int(data['harmonic_order'])
+        index.harmonic_order = None if order < 0 else order
+        return index
+
+
+# BUILDING
+
+def write_point_indexes(source, sheet_names, output_folder):
+    """
+    Build and save the index of every harmonic order sheet as
+    Point_Index/Harmonic_Order_<N>.npz.
+
+    Args:
+        source: Results workbook, or a list of scenario workbooks (the
+            envelope is indexed, without the per-point network R/X)
+        sheet_names: 'Harmonic Order N' sheets to index
+        output_folder: Folder path or OutputSink
+
+    Returns:
+        List of the saved index locations
+    """
+    sink = as_sink(output_folder)
+    locations = []
+    for sheet in sheet_names:
+        if isinstance(source, (list, tuple)):
+            arrays = load_envelope_arrays(source, sheet)
+            index = PointIndex(arrays['RR'], arrays['XX'], arrays['HD'],
+                               harmonic_order=arrays['harmonic_order'])
+        else:
+            index = PointIndex(**read_point_arrays(source, sheet))
+        buffer = io.BytesIO()
+        index.save(buffer)
+        locations.append(sink.write_bytes(index_name(index.harmonic_order), buffer.getvalue()))
+    return locations
+
+
+# COMMAND LINE
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or query the per-order R/X point indexes.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='Index every harmonic order sheet of a results workbook')
+    build.add_argument('--harmonics', required=True, nargs='+',
+                       help='Results workbook (several: index their envelope)')
+    build.add_argument('--output', required=True, help='Folder (or .zip) the Point_Index folder is written to')
+
+    nearest = commands.add_parser('nearest', help='Points closest to an R/X location')
+    nearest.add_argument('index', help='Harmonic_Order_<N>.npz')
+    nearest.add_argument('R', type=float)
+    nearest.add_argument('X', type=float)
+    nearest.add_argument('-k', type=int, default=1, help='Number of points')
+
+    rect = commands.add_parser('rect', help='Highest-HD points inside an R/X rectangle')
+    rect.add_argument('index', help='Harmonic_Order_<N>.npz')
+    rect.add_argument('R_min', type=float)
+    rect.add_argument('R_max', type=float)
+    rect.add_argument('X_min', type=float)
+    rect.add_argument('X_max', type=float)
+    rect.add_argument('-k', type=int, default=10, help='Number of points')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        sheets = [sheet for sheet in list_sheet_names(args.harmonics[0]) if sheet.startswith('Harmonic Order')]
+        source = args.harmonics if len(args.harmonics) > 1 else args.harmonics[0]
+        sink, owned = open_sink(args.output)
+        start = time.time()
+        locations = write_point_indexes(source, sheets, sink)
+        if owned:
+            sink.close()
+        json.dump({'indexes': locations, 'seconds': round(time.time() - start, 3)}, sys.stdout, ensure_ascii=False)
+        print()
+        return 0
+
+    index = PointIndex.load(args.index)
+    start = time.perf_counter()
+    if args.command == 'nearest':
+        points = index.nearest(args.R, args.X, args.k)
+    else:
+        points = index.top_in_rect(args.R_min, args.R_max, args.X_min, args.X_max, args.k)
+    seconds = time.perf_counter() - start
+    json.dump({'harmonic_order': index.harmonic_order, 'points': points,
+               'query_microseconds': round(seconds * 1e6, 1)}, sys.stdout, ensure_ascii=False)
+    print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
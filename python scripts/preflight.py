@@ -0,0 +1,239 @@
+import argparse
+import json
+import math
+import sys
+import time
+
+from loci_io import list_sheet_names, read_sheet_header, load_vertex_array
+from loci_core import (R_COLUMN_NAMES, X_COLUMN_NAMES, HD_COLUMN_NAMES, NETWORK_COLUMNS,
+                       HARMONIC_ORDER_COLUMN, titles_for_file, limit_column_for)
+
+# Prefix of the result sheets that plotsave reads
+ORDER_SHEET_PREFIX = 'Harmonic Order'
+
+# A locus needs at least three vertices to enclose an area
+MIN_VERTICES = 3
+
+
+# UTILITY FUNCTIONS
+
+def issue(level, check, file, sheet, message):
+    """One preflight finding; level is 'error' (the run would fail) or 'warning'."""
+    return {'level': level, 'check': check, 'file': file, 'sheet': sheet, 'message': message}
+
+
+def is_number(value):
+    """True for int/float cell values that are not NaN (bools are not numbers here)."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and not math.isnan(value)
+
+
+def trim_row(row):
+    """Row values without the trailing empty cells."""
+    values = list(row)
+    while values and values[-1] is None:
+        values.pop()
+    return values
+
+
+def sheet_names_or_issue(file, issues):
+    """Sheet names of 'file', or None after recording why it cannot be opened."""
+    try:
+        return list_sheet_names(file)
+    except FileNotFoundError:
+        issues.append(issue('error', 'missing_file', file, None, f"File not found: {file}"))
+    except Exception as e:
+        issues.append(issue('error', 'unreadable_workbook', file, None,
+                            f"Could not open workbook ({type(e).__name__}: {e})"))
+    return None
+
+
+def read_sheet_or_issue(read, file, sheet, issues, **kwargs):
+    """read(file, sheet, **kwargs), or None after recording why the sheet cannot be read."""
+    try:
+        return read(file, sheet, **kwargs)
+    except Exception as e:
+        issues.append(issue('error', 'unreadable_sheet', file, sheet,
+                            f"Could not read sheet ({type(e).__name__}: {e})"))
+    return None
+
+
+# CHECKS
+
+def check_loci_sheet(loci_file, sheet_name, sheet_names, issues):
+    """
+    Check the vertex matrix read by PF_format_w_vertices.py and
+    Make Loci_Inputs_Clockwise.py: a first row of range bounds followed by
+    R/X column pairs.
+    """
+    if sheet_name not in sheet_names:
+        issues.append(issue('error', 'missing_sheet', loci_file, sheet_name,
+                            f"Sheet '{sheet_name}' not found (available: {sheet_names})"))
+        return
+    result = read_sheet_or_issue(read_sheet_header, loci_file, sheet_name, issues, header_rows=1)
+    if result is None:
+        return
+    header, dimension = result
+    ranges = trim_row(header[0]) if header else []
+    if not ranges:
+        issues.append(issue('error', 'missing_ranges', loci_file, sheet_name,
+                            "First row must hold the harmonic order range of every locus"))
+        return
+    if len(ranges) % 2:
+        issues.append(issue('error', 'odd_loci_columns', loci_file, sheet_name,
+                            f"{len(ranges)} range bounds in row 1; every locus needs an R and an X column"))
+    bad = [i + 1 for i, value in enumerate(ranges) if not is_number(value)]
+    if bad:
+        issues.append(issue('error', 'ranges_not_numeric', loci_file, sheet_name,
+                            f"Range bounds in row 1 are not numbers in columns {bad}"))
+    else:
+        for i in range(0, len(ranges) - 1, 2):
+            if ranges[i] >= ranges[i + 1]:
+                issues.append(issue('warning', 'range_order', loci_file, sheet_name,
+                                    f"Range {ranges[i]} - {ranges[i + 1]} does not increase"))
+    if dimension and dimension[0] - 1 < MIN_VERTICES:
+        issues.append(issue('error', 'too_few_vertices', loci_file, sheet_name,
+                            f"Only {dimension[0] - 1} vertex rows below the ranges (need {MIN_VERTICES})"))
+
+
+def check_order_sheets(harmonics_file, sheet_names, issues):
+    """
+    Check the 'Harmonic Order N' sheets read by plotsave.
+
+    Returns:
+        List of the harmonic orders found
+    """
+    order_sheets = [sheet for sheet in sheet_names if sheet.startswith(ORDER_SHEET_PREFIX)]
+    if not order_sheets:
+        issues.append(issue('error', 'no_order_sheets', harmonics_file, None,
+                            f"No sheets named '{ORDER_SHEET_PREFIX} N' (available: {sheet_names})"))
+        return []
+
+    orders = []
+    for sheet in order_sheets:
+        try:
+            orders.append(int(sheet.split()[-1]))
+        except ValueError:
+            issues.append(issue('error', 'bad_order_sheet_name', harmonics_file, sheet,
+                                "Sheet name must end with the harmonic order number"))
+            continue
+
+        result = read_sheet_or_issue(read_sheet_header, harmonics_file, sheet, issues, header_rows=1)
+        if result is None:
+            continue
+        header, dimension = result
+        columns = trim_row(header[0]) if header else []
+        for names in (R_COLUMN_NAMES, X_COLUMN_NAMES, HD_COLUMN_NAMES):
+            if not any(name in columns for name in names):
+                issues.append(issue('error', 'missing_column', harmonics_file, sheet,
+                                    f"Could not find any column with names: {names} (found: {columns})"))
+        missing_network = [name for name in NETWORK_COLUMNS if name not in columns]
+        if missing_network:
+            issues.append(issue('warning', 'missing_network_columns', harmonics_file, sheet,
+                                f"No {missing_network}; the worst-case point is reported instead"))
+        # The row after the header is skipped when the data is read
+        if dimension and dimension[0] < 3:
+            issues.append(issue('error', 'no_data', harmonics_file, sheet,
+                                f"Only {dimension[0]} rows used; no result rows below the header"))
+    return orders
+
+
+def check_limits_sheet(loci_file, limits_sheet_name, sheet_names, limit_columns, orders, issues):
+    """Check the harmonic limits table used to evaluate every order."""
+    if limits_sheet_name not in sheet_names:
+        issues.append(issue('error', 'missing_sheet', loci_file, limits_sheet_name,
+                            f"Sheet '{limits_sheet_name}' not found (available: {sheet_names})"))
+        return
+    # The limits table is small, so its values are read as well
+    result = read_sheet_or_issue(load_vertex_array, loci_file, limits_sheet_name, issues, header_rows=1)
+    if result is None:
+        return
+    header, values = result
+    columns = trim_row(header[0]) if header else []
+
+    missing = [name for name in [HARMONIC_ORDER_COLUMN] + list(limit_columns) if name not in columns]
+    for name in missing:
+        issues.append(issue('error', 'missing_column', loci_file, limits_sheet_name,
+                            f"Column '{name}' not found (found: {columns})"))
+    if missing:
+        return
+
+    order_col = values[:, columns.index(HARMONIC_ORDER_COLUMN)]
+    for order in orders:
+        rows = (order_col == order).nonzero()[0]
+        if not len(rows):
+            issues.append(issue('warning', 'missing_limit', loci_file, limits_sheet_name,
+                                f"No limits for Harmonic Order {order}; a limit of 1.0 is used"))
+            continue
+        for name in limit_columns:
+            # Like load_order_data, the first row of an order is used
+            limit = values[rows[0], columns.index(name)]
+            if not limit > 0:
+                issues.append(issue('error', 'invalid_limit', loci_file, limits_sheet_name,
+                                    f"Invalid limit ({limit}) for Harmonic Order {order} in '{name}'"))
+
+
+def run_preflight(loci_file, harmonics_file=None, sheet_name='Impedance Loci Vertices',
+                  limits_sheet_name='Harmonic Limits', limit_columns=None):
+    """
+    Check the input workbooks against everything the three scripts expect,
+    reading only sheet names, header rows and used ranges (plus the small
+    limits table).
+
+    Args:
+        loci_file: Loci inputs workbook (vertices and harmonic limits)
+        harmonics_file: Harmonic results workbook ('Harmonic Order N' sheets);
+            None checks the loci workbook only
+        sheet_name: Sheet holding the loci vertex matrix
+        limits_sheet_name: Sheet holding the harmonic limits
+        limit_columns: Limit columns the orders are checked against
+            (default: the column for the analysis type of harmonics_file)
+
+    Returns:
+        List of issue dicts with level, check, file, sheet and message
+    """
+    issues = []
+    loci_sheets = sheet_names_or_issue(loci_file, issues)
+    if loci_sheets is not None:
+        check_loci_sheet(loci_file, sheet_name, loci_sheets, issues)
+
+    if harmonics_file is None:
+        return issues
+    harmonic_sheets = sheet_names_or_issue(harmonics_file, issues)
+    orders = check_order_sheets(harmonics_file, harmonic_sheets, issues) if harmonic_sheets is not None else []
+
+    if loci_sheets is not None:
+        if limit_columns is None:
+            main_title, _ = titles_for_file(harmonics_file)
+            limit_columns = [limit_column_for(main_title)]
+        check_limits_sheet(loci_file, limits_sheet_name, loci_sheets, limit_columns, orders, issues)
+    return issues
+
+
+# COMMAND LINE
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the input workbooks before a run.')
+    parser.add_argument('--loci', required=True, help='Loci inputs workbook')
+    parser.add_argument('--harmonics', help='Harmonic results workbook')
+    parser.add_argument('--sheet-name', default='Impedance Loci Vertices')
+    parser.add_argument('--limits-sheet-name', default='Harmonic Limits')
+    parser.add_argument('--limit-column', action='append', dest='limit_columns',
+                        help='Limit column to check (repeatable)')
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    issues = run_preflight(args.loci, args.harmonics, args.sheet_name,
+                           args.limits_sheet_name, args.limit_columns)
+    errors = [i for i in issues if i['level'] == 'error']
+    json.dump({
+        'ok': not errors,
+        'errors': errors,
+        'warnings': [i for i in issues if i['level'] == 'warning'],
+        'seconds': round(time.time() - start, 3),
+    }, sys.stdout, ensure_ascii=False)
+    print()
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Bump when the layout of cached result sets changes
+CACHE_FORMAT_VERSION = '1'
+
+# Where cached result sets live and how much space they may use
+CACHE_ROOT = os.environ.get('RESULT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'result_cache'))
+DEFAULT_MAX_BYTES = int(float(os.environ.get('RESULT_CACHE_MAX_MB', '512')) * 1024 * 1024)
+
+META_FILE = 'meta.json'
+FILES_DIR = 'files'
+
+
+# UTILITY FUNCTIONS
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def directory_size(path):
+    """Total size in bytes of all files below 'path'."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def list_files(path):
+    """Relative paths (with '/' separators) of all files below 'path'."""
+    found = []
+    for root, _, files in os.walk(path):
+        for name in files:
+            rel = os.path.relpath(os.path.join(root, name), path)
+            found.append(rel.replace(os.sep, '/'))
+    return sorted(found)
+
+
+def compute_cache_key(input_files, options, script_files=()):
+    """
+    Compute the content-addressed key of a run.
+
+    Args:
+        input_files: Paths of the uploaded input workbooks (order matters)
+        options: Dict of run options (e.g. sheetName, limitsSheetName,
+            lociUnit, reorderVertices, generatePlots)
+        script_files: Paths of the scripts used for the run; their contents
+            act as the script version
+
+    Returns:
+        Hex string that changes whenever an input, option or script changes
+    """
+    h = hashlib.sha256()
+    h.update(f'result-cache-v{CACHE_FORMAT_VERSION}\n'.encode())
+    for path in input_files:
+        h.update(f'input:{file_digest(path)}\n'.encode())
+    h.update(('options:' + json.dumps(options, sort_keys=True, ensure_ascii=False) + '\n').encode())
+    for path in script_files:
+        h.update(f'script:{os.path.basename(path)}:{file_digest(path)}\n'.encode())
+    return h.hexdigest()
+
+
+# CACHE
+
+class ResultCache:
+    """
+    Bounded on-disk cache of finished result sets, keyed by compute_cache_key.
+
+    Each entry is a folder '<root>/<key>' holding the result files and a
+    meta.json marker. Entries are published with an atomic rename, so a
+    half-written result set is never returned. When the total size exceeds
+    max_bytes the least recently used entries are removed.
+    """
+
+    def __init__(self, root=CACHE_ROOT, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def entry_path(self, key):
+        if not key or not all(c in '0123456789abcdef' for c in key):
+            raise ValueError(f"Invalid cache key: {key!r}")
+        return os.path.join(self.root, key)
+
+    def get(self, key, dest_dir):
+        """
+        Copy the cached result set for 'key' into dest_dir.
+
+        Returns:
+            List of copied files (relative paths), or None on a cache miss
+        """
+        entry = self.entry_path(key)
+        meta_path = os.path.join(entry, META_FILE)
+        if not os.path.isfile(meta_path):
+            return None
+        try:
+            shutil.copytree(os.path.join(entry, FILES_DIR), dest_dir, dirs_exist_ok=True)
+        except (OSError, shutil.Error):
+            # Entry evicted or damaged while reading: treat as a miss
+            return None
+        # Mark as recently used
+        os.utime(meta_path, None)
+        return list_files(os.path.join(entry, FILES_DIR))
+
+    def put(self, key, src_dir):
+        """
+        Store the finished result set in src_dir under 'key' and evict old
+        entries if the cache grew beyond its size limit.
+        """
+        entry = self.entry_path(key)
+        os.makedirs(self.root, exist_ok=True)
+        if os.path.isfile(os.path.join(entry, META_FILE)):
+            os.utime(os.path.join(entry, META_FILE), None)
+            return
+
+        staging = tempfile.mkdtemp(prefix=f'.{key[:12]}_', dir=self.root)
+        try:
+            shutil.copytree(src_dir, os.path.join(staging, FILES_DIR))
+            size = directory_size(os.path.join(staging, FILES_DIR))
+            with open(os.path.join(staging, META_FILE), 'w') as f:
+                json.dump({'key': key, 'size': size, 'created': time.time()}, f)
+            os.replace(staging, entry)
+        except OSError:
+            # Another run published the same key first, or the disk is full
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isfile(os.path.join(entry, META_FILE)):
+                raise
+        self.evict()
+
+    def entries(self):
+        """Return (last_used, size, path) for every complete entry."""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for name in os.listdir(self.root):
+            meta_path = os.path.join(self.root, name, META_FILE)
+            try:
+                with open(meta_path) as f:
+                    size = json.load(f)['size']
+                found.append((os.path.getmtime(meta_path), size, os.path.join(self.root, name)))
+            except (OSError, ValueError, KeyError):
+                continue
+        return found
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_bytes."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+# COMMAND LINE
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Content-addressed cache of workflow result sets.')
+    parser.add_argument('--root', default=CACHE_ROOT, help='Cache folder')
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help='Size limit of the cache in MB')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    key_parser = sub.add_parser('key', help='Print the cache key of a run')
+    key_parser.add_argument('--inputs', nargs='+', required=True)
+    key_parser.add_argument('--options', default='{}', help='Run options as JSON')
+    key_parser.add_argument('--scripts', nargs='*', default=[])
+
+    get_parser = sub.add_parser('get', help='Copy a cached result set into a folder')
+    get_parser.add_argument('key')
+    get_parser.add_argument('dest')
+
+    put_parser = sub.add_parser('put', help='Store a finished result set')
+    put_parser.add_argument('key')
+    put_parser.add_argument('src')
+
+    args = parser.parse_args(argv)
+    cache = ResultCache(args.root, int(args.max_mb * 1024 * 1024))
+
+    if args.command == 'key':
+        print(compute_cache_key(args.inputs, json.loads(args.options), args.scripts))
+    elif args.command == 'get':
+        files = cache.get(args.key, args.dest)
+        print(json.dumps({'hit': files is not None, 'files': files or []}))
+    elif args.command == 'put':
+        cache.put(args.key, args.src)
+        print(json.dumps({'stored': args.key}))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
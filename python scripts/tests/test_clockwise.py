@@ -0,0 +1,121 @@
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+from conftest import SCRIPTS_DIR
+
+# The script name has a space in it, so it cannot be imported by name
+_spec = importlib.util.spec_from_file_location(
+    'make_loci_clockwise', os.path.join(SCRIPTS_DIR, 'Make Loci_Inputs_Clockwise.py'))
+clockwise = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(clockwise)
+
+
+def shape_columns(shapes, num_rows):
+    """Pack lists of (r, x) points into the column-pair layout of the sheet."""
+    values = np.full((num_rows, 2 * len(shapes)), np.nan)
+    for i, points in enumerate(shapes):
+        for row, (r, x) in enumerate(points):
+            values[row, 2 * i] = r
+            values[row, 2 * i + 1] = x
+    return values
+
+
+def test_matches_row_by_row_sort():
+    rng = np.random.default_rng(0)
+    shapes = [[tuple(p) for p in rng.uniform(-5, 5, size=(n, 2))] for n in (3, 7, 12)]
+    values = shape_columns(shapes, 14)
+
+    result = clockwise.reorder_shapes_clockwise(values)
+
+    expected = shape_columns([clockwise.sort_points_clockwise(list(s)) for s in shapes], 14)
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_closing_point_dropped_when_sheet_is_full():
+    square = [(0, 0), (1, 1), (1, 0), (0, 1)]
+    result = clockwise.reorder_shapes_clockwise(shape_columns([square], 4))
+
+    assert not np.isnan(result).any()
+    assert sorted(map(tuple, result)) == sorted(square)
+
+
+def test_empty_shape_and_odd_column_kept():
+    values = shape_columns([[(1, 1), (2, 3), (3, 1)], []], 5)
+    values = np.hstack([values, np.arange(5.0)[:, None]])
+
+    result = clockwise.reorder_shapes_clockwise(values)
+
+    assert np.isnan(result[:, 2:4]).all()
+    np.testing.assert_array_equal(result[:, 4], np.arange(5.0))
+    np.testing.assert_array_equal(result[3, :2], result[0, :2])
+
+
+def test_partial_rows_are_counted_and_skipped():
+    values = shape_columns([[(1, 1), (2, 3), (3, 1)]], 5)
+    values[3, 0] = 9.0
+
+    assert clockwise.partial_vertex_rows(values).tolist() == [1]
+    result = clockwise.reorder_shapes_clockwise(values)
+    assert 9.0 not in result
+    np.testing.assert_array_equal(result[3], result[0])
+
+
+@pytest.mark.parametrize('num_rows', [0, 1])
+def test_degenerate_sheets(num_rows):
+    values = np.full((num_rows, 4), np.nan)
+    assert clockwise.reorder_shapes_clockwise(values).shape == (num_rows, 4)
+
+
+def write_vertex_sheet(path, rows):
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Impedance Loci Vertices'
+    ws.append(['R1', 'X1', 'R2', 'X2'])
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+def read_vertex_sheet(path):
+    from openpyxl import load_workbook
+    ws = load_workbook(path)['Impedance Loci Vertices']
+    return [list(row) for row in ws.iter_rows(min_row=2, values_only=True)]
+
+
+def test_in_place_rewrites_changed_cells(tmp_path):
+    path = str(tmp_path / 'loci.xlsx')
+    write_vertex_sheet(path, [[0, 0, 1, 1], [1, 1, 2, 3], [1, 0, 3, 1], [0, 1, None, None]])
+
+    updated = clockwise.reorder_sheet_in_place(path, 'Impedance Loci Vertices', 2)
+
+    values = np.array(read_vertex_sheet(path), dtype=float)
+    assert updated > 0
+    expected = clockwise.reorder_shapes_clockwise(
+        shape_columns([[(0, 0), (1, 1), (1, 0), (0, 1)], [(1, 1), (2, 3), (3, 1)]], 4))
+    np.testing.assert_array_equal(values, expected)
+
+
+def test_in_place_refuses_formula_cells(tmp_path):
+    path = str(tmp_path / 'loci.xlsx')
+    rows = [[0, 0, 1, 1], [4, '=10+2.598', 2, 3], [1, 0, 3, 1]]
+    write_vertex_sheet(path, rows)
+    before = open(path, 'rb').read()
+
+    with pytest.raises(ValueError, match='B3'):
+        clockwise.reorder_sheet_in_place(path, 'Impedance Loci Vertices', 2)
+
+    assert open(path, 'rb').read() == before
+
+
+def test_in_place_reports_odd_column(tmp_path, capsys):
+    path = str(tmp_path / 'loci.xlsx')
+    write_vertex_sheet(path, [[0, 0, 1, 1, 7], [1, 1, 2, 3], [1, 0, 3, 1]])
+
+    clockwise.reorder_sheet_in_place(path, 'Impedance Loci Vertices', 2)
+
+    assert 'column E' in capsys.readouterr().out
+    assert read_vertex_sheet(path)[0][4] == 7
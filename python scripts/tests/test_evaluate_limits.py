@@ -0,0 +1,64 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from loci_core import HARMONIC_ORDER_COLUMN, evaluate_limits, order_limit, with_limit
+
+INCREMENTAL = 'Incremental Distortion Limit (%V1) at PCC'
+TOTAL = 'Total Limit (%V1) at PCC'
+
+
+def limits_table(rows):
+    return pd.DataFrame(rows, columns=[HARMONIC_ORDER_COLUMN, INCREMENTAL, TOTAL])
+
+
+def order(harmonic_order, worst_case_hd):
+    return {'harmonic_order': harmonic_order, 'worst_case_hd': worst_case_hd}
+
+
+def test_ratio_and_pass_fail_matrix():
+    loci_inputs = limits_table([[2, 1.0, 2.0], [3, 0.5, 4.0], [5, 2.0, 1.0]])
+    infos = [order(2, 1.5), order(3, 0.5), order(5, 1.0)]
+
+    matrix = evaluate_limits(infos, loci_inputs, [INCREMENTAL, TOTAL])
+
+    assert matrix['harmonic_orders'] == [2, 3, 5]
+    assert matrix['limit_columns'] == [INCREMENTAL, TOTAL]
+    np.testing.assert_allclose(matrix['ratio'], [[1.5, 0.75], [1.0, 0.125], [0.5, 1.0]])
+    # A ratio of exactly 1 passes, like with_limit
+    np.testing.assert_array_equal(matrix['passed'], [[False, True], [True, True], [True, True]])
+
+
+def test_matches_single_limit_evaluation():
+    loci_inputs = limits_table([[2, 1.0, 2.0], [3, 0.5, 4.0], [3, 9.0, 9.0]])
+    infos = [order(2, 1.5), order(3, 0.6), order(7, 1.2)]
+
+    matrix = evaluate_limits(infos, loci_inputs, [TOTAL, INCREMENTAL])
+
+    for row, info in enumerate(infos):
+        for col, main_title in enumerate(['VhTotal', 'Vh inc']):
+            limit = order_limit(loci_inputs, info['harmonic_order'], main_title)
+            expected = with_limit(info, limit)
+            assert matrix['limits'][row, col] == expected['limit']
+            assert matrix['passed'][row, col] == (not expected['non_compliant'])
+
+
+def test_orders_without_a_row_get_limit_one():
+    matrix = evaluate_limits([order(11, 0.9), order(13, 1.1)], limits_table([[2, 1.0, 2.0]]), [TOTAL])
+
+    np.testing.assert_array_equal(matrix['limits'], [[1.0], [1.0]])
+    np.testing.assert_array_equal(matrix['passed'], [[True], [False]])
+
+
+def test_invalid_limit_names_order_and_column():
+    loci_inputs = limits_table([[2, 1.0, 2.0], [3, 0.0, 4.0]])
+
+    with pytest.raises(ValueError, match=re.escape(f"Harmonic Order 3 in '{INCREMENTAL}'")):
+        evaluate_limits([order(2, 1.0), order(3, 1.0)], loci_inputs, [TOTAL, INCREMENTAL])
+
+
+def test_missing_limit_column():
+    with pytest.raises(ValueError, match='Could not find limit columns'):
+        evaluate_limits([order(2, 1.0)], limits_table([[2, 1.0, 2.0]]), ['Planning Limit'])
@@ -0,0 +1,55 @@
+import io
+
+import numpy as np
+
+from hd_surrogate import HDSurrogate
+
+
+def plane_surrogate(limit=None):
+    # HD linear in R and X, so the piecewise-linear model is exact inside the grid
+    R, X = np.meshgrid(np.arange(5.0), np.arange(5.0))
+    R, X = R.ravel(), X.ravel()
+    return HDSurrogate(R, X, 1 + R + 2 * X, harmonic_order=5, limit=limit)
+
+
+def test_evaluate_matches_the_samples_and_interpolates_between_them():
+    surrogate = plane_surrogate()
+
+    result = surrogate.evaluate([0.0, 2.0, 1.5, 3.25], [0.0, 3.0, 2.5, 0.5])
+
+    np.testing.assert_allclose(result['HD'], [1.0, 9.0, 7.5, 5.25])
+    assert result['inside'].all()
+
+
+def test_evaluate_flags_queries_outside_the_loci():
+    result = plane_surrogate().evaluate([1.0, 10.0, -1.0], [1.0, 10.0, 2.0])
+
+    assert result['inside'].tolist() == [True, False, False]
+    assert np.isnan(result['HD'][1:]).all()
+
+
+def test_evaluate_ratio_uses_the_limit():
+    np.testing.assert_allclose(plane_surrogate(limit=2.0).evaluate(2.0, 3.0)['ratio'], 4.5)
+    assert np.isnan(plane_surrogate().evaluate(2.0, 3.0)['ratio'])
+
+
+def test_evaluate_ignores_invalid_samples():
+    surrogate = HDSurrogate([0.0, 1.0, 0.0, 1.0, np.nan], [0.0, 0.0, 1.0, 1.0, 0.5],
+                            [1.0, 2.0, 3.0, np.nan, 9.0])
+
+    assert len(surrogate.HD) == 3
+    np.testing.assert_allclose(surrogate.evaluate(0.25, 0.25)['HD'], 1.75)
+
+
+def test_save_and_load_round_trip():
+    surrogate = plane_surrogate()
+    buffer = io.BytesIO()
+    surrogate.save(buffer)
+    buffer.seek(0)
+
+    loaded = HDSurrogate.load(buffer, limit=3.0)
+
+    assert loaded.harmonic_order == 5 and loaded.basis == 'network' and loaded.limit == 3.0
+    np.testing.assert_array_equal(loaded.triangulation.triangles, surrogate.triangulation.triangles)
+    queries = np.array([0.5, 3.7, 9.0]), np.array([1.2, 0.1, 9.0])
+    np.testing.assert_array_equal(loaded.evaluate(*queries)['HD'], surrogate.evaluate(*queries)['HD'])
@@ -0,0 +1,148 @@
+import re
+import tracemalloc
+import zipfile
+
+import numpy as np
+import pytest
+from openpyxl import Workbook
+
+import loci_core
+import loci_io
+
+
+def write_sheet(path, rows, sheet_name='Harmonic Order 2'):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet_name
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return path
+
+
+def set_dimension(path, ref):
+    """Rewrite the recorded used range of the first worksheet."""
+    with zipfile.ZipFile(path) as zf:
+        parts = {name: zf.read(name) for name in zf.namelist()}
+    sheet = 'xl/worksheets/sheet1.xml'
+    parts[sheet] = re.sub(rb'<dimension ref="[^"]*"', b'<dimension ref="' + ref.encode() + b'"', parts[sheet])
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, data in parts.items():
+            zf.writestr(name, data)
+
+
+ROWS = [['R', 'X', 'HD'], [1.0, 2.0, 0.5], [3.0, None, 'n/a'], [None, None, None], [5.0, 6.0, 7.0]]
+EXPECTED = np.array([[1.0, 2.0, 0.5], [3.0, np.nan, np.nan], [np.nan] * 3, [5.0, 6.0, 7.0]])
+
+
+def peak_allocation(func, *args):
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_openpyxl_reader(tmp_path):
+    path = write_sheet(str(tmp_path / 'results.xlsx'), ROWS)
+
+    header, values = loci_io.read_sheet_openpyxl(path, 'Harmonic Order 2', header_rows=1)
+
+    assert header == [('R', 'X', 'HD')]
+    np.testing.assert_array_equal(values, EXPECTED)
+
+
+def test_openpyxl_reader_bogus_dimension(tmp_path):
+    path = write_sheet(str(tmp_path / 'results.xlsx'), ROWS)
+    set_dimension(path, 'A1:XFD1048576')
+
+    (header, values), peak = peak_allocation(loci_io.read_sheet_openpyxl, path, 'Harmonic Order 2', 1)
+
+    assert peak < 64 << 20
+    np.testing.assert_array_equal(values[:, :3], EXPECTED)
+    assert np.isnan(values[:, 3:]).all()
+
+
+def test_openpyxl_reader_grows_past_initial_capacity(tmp_path, monkeypatch):
+    monkeypatch.setattr(loci_io, 'GROW_ROWS', 2)
+    rows = [['R', 'X']] + [[float(i), -float(i)] for i in range(9)]
+    path = write_sheet(str(tmp_path / 'results.xlsx'), rows)
+
+    _, values = loci_io.read_sheet_openpyxl(path, 'Harmonic Order 2', 1)
+
+    np.testing.assert_array_equal(values, np.array(rows[1:], dtype=float))
+
+
+@pytest.mark.parametrize('ref', ['A1:C5', 'A1:Z100', 'A1:XFD1048576'])
+def test_xml_reader_matches_openpyxl(tmp_path, ref):
+    path = write_sheet(str(tmp_path / 'results.xlsx'), ROWS)
+    set_dimension(path, ref)
+
+    (header, values), peak = peak_allocation(loci_io.read_sheet_xml, path, 'Harmonic Order 2', 1)
+    expected_header, expected = loci_io.read_sheet_openpyxl(path, 'Harmonic Order 2', 1)
+
+    assert peak < 64 << 20
+    assert header == expected_header
+    np.testing.assert_array_equal(values, expected)
+    np.testing.assert_array_equal(values[:, :3], EXPECTED)
+
+
+@pytest.mark.parametrize('ref', ['B2', 'not-a-range'])
+def test_xml_reader_ignores_wrong_dimension(tmp_path, ref):
+    path = write_sheet(str(tmp_path / 'results.xlsx'), ROWS)
+    set_dimension(path, ref)
+
+    header, values = loci_io.read_sheet_xml(path, 'Harmonic Order 2', 1)
+
+    assert header == [('R', 'X', 'HD')]
+    np.testing.assert_array_equal(values, EXPECTED)
+
+
+def test_xml_reader_grows_past_initial_capacity(tmp_path, monkeypatch):
+    monkeypatch.setattr(loci_io, 'GROW_ROWS', 2)
+    monkeypatch.setattr(loci_io, 'XML_CHUNK_BYTES', 64)
+    rows = [['R', 'X']] + [[float(i), -float(i)] for i in range(50)]
+    path = write_sheet(str(tmp_path / 'results.xlsx'), rows)
+
+    header, values = loci_io.read_sheet_xml(path, 'Harmonic Order 2', 1)
+
+    assert header == [('R', 'X')]
+    np.testing.assert_array_equal(values, np.array(rows[1:], dtype=float))
+
+
+def test_load_vertex_array_falls_back_to_openpyxl(tmp_path, monkeypatch):
+    path = write_sheet(str(tmp_path / 'results.xlsx'), ROWS)
+
+    def out_of_memory(*args):
+        raise MemoryError
+
+    monkeypatch.setattr(loci_io, 'read_sheet_xml', out_of_memory)
+    header, values = loci_io.load_vertex_array(path, 'Harmonic Order 2', header_rows=1)
+
+    assert header == [('R', 'X', 'HD')]
+    np.testing.assert_array_equal(values, EXPECTED)
+
+
+@pytest.mark.parametrize('reader', ['read_sheet_xml', 'read_sheet_openpyxl'])
+def test_readers_report_text_cells(tmp_path, reader):
+    path = write_sheet(str(tmp_path / 'results.xlsx'), ROWS + [[7.0, 'N/A', 8.0]])
+
+    header, values, text_cells = getattr(loci_io, reader)(path, 'Harmonic Order 2', 1, text_cells=True)
+
+    assert header == [('R', 'X', 'HD')]
+    np.testing.assert_array_equal(values[:4], EXPECTED)
+    assert sorted(map(tuple, text_cells.tolist())) == [(1, 2), (4, 1)]
+
+
+def test_text_in_a_result_column_is_an_error(tmp_path):
+    rows = [['R (ohm)', 'X (ohm)', 'Result HD'], ['ohm', 'ohm', '%'], [1.0, 2.0, 0.5], [3.0, 4.0, 'N/A'], [5.0, 6.0, 0.7]]
+    path = write_sheet(str(tmp_path / 'results.xlsx'), rows)
+
+    with pytest.raises(ValueError, match=r"'Result HD' has 1 non-numeric cell\(s\) \(Excel rows 4\)"):
+        loci_core.load_order_arrays(path, 'Harmonic Order 2')
+
+    # Text in the units row is expected
+    rows[3][2] = 0.9
+    write_sheet(path, rows)
+    np.testing.assert_array_equal(loci_core.load_order_arrays(path, 'Harmonic Order 2')['HD'], [0.5, 0.9, 0.7])
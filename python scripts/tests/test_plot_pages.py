@@ -0,0 +1,105 @@
+import zipfile
+
+import numpy as np
+
+import matplotlib
+matplotlib.use('Agg')
+
+import pytest
+
+import Plot_subscript
+
+
+@pytest.mark.parametrize('dpi', [72, 100, 150])
+def test_strips_span_the_composed_page(dpi):
+    title = Plot_subscript.render_title_strip('Title\nHarmonic Orders: [2, 3]', dpi)
+    colorbar = Plot_subscript.render_colorbar_strip('HD/Limit', dpi)
+    tile_w, tile_h, _, width = Plot_subscript.page_pixel_size(dpi)
+    tiles = [Plot_subscript.Image.new('RGB', (tile_w, tile_h), 'red')] * 15
+
+    page = Plot_subscript.compose_page(tiles, title, colorbar, dpi=dpi)
+
+    assert title.width == colorbar.width == page.width == width
+
+
+def test_failed_plotsave_still_closes_its_archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(Plot_subscript, 'load_loci_inputs', lambda *args: None)
+    monkeypatch.setattr(Plot_subscript, 'determine_dynamic_titles', lambda *args: ('VhTotal', 'label'))
+    monkeypatch.setattr(Plot_subscript, 'order_sheet_names', lambda *args: ['Harmonic Order 2'])
+    monkeypatch.setattr(Plot_subscript, 'iter_order_pages', lambda *args: iter(()))
+
+    def render_then_fail(pages, main_title, colorbar_label, output_folder, *args):
+        with output_folder.open('VhTotal_Page_1.png') as f:
+            f.write(b'page 1')
+        raise RuntimeError('page 2 failed')
+
+    monkeypatch.setattr(Plot_subscript, 'render_order_pages', render_then_fail)
+    archive = tmp_path / 'plots.zip'
+
+    Plot_subscript.plotsave('results.xlsx', 'inputs.xlsx', 'inputs.xlsx', [], str(archive))
+
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.read('VhTotal_Page_1.png') == b'page 1'
+
+
+def test_point_index_is_optional():
+    import subprocess
+    import sys
+
+    # Plot_subscript must import without point_index.py next to it
+    code = ("import sys; sys.modules['point_index'] = None; "
+            "import Plot_subscript; print(Plot_subscript.plotsave.__name__)")
+    result = subprocess.run([sys.executable, '-c', code], cwd=Plot_subscript.os.path.dirname(Plot_subscript.__file__),
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def budget_with_remaining(seconds, monkeypatch):
+    budget = Plot_subscript.RenderBudget(100.0)
+    monkeypatch.setattr(budget, 'remaining', lambda: seconds)
+    return budget
+
+
+def summary_job(points=0):
+    return {'kind': 'summary_page', 'orders': [2], 'points': points}
+
+
+def test_choose_level_degrades_the_page_before_skipping_later_pages(monkeypatch):
+    job, later = summary_job(points=400000), summary_job()
+    full = Plot_subscript.RENDER_LEVELS[0]
+    budget = budget_with_remaining(10.0, monkeypatch)
+    later_cost = budget.estimate(later, Plot_subscript.RENDER_LEVELS[-1])
+    # Room for this page at full quality, but then not for the later page
+    assert budget.estimate(job, full) + later_cost > 10.0
+
+    level = budget.choose_level(job, [later])
+
+    assert level is not None and level != full
+    assert budget.estimate(job, level) + later_cost <= 10.0
+
+
+def test_choose_level_keeps_full_quality_when_everything_fits(monkeypatch):
+    budget = budget_with_remaining(100.0, monkeypatch)
+    assert budget.choose_level(summary_job(1000), [summary_job(1000)] * 3) == Plot_subscript.RENDER_LEVELS[0]
+
+
+def test_choose_level_skips_a_page_that_cannot_fit(monkeypatch):
+    budget = budget_with_remaining(0.1, monkeypatch)
+    assert budget.choose_level(summary_job(), []) is None
+
+
+def test_non_compliant_composed_page_has_a_red_border(tmp_path):
+    title = Plot_subscript.render_title_strip('Title')
+    colorbar = Plot_subscript.render_colorbar_strip('HD/Limit')
+    tile_w, tile_h, _, _ = Plot_subscript.page_pixel_size()
+    tiles = [Plot_subscript.Image.new('RGB', (tile_w, tile_h), 'white')] * 2
+
+    location = Plot_subscript.compose_non_compliant_page(tiles, [3, 2], 1, 1, 'VhTotal', colorbar, str(tmp_path))
+
+    with Plot_subscript.Image.open(location) as page:
+        pixels = np.asarray(page.convert('RGB'))
+    red = np.array([255, 0, 0])
+    for edge in (pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]):
+        assert (edge == red).all()
+    # One pixel wide: the tiles inside stay untouched
+    assert (pixels[title.height:title.height + tile_h, 1:tile_w] == 255).all()
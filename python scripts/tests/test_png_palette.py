@@ -0,0 +1,89 @@
+import io
+import zipfile
+
+import matplotlib
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import numpy as np
+from PIL import Image
+
+import output_sink
+from output_sink import MemorySink, PalettePngSink, quantize_png
+
+
+def plot_png():
+    """A small scatter plot saved like the pages (RGBA, opaque, with dpi)."""
+    rng = np.random.default_rng(0)
+    fig, ax = plt.subplots(figsize=(3, 2), dpi=100)
+    ax.scatter(rng.uniform(size=200), rng.uniform(size=200), c=rng.uniform(size=200), cmap='RdYlGn_r', s=8)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=100)
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def png_bytes(image, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', **options)
+    return buffer.getvalue()
+
+
+def test_plot_becomes_a_smaller_palette_png():
+    data = plot_png()
+
+    optimized = quantize_png(data)
+
+    assert len(optimized) < len(data)
+    with Image.open(io.BytesIO(optimized)) as image:
+        assert image.mode == 'P'
+        assert round(image.info['dpi'][0]) == 100
+
+
+def test_original_is_kept_when_quantizing_does_not_help():
+    data = png_bytes(Image.new('P', (1, 1)), optimize=True)
+    assert quantize_png(data) is data
+
+
+def test_real_alpha_uses_the_octree_method(monkeypatch):
+    image = Image.new('RGBA', (40, 40), (255, 255, 255, 0))
+    image.paste((200, 30, 30, 255), (10, 10, 30, 30))
+    methods = []
+    quantize = Image.Image.quantize
+
+    def spy(self, *args, **kwargs):
+        methods.append(kwargs.get('method'))
+        return quantize(self, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, 'quantize', spy)
+
+    optimized = quantize_png(png_bytes(image))
+
+    assert methods == [Image.Quantize.FASTOCTREE]
+    with Image.open(io.BytesIO(optimized)) as result:
+        alpha = np.asarray(result.convert('RGBA'))[..., 3]
+    assert alpha[0, 0] == 0 and alpha[20, 20] == 255
+
+
+def test_sink_quantizes_pngs_only_and_records_savings():
+    sink = PalettePngSink(MemorySink())
+    data = plot_png()
+
+    sink.write_bytes('VhTotal_Page_1.png', data)
+    sink.write_bytes('Compliance_Summary.xlsx', b'not a png')
+
+    assert sink.parent.files['Compliance_Summary.xlsx'] == b'not a png'
+    assert sink.savings == [('VhTotal_Page_1.png', len(data), len(sink.parent.files['VhTotal_Page_1.png']))]
+    assert sink.written == ['VhTotal_Page_1.png', 'Compliance_Summary.xlsx']
+
+
+def test_close_closes_the_parent_sink(tmp_path):
+    path = tmp_path / 'plots.zip'
+    sink = PalettePngSink(output_sink.ZipSink(str(path)))
+    with sink.open('VhTotal_Page_1.png') as f:
+        f.write(plot_png())
+
+    sink.close()
+
+    with zipfile.ZipFile(path) as zf:
+        assert zf.namelist() == ['VhTotal_Page_1.png']
@@ -0,0 +1,96 @@
+import io
+
+import numpy as np
+import pytest
+
+from point_index import PointIndex
+
+
+def layout(name, rng):
+    """R, X of a point layout; HD is drawn separately."""
+    if name == 'random':
+        return rng.uniform(0, 50, 400), rng.uniform(-20, 30, 400)
+    if name == 'collinear_r':
+        return rng.uniform(0, 50, 100), np.full(100, 3.0)
+    if name == 'collinear_x':
+        return np.full(100, -2.0), rng.uniform(0, 50, 100)
+    if name == 'diagonal':
+        t = rng.uniform(0, 10, 100)
+        return t, 2 * t
+    if name == 'duplicates':
+        return np.full(30, 5.0), np.full(30, 7.0)
+    if name == 'grid_with_repeats':
+        R, X = np.meshgrid(np.arange(6.0), np.arange(4.0))
+        return np.tile(R.ravel(), 3), np.tile(X.ravel(), 3)
+    if name == 'single':
+        return np.array([4.0]), np.array([-1.0])
+    raise ValueError(name)
+
+
+LAYOUTS = ['random', 'collinear_r', 'collinear_x', 'diagonal', 'duplicates', 'grid_with_repeats', 'single']
+
+
+def queries(R, X, rng, count=40):
+    """Query points inside and well outside the extent of the layout."""
+    span = max(np.ptp(R), np.ptp(X), 1.0)
+    return zip(rng.uniform(R.min() - span, R.max() + span, count),
+               rng.uniform(X.min() - span, X.max() + span, count))
+
+
+@pytest.mark.parametrize('name', LAYOUTS)
+def test_nearest_matches_brute_force(name):
+    rng = np.random.default_rng(LAYOUTS.index(name))
+    R, X = layout(name, rng)
+    index = PointIndex(R, X, rng.uniform(0, 5, len(R)))
+
+    for qR, qX in queries(R, X, rng):
+        for k in (1, 5):
+            found = index.nearest(qR, qX, k)
+            expected = np.sort(np.hypot(R - qR, X - qX))[:k]
+            np.testing.assert_allclose([p['distance'] for p in found], expected)
+            for p in found:
+                assert np.isclose(np.hypot(p['R'] - qR, p['X'] - qX), p['distance'])
+
+
+@pytest.mark.parametrize('name', LAYOUTS)
+def test_top_in_rect_matches_brute_force(name):
+    rng = np.random.default_rng(100 + LAYOUTS.index(name))
+    R, X = layout(name, rng)
+    HD = rng.uniform(0, 5, len(R))
+    index = PointIndex(R, X, HD)
+
+    corners = list(queries(R, X, rng, count=60))
+    for (R0, X0), (R1, X1) in zip(corners[::2], corners[1::2]):
+        R_min, R_max, X_min, X_max = min(R0, R1), max(R0, R1), min(X0, X1), max(X0, X1)
+        inside = (R >= R_min) & (R <= R_max) & (X >= X_min) & (X <= X_max)
+        found = index.top_in_rect(R_min, R_max, X_min, X_max, k=10)
+        assert [p['HD'] for p in found] == sorted(HD[inside], reverse=True)[:10]
+        assert all(R_min <= p['R'] <= R_max and X_min <= p['X'] <= X_max for p in found)
+    # The whole extent, including points on its border
+    assert len(index.top_in_rect(R.min(), R.max(), X.min(), X.max(), k=len(R))) == len(R)
+
+
+def test_empty_and_invalid_rows():
+    index = PointIndex([1.0, np.nan, 3.0], [1.0, 2.0, np.nan], [0.5, 0.6, 0.7])
+    assert len(index) == 1
+    assert index.nearest(0.0, 0.0)[0]['HD'] == 0.5
+
+    empty = PointIndex([], [], [])
+    assert empty.nearest(0.0, 0.0) == [] and empty.top_in_rect(0, 1, 0, 1) == []
+    assert index.top_in_rect(2, 1, 0, 1) == []
+
+
+def test_save_and_load_round_trip():
+    rng = np.random.default_rng(7)
+    R, X = layout('random', rng)
+    index = PointIndex(R, X, rng.uniform(0, 5, len(R)), network_RR=R + 1, network_XX=X - 1, harmonic_order=7)
+    buffer = io.BytesIO()
+    index.save(buffer)
+    buffer.seek(0)
+
+    loaded = PointIndex.load(buffer)
+
+    assert loaded.harmonic_order == 7 and loaded.shape == index.shape and len(loaded) == len(index)
+    assert loaded.nearest(10.0, 5.0, 3) == index.nearest(10.0, 5.0, 3)
+    assert loaded.top_in_rect(0, 20, 0, 20) == index.top_in_rect(0, 20, 0, 20)
+    assert loaded.nearest(10.0, 5.0)[0]['network_R'] == loaded.nearest(10.0, 5.0)[0]['R'] + 1
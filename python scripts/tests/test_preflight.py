@@ -0,0 +1,101 @@
+import zipfile
+
+import pytest
+from openpyxl import Workbook
+
+from loci_core import HARMONIC_ORDER_COLUMN
+from preflight import run_preflight
+
+LIMIT_COLUMN = 'Total Limit (%V1) at PCC'
+LOCI_ROWS = [[2, 10, 11, 50], [0.0, 0.0, 0.0, 0.0], [1.0, 0.0, 2.0, 0.0], [1.0, 1.0, 2.0, 2.0]]
+LIMIT_ROWS = [[HARMONIC_ORDER_COLUMN, LIMIT_COLUMN], [2, 1.5], [3, 1.0]]
+ORDER_HEADER = ['R (ohm)', 'X (ohm)', 'Result HD', 'Network R (ohm)', 'Network X (ohm)']
+ORDER_ROWS = [ORDER_HEADER, ['ohm', 'ohm', '%', 'ohm', 'ohm'], [1.0, 2.0, 0.5, 1.0, 2.0]]
+
+
+def write_workbook(path, sheets):
+    wb = Workbook()
+    wb.remove(wb.active)
+    for name, rows in sheets.items():
+        ws = wb.create_sheet(name)
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+    return str(path)
+
+
+def loci_workbook(tmp_path, loci_rows=LOCI_ROWS, limit_rows=LIMIT_ROWS):
+    return write_workbook(tmp_path / 'Loci_Script_Inputs.xlsx',
+                          {'Impedance Loci Vertices': loci_rows, 'Harmonic Limits': limit_rows})
+
+
+def harmonics_workbook(tmp_path, orders=(2, 3), rows=ORDER_ROWS):
+    return write_workbook(tmp_path / 'VhTotal results.xlsx',
+                          {f'Harmonic Order {order}': rows for order in orders})
+
+
+def checks(issues, level='error'):
+    return [issue['check'] for issue in issues if issue['level'] == level]
+
+
+def test_clean_workbooks_pass(tmp_path):
+    assert run_preflight(loci_workbook(tmp_path), harmonics_workbook(tmp_path)) == []
+
+
+@pytest.mark.parametrize('missing', ['R (ohm)', 'X (ohm)', 'Result HD'])
+def test_missing_result_column(tmp_path, missing):
+    rows = [[name for name in ORDER_HEADER if name != missing]] + [row[:4] for row in ORDER_ROWS[1:]]
+
+    issues = run_preflight(loci_workbook(tmp_path), harmonics_workbook(tmp_path, rows=rows))
+
+    assert checks(issues) == ['missing_column', 'missing_column']
+    assert all(missing.split()[0] in issue['message'] for issue in issues if issue['level'] == 'error')
+
+
+def test_other_result_column_names_are_accepted(tmp_path):
+    rows = [['Initial R (Ω)', 'Initial X (Ω)', 'Max HD'] + ORDER_HEADER[3:]] + ORDER_ROWS[1:]
+    assert run_preflight(loci_workbook(tmp_path), harmonics_workbook(tmp_path, rows=rows)) == []
+
+
+def test_odd_loci_column_count(tmp_path):
+    rows = [row[:3] for row in LOCI_ROWS]
+    assert checks(run_preflight(loci_workbook(tmp_path, loci_rows=rows))) == ['odd_loci_columns']
+
+
+def test_non_numeric_range_bounds(tmp_path):
+    rows = [[2, 'ten', 11, 50]] + LOCI_ROWS[1:]
+
+    issues = run_preflight(loci_workbook(tmp_path, loci_rows=rows))
+
+    assert checks(issues) == ['ranges_not_numeric']
+    assert '[2]' in issues[0]['message']
+
+
+@pytest.mark.parametrize('limit', [0, -1.0, None])
+def test_invalid_limits(tmp_path, limit):
+    rows = [LIMIT_ROWS[0], [2, limit], LIMIT_ROWS[2]]
+    assert checks(run_preflight(loci_workbook(tmp_path, limit_rows=rows), harmonics_workbook(tmp_path))) == [
+        'invalid_limit']
+
+
+def test_missing_order_row_is_a_warning(tmp_path):
+    issues = run_preflight(loci_workbook(tmp_path), harmonics_workbook(tmp_path, orders=(2, 3, 5)))
+
+    assert checks(issues) == []
+    assert checks(issues, 'warning') == ['missing_limit']
+    assert 'Harmonic Order 5' in issues[0]['message']
+
+
+def test_unreadable_sheet_is_reported(tmp_path):
+    path = harmonics_workbook(tmp_path)
+    with zipfile.ZipFile(path) as zf:
+        parts = {name: zf.read(name) for name in zf.namelist()}
+    parts['xl/worksheets/sheet1.xml'] = b'not a worksheet'
+    with zipfile.ZipFile(path, 'w') as zf:
+        for name, data in parts.items():
+            zf.writestr(name, data)
+
+    issues = run_preflight(loci_workbook(tmp_path), path)
+
+    assert checks(issues) == ['unreadable_sheet']
+    assert issues[0]['sheet'] == 'Harmonic Order 2'
@@ -0,0 +1,88 @@
+import json
+import zipfile
+
+import matplotlib
+matplotlib.use('Agg')
+
+import pandas as pd
+import pytest
+
+import Plot_subscript
+from loci_core import HARMONIC_ORDER_COLUMN
+
+
+def summary(order, non_compliant):
+    return {'harmonic_order': order, 'limit': 2.0, 'worst_case_hd': 3.0 if non_compliant else 1.0,
+            'worst_case_R': 1.0, 'worst_case_X': 2.0, 'network_R': 0.5, 'network_X': 0.5,
+            'non_compliant': non_compliant}
+
+
+def write_shard(folder, pages, summaries):
+    partial = {'pages': pages, 'main_title': 'VhTotal', 'colorbar_label': 'HD/Limit',
+               'orders': summaries, 'files': []}
+    path = folder / f"{Plot_subscript.SHARD_SUMMARY_PREFIX}Pages_{'_'.join(map(str, pages))}.json"
+    path.write_text(json.dumps(partial), encoding='utf-8')
+    return path
+
+
+def test_reduce_shards_merges_the_partial_summaries(tmp_path, monkeypatch, capsys):
+    sheets = [f'Harmonic Order {order}' for order in (2, 3, 4, 5)]
+    monkeypatch.setattr(Plot_subscript, 'order_sheet_names', lambda excel_file: sheets)
+    monkeypatch.setattr(Plot_subscript, 'load_order_arrays', lambda source, sheet: {'sheet': sheet})
+    monkeypatch.setattr(Plot_subscript, 'with_limit', lambda arrays, limit: dict(arrays, limit=limit))
+    rendered = []
+    monkeypatch.setattr(Plot_subscript, 'render_non_compliant_page',
+                        lambda infos, page_number, num_pages, *args: rendered.append(
+                            ([info['sheet'] for info in infos], page_number, num_pages)))
+    shards = tmp_path / 'shards'
+    shards.mkdir()
+    # Shards in any order; order 4 is in both, order 5 in none
+    write_shard(shards, [2], [summary(4, True), summary(3, False)])
+    write_shard(shards, [1], [summary(2, True), summary(4, True)])
+    output = tmp_path / 'out'
+
+    summaries = Plot_subscript.reduce_shards('results.xlsx', str(shards), str(output))
+
+    assert [s['harmonic_order'] for s in summaries] == [2, 3, 4]
+    assert 'no shard rendered Harmonic Orders [5]' in capsys.readouterr().out
+    table = pd.read_excel(output / Plot_subscript.COMPLIANCE_SUMMARY_FILE)
+    assert table[HARMONIC_ORDER_COLUMN].tolist() == [2, 3, 4]
+    assert table['Result'].tolist() == ['Fail', 'Pass', 'Fail']
+    assert rendered == [(['Harmonic Order 2', 'Harmonic Order 4'], 1, 1)]
+
+
+def test_reduce_shards_closes_its_archive_when_a_page_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(Plot_subscript, 'order_sheet_names', lambda excel_file: ['Harmonic Order 2'])
+    monkeypatch.setattr(Plot_subscript, 'load_order_arrays', lambda source, sheet: {})
+    monkeypatch.setattr(Plot_subscript, 'with_limit', lambda arrays, limit: arrays)
+
+    def fail(*args):
+        raise RuntimeError('page failed')
+
+    monkeypatch.setattr(Plot_subscript, 'render_non_compliant_page', fail)
+    shard = write_shard(tmp_path, [1], [summary(2, True)])
+    archive = tmp_path / 'merged.zip'
+
+    with pytest.raises(RuntimeError):
+        Plot_subscript.reduce_shards('results.xlsx', [str(shard)], str(archive))
+
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.namelist() == [Plot_subscript.COMPLIANCE_SUMMARY_FILE]
+
+
+def test_shard_indexes_only_its_own_orders(tmp_path, monkeypatch):
+    import point_index
+
+    sheets = [f'Harmonic Order {order}' for order in range(2, 32)]
+    monkeypatch.setattr(Plot_subscript, 'load_loci_inputs', lambda *args: None)
+    monkeypatch.setattr(Plot_subscript, 'determine_dynamic_titles', lambda *args: ('VhTotal', 'label'))
+    monkeypatch.setattr(Plot_subscript, 'order_sheet_names', lambda excel_file: sheets)
+    monkeypatch.setattr(Plot_subscript, 'render_shard', lambda *args: None)
+    indexed = []
+    monkeypatch.setattr(point_index, 'write_point_indexes',
+                        lambda source, sheet_names, sink: indexed.extend(sheet_names))
+
+    Plot_subscript.plotsave('results.xlsx', 'inputs.xlsx', 'inputs.xlsx', [], str(tmp_path),
+                            point_index=True, shard='pages=2')
+
+    assert indexed == sheets[15:30]
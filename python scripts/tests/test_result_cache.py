@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, compute_cache_key
+
+
+def write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+def result_set(folder, size=10):
+    write(folder / 'Compliance_Summary.xlsx', b'x' * size)
+    write(folder / 'plots' / 'VhTotal_Page_1.png', b'p' * size)
+    return str(folder)
+
+
+def test_key_changes_with_inputs_options_and_scripts(tmp_path):
+    loci = write(tmp_path / 'loci.xlsx', b'loci')
+    harmonics = write(tmp_path / 'harmonics.xlsx', b'harmonics')
+    script = write(tmp_path / 'Plot_subscript.py', b'print(1)')
+    options = {'sheetName': 'Impedance Loci Vertices', 'generatePlots': True}
+    key = compute_cache_key([loci, harmonics], options, [script])
+
+    assert compute_cache_key([loci, harmonics], dict(reversed(options.items())), [script]) == key
+    assert compute_cache_key([harmonics, loci], options, [script]) != key
+    assert compute_cache_key([loci, harmonics], dict(options, generatePlots=False), [script]) != key
+
+    write(tmp_path / 'harmonics.xlsx', b'harmonics 2')
+    assert compute_cache_key([loci, harmonics], options, [script]) != key
+    write(tmp_path / 'harmonics.xlsx', b'harmonics')
+    write(tmp_path / 'Plot_subscript.py', b'print(2)')
+    assert compute_cache_key([loci, harmonics], options, [script]) != key
+
+
+def test_put_then_get_round_trips(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = 'ab' * 32
+    assert cache.get(key, str(tmp_path / 'miss')) is None
+
+    cache.put(key, result_set(tmp_path / 'results'))
+    files = cache.get(key, str(tmp_path / 'restored'))
+
+    assert files == ['Compliance_Summary.xlsx', 'plots/VhTotal_Page_1.png']
+    assert (tmp_path / 'restored' / 'plots' / 'VhTotal_Page_1.png').read_bytes() == b'p' * 10
+
+
+def test_invalid_key_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ResultCache(str(tmp_path)).get('../outside', str(tmp_path / 'dest'))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    # Each entry holds 200 bytes; the cache keeps two of them
+    cache = ResultCache(str(tmp_path / 'cache'), max_bytes=450)
+    keys = ['a' * 64, 'b' * 64, 'c' * 64]
+    for age, key in zip((300, 200), keys):
+        cache.put(key, result_set(tmp_path / key[0], size=100))
+        meta = os.path.join(cache.entry_path(key), result_cache.META_FILE)
+        os.utime(meta, (os.path.getmtime(meta) - age,) * 2)
+    # Reading the oldest entry makes it the most recently used
+    assert cache.get(keys[0], str(tmp_path / 'read')) is not None
+
+    cache.put(keys[2], result_set(tmp_path / 'c', size=100))
+
+    assert cache.get(keys[1], str(tmp_path / 'evicted')) is None
+    assert cache.get(keys[0], str(tmp_path / 'kept')) is not None
+    assert cache.get(keys[2], str(tmp_path / 'new')) is not None
+
+
+def test_failed_put_leaves_no_entry(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = 'cd' * 32
+
+    def disk_full(*args, **kwargs):
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(result_cache, 'directory_size', disk_full)
+    with pytest.raises(OSError):
+        cache.put(key, result_set(tmp_path / 'results'))
+
+    assert cache.get(key, str(tmp_path / 'dest')) is None
+    assert os.listdir(cache.root) == []
@@ -0,0 +1,62 @@
+import numpy as np
+
+from loci_core import align_scenario_points, scenario_envelope
+
+
+def order_info(RR, XX, HD, network):
+    """Order dict like load_order_arrays, with the network R/X of its worst-case row."""
+    HD = np.asarray(HD, dtype=float)
+    worst = int(np.argmax(HD))
+    return {
+        'harmonic_order': 5,
+        'RR': np.asarray(RR, dtype=float), 'XX': np.asarray(XX, dtype=float), 'HD': HD,
+        'worst_case_hd': HD[worst], 'worst_case_R': RR[worst], 'worst_case_X': XX[worst],
+        'network_R': network[0], 'network_X': network[1],
+    }
+
+
+RR, XX = [1.0, 2.0, 3.0, 4.0], [10.0, 20.0, 30.0, 40.0]
+IMPORT = order_info(RR, XX, [0.5, 2.0, 0.7, 1.0], network=(11.0, 12.0))
+EXPORT = order_info(RR, XX, [0.9, 0.1, 2.5, 0.2], network=(21.0, 22.0))
+
+
+def test_envelope_takes_the_maximum_per_point():
+    envelope = scenario_envelope([IMPORT, EXPORT])
+
+    np.testing.assert_array_equal(envelope['RR'], RR)
+    np.testing.assert_array_equal(envelope['HD'], [0.9, 2.0, 2.5, 1.0])
+    assert envelope['worst_scenario'].tolist() == [1, 0, 1, 0]
+    assert envelope['scenario_worst_hd'] == [2.0, 2.5]
+
+
+def test_envelope_worst_case_comes_from_the_worst_scenario():
+    envelope = scenario_envelope([IMPORT, EXPORT])
+
+    assert envelope['worst_case_hd'] == 2.5 and envelope['worst_case_scenario'] == 1
+    assert (envelope['worst_case_R'], envelope['worst_case_X']) == (3.0, 30.0)
+    # Network R/X of the export scenario's own worst-case row, not of the import one
+    assert (envelope['network_R'], envelope['network_X']) == (21.0, 22.0)
+
+
+def test_scenarios_with_different_rows_are_matched_on_rx():
+    # Export lacks the (2, 20) point, lists the others in another order and adds (5, 50)
+    export = order_info([4.0, 1.0, 5.0, 3.0], [40.0, 10.0, 50.0, 30.0], [0.2, 0.9, 3.0, 2.5], network=(21.0, 22.0))
+
+    R, X, HD = align_scenario_points([IMPORT, export])
+
+    assert R.tolist() == [1.0, 2.0, 3.0, 4.0, 5.0] and X.tolist() == [10.0, 20.0, 30.0, 40.0, 50.0]
+    np.testing.assert_array_equal(HD, [[0.5, 2.0, 0.7, 1.0, np.nan], [0.9, np.nan, 2.5, 0.2, 3.0]])
+
+    envelope = scenario_envelope([IMPORT, export])
+    np.testing.assert_array_equal(envelope['HD'], [0.9, 2.0, 2.5, 1.0, 3.0])
+    assert envelope['worst_scenario'].tolist() == [1, 0, 1, 0, 1]
+    assert (envelope['worst_case_R'], envelope['worst_case_X']) == (5.0, 50.0)
+
+
+def test_rows_are_matched_after_rounding():
+    shifted = order_info([r + 1e-9 for r in RR], XX, [0.0, 3.0, 0.0, 0.0], network=(21.0, 22.0))
+
+    R, _, HD = align_scenario_points([IMPORT, shifted])
+
+    assert len(R) == 4
+    np.testing.assert_array_equal(HD[1], [0.0, 3.0, 0.0, 0.0])
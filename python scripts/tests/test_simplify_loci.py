@@ -0,0 +1,90 @@
+import math
+import random
+
+import pytest
+
+from loci_core import is_point_in_polygon, point_segment_distance, simplify_loci
+
+
+def make_locus(shape, count=400, clockwise=True, seed=1):
+    """Dense closed ring around (10, 20) with a little noise on the radius."""
+    rng = random.Random(seed)
+    R, X = [], []
+    for k in range(count):
+        th = (-1 if clockwise else 1) * 2 * math.pi * k / count
+        if shape == 'circle':
+            r = 5
+        elif shape == 'star':
+            r = 5 + 1.5 * math.cos(5 * th)
+        else:
+            r = 5 / max(abs(math.cos(th)), abs(math.sin(th)))
+        r += rng.uniform(-0.01, 0.01)
+        R.append(10 + r * math.cos(th))
+        X.append(20 + r * math.sin(th))
+    return R + R[:1], X + X[:1]
+
+
+def distance_to_outline(point, ring):
+    return min(point_segment_distance(point, ring[i], ring[i + 1]) for i in range(len(ring) - 1))
+
+
+def edge_samples(ring, steps=4):
+    return [(a[0] + f * (b[0] - a[0]), a[1] + f * (b[1] - a[1]))
+            for a, b in zip(ring, ring[1:]) for f in (i / steps for i in range(steps))]
+
+
+@pytest.mark.parametrize('shape', ['circle', 'star', 'square'])
+@pytest.mark.parametrize('clockwise', [True, False])
+def test_simplified_locus_contains_original(shape, clockwise):
+    R, X = make_locus(shape, clockwise=clockwise)
+
+    R2, X2, stats = simplify_loci(R, X, 0.05)
+
+    ring = list(zip(R2, X2))
+    assert stats['vertices_after'] < stats['vertices_before']
+    for point in zip(R, X):
+        assert is_point_in_polygon(point[0], point[1], ring) or distance_to_outline(point, ring) < 1e-9
+
+
+@pytest.mark.parametrize('shape', ['circle', 'star', 'square'])
+@pytest.mark.parametrize('tolerance', [0.01, 0.05, 0.3])
+def test_deviation_within_tolerance(shape, tolerance):
+    R, X = make_locus(shape)
+    original = list(zip(R, X))
+
+    R2, X2, stats = simplify_loci(R, X, tolerance)
+
+    ring = list(zip(R2, X2))
+    measured = max(
+        max(distance_to_outline(p, ring) for p in original),
+        max(distance_to_outline(p, original) for p in edge_samples(ring)),
+    )
+    assert measured <= stats['max_deviation'] + 1e-9
+    assert stats['max_deviation'] <= tolerance
+
+
+def test_larger_tolerance_removes_more():
+    R, X = make_locus('star')
+    after = [simplify_loci(R, X, tol)[2]['vertices_after'] for tol in (0.01, 0.05, 0.3)]
+    assert after[0] > after[1] > after[2] >= 3
+
+
+def test_ring_closure_is_kept():
+    R, X = make_locus('circle')
+    R2, X2, _ = simplify_loci(R, X, 0.05)
+    assert (R2[0], X2[0]) == (R2[-1], X2[-1])
+
+    R3, X3, stats = simplify_loci(R[:-1], X[:-1], 0.05)
+    assert (R3[0], X3[0]) != (R3[-1], X3[-1])
+    assert len(R3) == stats['vertices_after']
+
+
+@pytest.mark.parametrize('R, X, tolerance', [
+    (*make_locus('circle'), 0),
+    ([0, 1, 1, 0], [0, 0, 1, 0], 1.0),
+    ([0, 1, 2, 3, 0], [0, 0, 0, 0, 0], 1.0),
+])
+def test_unchanged_inputs(R, X, tolerance):
+    R2, X2, stats = simplify_loci(R, X, tolerance)
+    assert (R2, X2) == (list(R), list(X))
+    assert stats['vertices_removed'] == 0
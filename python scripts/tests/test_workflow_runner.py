@@ -0,0 +1,90 @@
+import json
+import os
+import shutil
+
+from openpyxl import Workbook
+
+import workflow_runner
+from loci_core import HARMONIC_ORDER_COLUMN
+
+# One locus (orders 2-50) with its vertices listed counter-clockwise
+LOCI_ROWS = [[2, 50], [0.0, 0.0], [10.0, 0.0], [10.0, 10.0], [0.0, 10.0]]
+LIMIT_ROWS = [[HARMONIC_ORDER_COLUMN, 'Incremental Distortion Limit (%V1) at PCC', 'Total Limit (%V1) at PCC'],
+              [2, 1.0, 2.0], [3, 1.0, 2.0]]
+ORDER_HEADER = ['R (ohm)', 'X (ohm)', 'Result HD']
+ORDER_DATA = [['ohm', 'ohm', '%'], [1.0, 1.0, 0.5], [5.0, 5.0, 1.5], [9.0, 2.0, 1.0], [3.0, 8.0, 0.8]]
+
+
+def write_workbook(path, sheets):
+    wb = Workbook()
+    wb.remove(wb.active)
+    for name, rows in sheets.items():
+        ws = wb.create_sheet(name)
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+    return str(path)
+
+
+def inputs(tmp_path, order_header=ORDER_HEADER):
+    loci = write_workbook(tmp_path / 'Loci_Script_Inputs.xlsx',
+                          {'Impedance Loci Vertices': LOCI_ROWS, 'Harmonic Limits': LIMIT_ROWS})
+    harmonics = write_workbook(tmp_path / 'VhTotal results.xlsx',
+                               {'Harmonic Order 2': [order_header] + ORDER_DATA})
+    return loci, harmonics
+
+
+def run_job(job_dir, capsys, *args):
+    code = workflow_runner.main(['--job-dir', str(job_dir), '--workers', '1', *args])
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    return code, events
+
+
+def tasks_with(events, event):
+    return sorted(e['task'] for e in events if e['event'] == event)
+
+
+def test_ds_format_job_without_plots(tmp_path, capsys):
+    loci, _ = inputs(tmp_path)
+    job_dir = tmp_path / 'job'
+
+    code, events = run_job(job_dir, capsys, '--loci', loci, '--no-plots')
+
+    assert code == 0
+    assert tasks_with(events, 'task_finished') == ['ds_format:1', 'reorder']
+    assert events[-1]['event'] == 'job_finished' and events[-1]['status'] == 'completed'
+    assert (job_dir / workflow_runner.CLOCKWISE_FILE).is_file()
+    ds_files = os.listdir(job_dir / workflow_runner.DS_FORMAT_FOLDER)
+    assert any(name.endswith('.xlsx') for name in ds_files)
+
+
+def test_failed_task_is_reported_and_the_job_resumes(tmp_path, capsys):
+    # No HD column: compliance fails, so its render task cannot run
+    loci, harmonics = inputs(tmp_path, order_header=ORDER_HEADER[:2] + ['Other'])
+    job_dir = tmp_path / 'job'
+
+    code, events = run_job(job_dir, capsys, '--loci', loci, '--harmonics', harmonics)
+
+    assert code == 1
+    failed = {e['task']: e['error'] for e in events if e['event'] == 'task_failed'}
+    assert 'compliance' in failed and failed['render_page:1'] == 'dependency failed'
+    assert tasks_with(events, 'task_finished') == ['ds_format:1', 'reorder']
+    assert events[-1]['status'] == 'failed'
+
+    # Fix the job's copy of the results and run the same job folder again
+    fixed_dir = tmp_path / 'fixed'
+    fixed_dir.mkdir()
+    _, fixed = inputs(fixed_dir)
+    shutil.copyfile(fixed, job_dir / workflow_runner.INPUT_DIR / os.path.basename(harmonics))
+    code, events = run_job(job_dir, capsys)
+
+    assert code == 0
+    assert tasks_with(events, 'task_skipped') == ['ds_format:1', 'reorder']
+    assert tasks_with(events, 'task_finished') == ['compliance', 'render_page:1']
+    with open(job_dir / workflow_runner.CHECKPOINT_DIR / 'compliance.json') as f:
+        orders = json.load(f)['result']['orders']
+    assert [(o['harmonic_order'], o['worst_case_hd'], o['non_compliant']) for o in orders] == [(2, 1.5, False)]
+
+    # A finished job is all checkpoints
+    code, events = run_job(job_dir, capsys)
+    assert code == 0 and tasks_with(events, 'task_queued') == []
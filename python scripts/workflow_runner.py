@@ -0,0 +1,541 @@
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Render without a display in worker processes
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Names used inside a job folder
+JOB_FILE = 'job.json'
+CHECKPOINT_DIR = 'checkpoints'
+INPUT_DIR = 'inputs'
+ORDER_DATA_DIR = 'orders'
+TILE_DIR = 'tiles'
+CLOCKWISE_FILE = 'Loci_Script_Inputs_Clockwise.xlsx'
+DS_FORMAT_FOLDER = 'Mins & Maxes (w Vertices) (ohms)'
+PLOTS_FOLDER = 'Output_Plots'
+
+# Harmonic orders per summary / non-compliant page (5×3 grid)
+ORDERS_PER_PAGE = 15
+
+
+# SCRIPT ACCESS
+
+def load_script(file_name, module_name):
+    """Import one of the scripts next to this file (names may contain spaces)."""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPT_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def clockwise_script():
+    return load_script('Make Loci_Inputs_Clockwise.py', 'loci_clockwise')
+
+
+def pf_script():
+    return load_script('PF_format_w_vertices.py', 'PF_format_w_vertices')
+
+
+def plot_script():
+    return load_script('Plot_subscript.py', 'Plot_subscript')
+
+
+def core_module():
+    """Geometry, DS-format and compliance code without the plotting imports."""
+    return load_script('loci_core.py', 'loci_core')
+
+
+def count_loci_ranges(loci_file, sheet_name):
+    """Number of R/X column pairs in the loci sheet (read from the header row only)."""
+    from openpyxl import load_workbook
+    wb = load_workbook(loci_file, read_only=True, data_only=True)
+    try:
+        first_row = next(wb[sheet_name].iter_rows(min_row=1, max_row=1, values_only=True), ())
+    finally:
+        wb.close()
+    used = [cell for cell in first_row if cell is not None]
+    return len(used) // 2
+
+
+def harmonic_order_sheets(excel_file):
+    """Names of the 'Harmonic Order N' sheets, in workbook order."""
+    from openpyxl import load_workbook
+    wb = load_workbook(excel_file, read_only=True)
+    try:
+        return [sheet for sheet in wb.sheetnames if sheet.startswith("Harmonic Order")]
+    finally:
+        wb.close()
+
+
+# TASKS
+# Every task function takes (job_dir, spec, params, deps) where deps maps the
+# ids of finished dependencies to their results, and returns a JSON-able result.
+
+def task_reorder(job_dir, spec, params, deps):
+    output_file = os.path.join(job_dir, CLOCKWISE_FILE)
+    clockwise_script().reorder_workbook(spec['loci_file'], output_file, spec['sheet_name'])
+    return {'loci_file': output_file}
+
+
+def task_ds_format(job_dir, spec, params, deps):
+    loci_file = deps.get('reorder', {}).get('loci_file', spec['loci_file'])
+    folder_path = os.path.join(job_dir, DS_FORMAT_FOLDER)
+    os.makedirs(folder_path, exist_ok=True)
+
+    Impedance_Loci, _, ranges = core_module().excel_to_matrix(loci_file, spec['sheet_name'])
+    result = pf_script().process_range(
+        Impedance_Loci, ranges[0], params['range'], folder_path,
+        Loci_unit=spec['pf_unit'], make_plot=True,
+        simplify_tolerance=spec.get('simplify_tolerance', 0)
+    )
+    return {
+        'range': result['range'],
+        'levels': result['levels'],
+        'simplification': result['simplification'],
+        'files': [os.path.relpath(path, job_dir) for path in (result['excel_file'], result['plot_file']) if path]
+    }
+
+
+def task_compliance(job_dir, spec, params, deps):
+    import numpy as np
+
+    core = core_module()
+    loci_inputs = core.load_loci_inputs(spec['loci_file'], spec['limits_sheet_name'])
+    main_title, _ = core.determine_dynamic_titles(spec['loci_file'], spec['harmonics_file'])
+
+    data_dir = os.path.join(job_dir, ORDER_DATA_DIR)
+    os.makedirs(data_dir, exist_ok=True)
+
+    orders = []
+    for sheet in params['sheets']:
+        info = core.load_order_data(spec['harmonics_file'], sheet, loci_inputs, main_title)
+        # Keep the point arrays for the render tasks, the summary in the checkpoint
+        np.savez(os.path.join(data_dir, f"order_{info['harmonic_order']}.npz"),
+                 RR=info['RR'], XX=info['XX'], HD=info['HD'])
+        orders.append(core.order_summary(info))
+    return {
+        'main_title': main_title,
+        'colorbar_label': core.colorbar_label_for(main_title),
+        'orders': orders,
+    }
+
+
+def order_info(job_dir, summary):
+    """Rebuild the plotting info of one order from the compliance summary and its arrays."""
+    import numpy as np
+    info = dict(summary)
+    with np.load(os.path.join(job_dir, ORDER_DATA_DIR, f"order_{summary['harmonic_order']}.npz")) as data:
+        info.update(RR=data['RR'], XX=data['XX'], HD=data['HD'])
+    return info
+
+
+def compliance_pages(compliance, non_compliant):
+    """Split the (non-compliant) order summaries into pages of ORDERS_PER_PAGE."""
+    orders = [o for o in compliance['orders'] if o['non_compliant'] or not non_compliant]
+    return [orders[i:i + ORDERS_PER_PAGE] for i in range(0, len(orders), ORDERS_PER_PAGE)]
+
+
+def tile_path(job_dir, order, non_compliant=False):
+    suffix = '_nc' if non_compliant else ''
+    return os.path.join(job_dir, TILE_DIR, f'order_{order}{suffix}.png')
+
+
+def load_tiles(job_dir, orders, non_compliant=False):
+    """Open the tiles drawn by the render_tile tasks for the given order summaries."""
+    from PIL import Image
+    tiles = []
+    for o in orders:
+        with Image.open(tile_path(job_dir, o['harmonic_order'], non_compliant)) as tile:
+            tiles.append(tile.convert('RGB'))
+    return tiles
+
+
+def task_point_index(job_dir, spec, params, deps):
+    locations = load_script('point_index.py', 'point_index').write_point_indexes(
+        spec['harmonics_file'], params['sheets'], job_dir
+    )
+    return {'files': [os.path.relpath(path, job_dir) for path in locations]}
+
+
+def task_render_tile(job_dir, spec, params, deps):
+    compliance = deps['compliance']
+    summary = next(o for o in compliance['orders'] if o['harmonic_order'] == params['order'])
+    plots = plot_script()
+    info = order_info(job_dir, summary)
+    path = tile_path(job_dir, params['order'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    plots.render_order_tile(info, spec['loci_unit']).save(path, format='PNG')
+    paths = [path]
+    if summary['non_compliant']:
+        # Second tile in the style of the non-compliant pages
+        path = tile_path(job_dir, params['order'], non_compliant=True)
+        plots.render_order_tile(info, spec['loci_unit'], style=plots.NON_COMPLIANT_STYLE).save(path, format='PNG')
+        paths.append(path)
+    return {'files': [os.path.relpath(path, job_dir) for path in paths]}
+
+
+def plots_output(job_dir, spec):
+    """Plots folder of the job, wrapped in a PalettePngSink when PNG optimization is on."""
+    output_folder = os.path.join(job_dir, PLOTS_FOLDER)
+    os.makedirs(output_folder, exist_ok=True)
+    if spec.get('optimize_png'):
+        from output_sink import DirectorySink, PalettePngSink
+        return PalettePngSink(DirectorySink(output_folder))
+    return output_folder
+
+
+def render_result(job_dir, output_folder, path):
+    """Result of a render task, with the bytes saved when PNG optimization is on."""
+    result = {'files': [os.path.relpath(path, job_dir)]}
+    savings = getattr(output_folder, 'savings', None)
+    if savings is not None:
+        result['png_bytes_saved'] = sum(original - written for _, original, written in savings)
+    return result
+
+
+def task_render_page(job_dir, spec, params, deps):
+    compliance = deps['compliance']
+    page = compliance_pages(compliance, non_compliant=False)[params['page'] - 1]
+    output_folder = plots_output(job_dir, spec)
+    plots = plot_script()
+    if spec.get('tile_pages'):
+        path = plots.compose_summary_page(
+            load_tiles(job_dir, page), [o['harmonic_order'] for o in page], params['page'],
+            compliance['main_title'], plots.render_colorbar_strip(compliance['colorbar_label']), output_folder
+        )
+        return render_result(job_dir, output_folder, path)
+    path = plots.render_summary_page(
+        [order_info(job_dir, o) for o in page], params['page'],
+        compliance['main_title'], compliance['colorbar_label'], output_folder, spec['loci_unit']
+    )
+    return render_result(job_dir, output_folder, path)
+
+
+def task_render_nc_page(job_dir, spec, params, deps):
+    compliance = deps['compliance']
+    pages = compliance_pages(compliance, non_compliant=True)
+    output_folder = plots_output(job_dir, spec)
+    plots = plot_script()
+    if spec.get('tile_pages'):
+        page = pages[params['page'] - 1]
+        path = plots.compose_non_compliant_page(
+            load_tiles(job_dir, page, non_compliant=True), [o['harmonic_order'] for o in page], params['page'], len(pages),
+            compliance['main_title'], plots.render_colorbar_strip(compliance['colorbar_label']), output_folder
+        )
+        return render_result(job_dir, output_folder, path)
+    path = plots.render_non_compliant_page(
+        [order_info(job_dir, o) for o in pages[params['page'] - 1]], params['page'], len(pages),
+        compliance['main_title'], compliance['colorbar_label'], output_folder, spec['loci_unit']
+    )
+    return render_result(job_dir, output_folder, path)
+
+
+def task_render_detail(job_dir, spec, params, deps):
+    compliance = deps['compliance']
+    summary = next(o for o in compliance['orders'] if o['harmonic_order'] == params['order'])
+    output_folder = plots_output(job_dir, spec)
+    path = plot_script().render_detailed_sheet(
+        order_info(job_dir, summary), compliance['main_title'], compliance['colorbar_label'],
+        output_folder, spec['loci_unit']
+    )
+    return render_result(job_dir, output_folder, path)
+
+
+TASK_FUNCTIONS = {
+    'reorder': task_reorder,
+    'ds_format': task_ds_format,
+    'compliance': task_compliance,
+    'point_index': task_point_index,
+    'render_tile': task_render_tile,
+    'render_page': task_render_page,
+    'render_nc_page': task_render_nc_page,
+    'render_detail': task_render_detail,
+}
+
+
+def run_task(kind, job_dir, spec, params, deps):
+    """Entry point of a worker process. Script output goes to stderr so stdout stays JSON lines."""
+    started = time.time()
+    with contextlib.redirect_stdout(sys.stderr):
+        result = TASK_FUNCTIONS[kind](job_dir, spec, params, deps)
+    return result, time.time() - started
+
+
+# TASK GRAPH
+
+class Task:
+    """One node of the job graph."""
+
+    def __init__(self, task_id, kind, params=None, deps=()):
+        self.task_id = task_id
+        self.kind = kind
+        self.params = params or {}
+        self.deps = list(deps)
+
+
+def plan_tasks(spec):
+    """
+    Initial task graph: reorder, one DS-format task per range, the
+    compliance step and one render task per summary page. Render tasks for
+    the non-compliant orders are added once compliance has finished.
+    With tile_pages every order is drawn once by a render_tile task and the
+    page tasks only paste tiles together.
+    """
+    tasks = []
+    ds_deps = []
+    if spec['reorder_vertices']:
+        tasks.append(Task('reorder', 'reorder'))
+        ds_deps = ['reorder']
+
+    for range_index in range(1, count_loci_ranges(spec['loci_file'], spec['sheet_name']) + 1):
+        tasks.append(Task(f'ds_format:{range_index}', 'ds_format', {'range': range_index}, ds_deps))
+
+    if spec['generate_plots']:
+        sheets = harmonic_order_sheets(spec['harmonics_file'])
+        tasks.append(Task('compliance', 'compliance', {'sheets': sheets}))
+        if spec.get('point_index'):
+            tasks.append(Task('point_index', 'point_index', {'sheets': sheets}))
+        orders = [int(sheet.split()[-1]) for sheet in sheets]
+        if spec.get('tile_pages'):
+            for order in orders:
+                tasks.append(Task(f'render_tile:{order}', 'render_tile', {'order': order}, ['compliance']))
+        for page in range(1, (len(sheets) + ORDERS_PER_PAGE - 1) // ORDERS_PER_PAGE + 1):
+            page_orders = orders[(page - 1) * ORDERS_PER_PAGE:page * ORDERS_PER_PAGE]
+            deps = ['compliance'] + (tile_ids(page_orders) if spec.get('tile_pages') else [])
+            tasks.append(Task(f'render_page:{page}', 'render_page', {'page': page}, deps))
+    return tasks
+
+
+def tile_ids(orders):
+    return [f'render_tile:{order}' for order in orders]
+
+
+def expand_tasks(spec, task, result):
+    """Tasks that only become known once 'task' has finished."""
+    if task.kind != 'compliance':
+        return []
+    tasks = []
+    for page, page_orders in enumerate(compliance_pages(result, non_compliant=True), start=1):
+        deps = ['compliance']
+        if spec.get('tile_pages'):
+            deps += tile_ids(o['harmonic_order'] for o in page_orders)
+        tasks.append(Task(f'render_nc_page:{page}', 'render_nc_page', {'page': page}, deps))
+    for order in result['orders']:
+        if order['non_compliant']:
+            order_id = order['harmonic_order']
+            tasks.append(Task(f'render_detail:{order_id}', 'render_detail', {'order': order_id}, ['compliance']))
+    return tasks
+
+
+# JOB RUNNER
+
+def emit(event, **fields):
+    """Write one progress event as a JSON line on stdout."""
+    fields['event'] = event
+    fields['time'] = round(time.time(), 3)
+    sys.stdout.write(json.dumps(fields) + '\n')
+    sys.stdout.flush()
+
+
+class JobRunner:
+    """
+    Run a workflow job as a graph of tasks with on-disk checkpoints.
+
+    Independent tasks run concurrently in worker processes. Every finished
+    task writes 'checkpoints/<task>.json' in the job folder, so running the
+    same job folder again skips finished work and resumes where an
+    interrupted run stopped.
+    """
+
+    def __init__(self, job_dir, spec, workers=None):
+        self.job_dir = job_dir
+        self.spec = spec
+        self.workers = workers or max(1, min(4, os.cpu_count() or 1))
+        self.tasks = {}
+        self.results = {}
+        self.failed = {}
+
+    def checkpoint_path(self, task_id):
+        return os.path.join(self.job_dir, CHECKPOINT_DIR, task_id.replace(':', '_') + '.json')
+
+    def load_checkpoint(self, task_id):
+        try:
+            with open(self.checkpoint_path(task_id)) as f:
+                return json.load(f)['result']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save_checkpoint(self, task_id, result):
+        path = self.checkpoint_path(task_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'task': task_id, 'result': result}, f)
+        os.replace(tmp_path, path)
+
+    def add_tasks(self, tasks):
+        for task in tasks:
+            self.tasks.setdefault(task.task_id, task)
+
+    def finish(self, task, result):
+        self.results[task.task_id] = result
+        self.add_tasks(expand_tasks(self.spec, task, result))
+
+    def ready_tasks(self, running):
+        running_ids = {task.task_id for task in running.values()}
+        ready = []
+        for task_id, task in self.tasks.items():
+            if task_id in self.results or task_id in self.failed or task_id in running_ids:
+                continue
+            if any(dep in self.failed for dep in task.deps):
+                self.failed[task_id] = 'dependency failed'
+                emit('task_failed', task=task_id, error='dependency failed')
+                continue
+            if all(dep in self.results for dep in task.deps):
+                ready.append(task)
+        return ready
+
+    def run(self):
+        self.add_tasks(plan_tasks(self.spec))
+        emit('job_started', job_dir=self.job_dir, tasks=len(self.tasks), workers=self.workers)
+
+        running = {}
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                for task in self.ready_tasks(running):
+                    result = self.load_checkpoint(task.task_id)
+                    if result is not None:
+                        emit('task_skipped', task=task.task_id, reason='checkpoint')
+                        self.finish(task, result)
+                        continue
+                    deps = {dep: self.results[dep] for dep in task.deps}
+                    future = pool.submit(run_task, task.kind, self.job_dir, self.spec, task.params, deps)
+                    running[future] = task
+                    emit('task_queued', task=task.task_id)
+
+                if not running:
+                    # Checkpointed tasks may have unlocked more work
+                    if self.ready_tasks(running):
+                        continue
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        result, seconds = future.result()
+                    except Exception as e:
+                        self.failed[task.task_id] = str(e)
+                        emit('task_failed', task=task.task_id, error=str(e),
+                             traceback=traceback.format_exc(limit=5))
+                        continue
+                    self.save_checkpoint(task.task_id, result)
+                    self.finish(task, result)
+                    extra = {'png_bytes_saved': result['png_bytes_saved']} if 'png_bytes_saved' in result else {}
+                    emit('task_finished', task=task.task_id, seconds=round(seconds, 3),
+                         completed=len(self.results), total=len(self.tasks), **extra)
+
+        status = 'failed' if self.failed else 'completed'
+        emit('job_finished', status=status, completed=len(self.results), total=len(self.tasks),
+             failed=sorted(self.failed))
+        return status == 'completed'
+
+
+def prepare_job(job_dir, args):
+    """
+    Create (or reopen) the job folder and return its spec.
+    Input files are copied into the job folder so an interrupted job can be
+    resumed later from the folder alone.
+    """
+    job_file = os.path.join(job_dir, JOB_FILE)
+    if os.path.isfile(job_file) and not args.restart:
+        with open(job_file) as f:
+            return json.load(f)
+
+    if not args.loci or (not args.harmonics and not args.no_plots):
+        raise ValueError('--loci and --harmonics are required to start a new job')
+
+    if args.restart:
+        shutil.rmtree(os.path.join(job_dir, CHECKPOINT_DIR), ignore_errors=True)
+    input_dir = os.path.join(job_dir, INPUT_DIR)
+    os.makedirs(input_dir, exist_ok=True)
+    loci_file = os.path.join(input_dir, 'Loci_Script_Inputs' + os.path.splitext(args.loci)[1])
+    shutil.copyfile(args.loci, loci_file)
+    harmonics_file = None
+    if args.harmonics:
+        harmonics_file = os.path.join(input_dir, os.path.basename(args.harmonics))
+        shutil.copyfile(args.harmonics, harmonics_file)
+
+    spec = {
+        'loci_file': loci_file,
+        'harmonics_file': harmonics_file,
+        'sheet_name': args.sheet_name,
+        'limits_sheet_name': args.limits_sheet_name,
+        'loci_unit': args.loci_unit,
+        # PF_format_w_vertices labels its outputs with 'ohm' rather than 'Ω'
+        'pf_unit': 'ohm' if args.loci_unit == 'Ω' else args.loci_unit,
+        'reorder_vertices': not args.no_reorder,
+        'generate_plots': not args.no_plots,
+        'tile_pages': args.tile_pages,
+        'optimize_png': args.optimize_png,
+        'point_index': args.point_index,
+        'simplify_tolerance': args.simplify_tolerance,
+    }
+    tmp_path = job_file + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(spec, f, indent=2)
+    os.replace(tmp_path, job_file)
+    return spec
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run the loci/harmonics workflow as a resumable task graph. '
+                    'Progress is written to stdout as JSON lines.')
+    parser.add_argument('--job-dir', required=True, help='Job folder (outputs and checkpoints)')
+    parser.add_argument('--loci', help='Impedance loci workbook (new jobs only)')
+    parser.add_argument('--harmonics', help='Harmonic calculation results workbook (new jobs only)')
+    parser.add_argument('--sheet-name', default='Impedance Loci Vertices')
+    parser.add_argument('--limits-sheet-name', default='Harmonic Limits')
+    parser.add_argument('--loci-unit', default='Ω')
+    parser.add_argument('--no-reorder', action='store_true', help='Skip the clockwise reordering step')
+    parser.add_argument('--no-plots', action='store_true', help='Skip compliance and plot rendering')
+    parser.add_argument('--tile-pages', action='store_true',
+                        help='Draw every harmonic order once and compose pages from image tiles')
+    parser.add_argument('--optimize-png', action='store_true',
+                        help='Write the plots as palette PNGs with optimized compression')
+    parser.add_argument('--point-index', action='store_true',
+                        help='Save a spatial index of the result points of every order in Point_Index')
+    parser.add_argument('--simplify-tolerance', type=float, default=0,
+                        help='Simplify dense loci within this deviation before the DS formats (0 = off)')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes')
+    parser.add_argument('--restart', action='store_true', help='Ignore existing checkpoints')
+    args = parser.parse_args(argv)
+
+    job_dir = os.path.abspath(args.job_dir)
+    os.makedirs(job_dir, exist_ok=True)
+    try:
+        spec = prepare_job(job_dir, args)
+    except (OSError, ValueError) as e:
+        emit('job_failed', error=str(e))
+        return 2
+    return 0 if JobRunner(job_dir, spec, args.workers).run() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())